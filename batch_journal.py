@@ -0,0 +1,125 @@
+"""批处理检查点日志
+
+处理开始时写入一行批次信息（处理参数、文件列表和每个文件处理前的大小与修改时间），
+之后每替换完一个文件追加一行记录并立即刷新到磁盘。
+程序崩溃、被关闭或用户取消后，从日志中读出尚未完成的文件继续处理：
+已完成的文件不会重复处理，也就不会被缩小两次。
+文件已被替换但还没来得及记录时（大小或修改时间与处理前不同），同样视为已完成。
+批次全部完成后删除日志。
+"""
+import os
+import json
+import time
+
+# 日志文件名（保存在缓存目录中）
+JOURNAL_NAME = "batch_journal.jsonl"
+
+
+def batch_settings(mode, scale=1.0, target_size="", quality="exact", max_bytes=None):
+    """日志中保存的处理参数，继续处理时按相同参数恢复"""
+    return {"mode": mode, "scale": scale, "target_size": target_size,
+            "quality": quality, "max_bytes": max_bytes}
+
+
+def file_stat_key(file_path):
+    """文件的大小和修改时间，用于判断处理前后文件是否被替换"""
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class BatchJournal:
+    """只追加写入的检查点日志，只在处理线程中使用"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def start(self, files, settings):
+        """开始新的批次，覆盖旧的日志。settings为处理参数字典（可序列化为JSON）"""
+        signatures = {}
+        for file_path in files:
+            try:
+                signatures[file_path] = file_stat_key(file_path)
+            except OSError:
+                pass
+        self.file = open(self.path, "w", encoding="utf-8")
+        self._write({"type": "batch", "settings": settings, "files": list(files),
+                     "signatures": signatures, "started_at": time.time()})
+
+    def resume(self):
+        """继续写入已有的日志"""
+        self.file = open(self.path, "a+b")
+        # 上次在写入一行的中途被中断时，先补上换行，避免与新记录连在一起
+        if self.file.tell():
+            self.file.seek(-1, os.SEEK_END)
+            if self.file.read(1) != b"\n":
+                self.file.write(b"\n")
+        self.file.close()
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    def record(self, result):
+        """记录一个处理成功（包括跳过）的文件；失败的文件不记录，继续处理时重试"""
+        if self.file is not None and result["ok"]:
+            self._write({"type": "done", "path": result["path"], "skipped": result["skipped"]})
+
+    def _write(self, entry):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        """关闭日志但保留文件，以便之后继续处理"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def finish(self):
+        """批次已全部完成，删除日志"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError as e:
+            print(f"删除检查点日志失败: {self.path}, 错误: {e}")
+
+
+def load_journal(path):
+    """读取日志，返回{"settings", "files", "pending", "done"}，没有日志或日志无效时返回None
+
+    pending为尚未完成、仍然存在的文件（保持原顺序），done为已完成的文件数。
+    """
+    if not os.path.exists(path):
+        return None
+
+    header = None
+    done = set()
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # 写到一半被中断的最后一行
+                if entry.get("type") == "batch":
+                    header = entry
+                elif entry.get("type") == "done":
+                    done.add(entry["path"])
+    except OSError as e:
+        print(f"读取检查点日志失败: {path}, 错误: {e}")
+        return None
+    if header is None:
+        return None
+
+    pending = []
+    for file_path in header["files"]:
+        if file_path in done:
+            continue
+        try:
+            stat_key = file_stat_key(file_path)
+        except OSError:
+            continue  # 文件已被删除或移走
+        if file_path in header["signatures"] and stat_key != header["signatures"][file_path]:
+            done.add(file_path)  # 已被替换，只是还没来得及记录
+            continue
+        pending.append(file_path)
+
+    return {"settings": header["settings"], "files": header["files"],
+            "pending": pending, "done": len(done)}
@@ -0,0 +1,131 @@
+"""试运行：只读取文件头，生成整批图片的处理计划
+
+在替换原文件之前，列出每个文件的原始尺寸、输出尺寸、要执行的操作和预计文件大小，
+并汇总整批的数量和大小。文件头在多个线程中并行读取，十万张图片也只需要几秒。
+计划可以导出为CSV或JSON。
+"""
+import os
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import resize_engine
+from process_manifest import params_key
+
+# 计划中的操作：resize/pad/none与resize_engine.plan_action相同，
+# encode表示尺寸不变但超出文件大小上限、需要重新编码，
+# processed表示此前已用相同参数处理过，error表示无法读取
+PLAN_ACTIONS = ("resize", "pad", "encode", "none", "processed", "error")
+
+# 导出CSV时的列
+PLAN_FIELDS = ["path", "action", "width", "height", "new_width", "new_height",
+               "file_size", "estimated_size", "error"]
+
+
+def default_thread_count():
+    """读取文件头主要是等待IO，线程数可以多于CPU核心"""
+    return min(32, (os.cpu_count() or 1) * 4)
+
+
+def estimate_output_size(file_size, width, height, new_width, new_height):
+    """按缩放前后的面积比例估算输出文件大小（填充的透明背景几乎不占空间，不计入）"""
+    if not width or not height:
+        return file_size
+    return int(file_size * (new_width * new_height) / (width * height))
+
+
+def plan_file(file_path, mode, scale=1.0, target_size="", max_bytes=None):
+    """读取一个文件的文件头，返回处理计划字典"""
+    plan = {"path": file_path, "action": "error", "width": 0, "height": 0,
+            "new_width": 0, "new_height": 0, "file_size": 0, "estimated_size": 0, "error": None}
+    try:
+        plan["file_size"] = os.path.getsize(file_path)
+        with Image.open(file_path) as img:
+            width, height = img.size
+
+        action, new_size = resize_engine.plan_action(width, height, mode, scale, target_size)
+        if action == "none" and max_bytes and plan["file_size"] > max_bytes:
+            action = "encode"
+        estimated_size = plan["file_size"]
+        if action == "resize":
+            estimated_size = estimate_output_size(plan["file_size"], width, height, *new_size)
+        if max_bytes and action != "none":
+            estimated_size = min(estimated_size, max_bytes)
+
+        # 目标尺寸模式下最终输出的是填充后的尺寸
+        if mode == "target_size" and target_size:
+            new_size = resize_engine.parse_target_size(target_size)
+
+        plan.update(action=action, width=width, height=height,
+                    new_width=new_size[0], new_height=new_size[1], estimated_size=estimated_size)
+    except Exception as e:
+        plan["error"] = f"{e}"
+    return plan
+
+
+def plan_batch(paths, mode, scale=1.0, target_size="", quality="exact", threads=None,
+               manifest=None, max_bytes=None):
+    """并行读取文件头，返回与paths顺序相同的计划列表
+
+    传入manifest时，已用相同参数处理过的文件标记为processed，不再读取文件头。
+    """
+    paths = list(paths)
+    plans = [None] * len(paths)
+    pending = []
+
+    if manifest is not None:
+        # 处理记录的数据库连接只能在当前线程中使用
+        params = params_key(mode, scale, target_size, quality, max_bytes)
+        for i, file_path in enumerate(paths):
+            if manifest.is_processed(file_path, params):
+                size = os.path.getsize(file_path)
+                plans[i] = {"path": file_path, "action": "processed", "width": 0, "height": 0,
+                            "new_width": 0, "new_height": 0, "file_size": size,
+                            "estimated_size": size, "error": None}
+            else:
+                pending.append(i)
+    else:
+        pending = list(range(len(paths)))
+
+    with ThreadPoolExecutor(max_workers=threads or default_thread_count()) as executor:
+        results = executor.map(lambda i: plan_file(paths[i], mode, scale, target_size, max_bytes),
+                               pending, chunksize=64)
+        for i, plan in zip(pending, results):
+            plans[i] = plan
+    return plans
+
+
+def summarize_plan(plans):
+    """汇总计划：各操作的文件数、原始总大小和预计总大小"""
+    totals = {"files": len(plans), "file_size": 0, "estimated_size": 0}
+    for action in PLAN_ACTIONS:
+        totals[action] = 0
+    for plan in plans:
+        totals[plan["action"]] += 1
+        totals["file_size"] += plan["file_size"]
+        totals["estimated_size"] += plan["estimated_size"]
+    return totals
+
+
+def export_plan_csv(plans, output_path):
+    # utf-8-sig让Excel正确识别中文路径
+    with open(output_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=PLAN_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(plans)
+
+
+def export_plan_json(plans, output_path, totals=None):
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({"totals": totals or summarize_plan(plans), "files": plans}, f,
+                  ensure_ascii=False, indent=1)
+
+
+def export_plan(plans, output_path, totals=None):
+    """按扩展名导出为CSV或JSON"""
+    if os.path.splitext(output_path)[1].lower() == ".csv":
+        export_plan_csv(plans, output_path)
+    else:
+        export_plan_json(plans, output_path, totals)
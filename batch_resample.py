@@ -0,0 +1,291 @@
+"""同尺寸小图片的批量向量化缩放
+
+图标、精灵图文件夹里常有成千上万张尺寸和模式都相同的小图片，逐张处理时每张都要付出
+进程间传递、Python调用和Pillow调用的固定开销。这里按(尺寸, 模式, 格式)分组，
+每组由一个工作进程一次处理：逐张解码后叠成NumPy数组，用预先计算的可分离LANCZOS权重
+以矩阵乘法一次完成整组的横向和纵向缩放，再拆分成单张图片编码和替换原文件。
+
+缩放按Pillow的做法计算（先横向后纵向，每个方向后舍入到8位，RGBA/LA先预乘透明度），
+用float32计算，与Image.resize的结果在预乘透明度后最多相差1级
+（RGBA/LA还原透明度时会放大这个差别，透明度很低的像素可能相差更多）。
+需要安装numpy，未安装时不分组，全部逐张处理。
+"""
+import os
+
+from PIL import Image
+
+import resize_engine
+from stage_timing import StageTimer
+
+NUMPY_AVAILABLE = True
+try:
+    import numpy as np
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# 只对不超过此像素数的图片分组：更大的图片上Pillow自身的缩放已经不比矩阵乘法慢，
+# 每张的固定开销相对也很小
+BATCH_MAX_PIXELS = 64 * 64
+
+# 只读取不超过此字节数的文件的文件头（未压缩的像素数据加上元数据的余量），
+# 大文件不可能是分组的小图片，不需要打开
+BATCH_MAX_FILE_BYTES = BATCH_MAX_PIXELS * 4 + 64 * 1024
+
+# 同一组至少要有这么多张图片才批量处理（张数太少时矩阵乘法不比逐张缩放快）
+BATCH_MIN_GROUP = 32
+
+# 每组缩放时的float32数组不超过此字节数，超出时平均拆成多组
+# （数组能放进CPU缓存时最快，组数多一些也便于分给多个工作进程）
+BATCH_MAX_BYTES = 8 * 1024 * 1024
+
+# 可以批量缩放的图像模式；P和1模式Pillow使用最近邻缩放，仍然逐张处理。
+# JPEG会按目标尺寸缩小解码，每张的解码尺寸与文件头不同，也逐张处理
+BATCH_MODES = ("L", "LA", "RGB", "RGBA")
+BATCH_EXCLUDED_FORMATS = ("JPEG",)
+BATCH_EXCLUDED_EXTENSIONS = (".jpg", ".jpeg")
+
+# LANCZOS滤波器的支撑半径（与Pillow相同）
+LANCZOS_SUPPORT = 3.0
+
+# 与Pillow相同，需要预乘透明度的模式及透明度所在的通道
+PREMULTIPLIED_MODES = {"LA": 1, "RGBA": 3}
+
+
+def lanczos(x):
+    """LANCZOS滤波器（a=3）"""
+    x = np.asarray(x, dtype=np.float64)
+    result = np.sinc(x) * np.sinc(x / LANCZOS_SUPPORT)
+    return np.where(np.abs(x) < LANCZOS_SUPPORT, result, 0.0)
+
+
+def lanczos_weights(in_size, out_size):
+    """一个方向的缩放权重矩阵（out_size × in_size），窗口和归一化与Pillow的precompute_coeffs相同"""
+    scale = in_size / out_size
+    filterscale = max(scale, 1.0)
+    support = LANCZOS_SUPPORT * filterscale
+
+    weights = np.zeros((out_size, in_size), dtype=np.float64)
+    for xx in range(out_size):
+        center = (xx + 0.5) * scale
+        xmin = max(int(center - support + 0.5), 0)
+        xmax = min(int(center + support + 0.5), in_size)
+        w = lanczos((np.arange(xmin, xmax) - center + 0.5) / filterscale)
+        total = w.sum()
+        if total:
+            w /= total
+        weights[xx, xmin:xmax] = w
+    return weights.astype(np.float32)
+
+
+def round_pixels(planes):
+    """与Pillow相同，每个方向缩放之后舍入并截断到0-255（原地修改）"""
+    planes += 0.5
+    np.floor(planes, out=planes)
+    return np.clip(planes, 0, 255, out=planes)
+
+
+def premultiply(planes, alpha_channel):
+    """与Pillow的RGBA → RGBa转换相同：颜色通道乘以透明度/255并舍入
+
+    planes为(张数, 通道, 高, 宽)的uint8数组，返回float32数组。
+    """
+    alpha = planes[:, alpha_channel:alpha_channel + 1].astype(np.uint16)
+    colors = planes[:, :alpha_channel] * alpha + 128
+    colors = ((colors >> 8) + colors) >> 8
+    return np.concatenate([colors, alpha], axis=1).astype(np.float32)
+
+
+def unpremultiply(planes, alpha_channel):
+    """与Pillow的RGBa → RGBA转换相同：透明度为0或255时不变，否则除以透明度/255并截断（原地修改）
+
+    被除数不超过255*255，float32的除法不会越过整数，截断结果与整数除法相同。
+    """
+    alpha = planes[:, alpha_channel:alpha_channel + 1]
+    colors = planes[:, :alpha_channel]
+    divided = np.minimum(np.floor(colors * 255 / np.maximum(alpha, 1)), 255)
+    planes[:, :alpha_channel] = np.where((alpha == 0) | (alpha == 255), colors, divided)
+    return planes
+
+
+def resample_stack(stack, new_size, image_mode):
+    """用LANCZOS缩放一组尺寸相同的图片
+
+    stack为(张数, 高, 宽[, 通道])的uint8数组，返回(张数, 新高, 新宽[, 通道])的uint8数组。
+    按通道分开排列后，横向缩放是一次矩阵乘法，纵向缩放是每个通道平面一次矩阵乘法。
+    """
+    squeeze = stack.ndim == 3
+    if squeeze:
+        stack = stack[..., np.newaxis]
+    count, height, width, channels = stack.shape
+    new_width, new_height = new_size
+
+    planes = np.ascontiguousarray(stack.transpose(0, 3, 1, 2))  # (张数, 通道, 高, 宽)
+    alpha_channel = PREMULTIPLIED_MODES.get(image_mode)
+    if alpha_channel is not None:
+        planes = premultiply(planes, alpha_channel)
+    else:
+        planes = planes.astype(np.float32)
+
+    if new_width != width:
+        planes = planes.reshape(-1, width) @ lanczos_weights(width, new_width).T
+        planes = round_pixels(planes).reshape(count, channels, height, new_width)
+    if new_height != height:
+        planes = np.matmul(lanczos_weights(height, new_height),
+                           planes.reshape(count * channels, height, new_width))
+        planes = round_pixels(planes).reshape(count, channels, new_height, new_width)
+
+    if alpha_channel is not None:
+        planes = unpremultiply(planes, alpha_channel)
+    result = planes.astype(np.uint8).transpose(0, 2, 3, 1)
+    return result[..., 0] if squeeze else result
+
+
+def read_header(file_path):
+    """读取文件头，返回(尺寸, 模式, 格式)，无法读取时返回None"""
+    try:
+        with resize_engine.open_image(file_path) as img:
+            return img.size, img.mode, img.format
+    except Exception:
+        return None
+
+
+def group_images(paths, mode, scale=1.0, target_size="", control=None):
+    """按(尺寸, 模式, 格式)把需要缩放的小图片分组，返回(分组列表, 其余文件列表, 文件头)
+
+    每个分组为字典：paths、size、mode、format、new_size。
+    只打开扩展名和文件大小可能是小图片的文件，只读取文件头，不解码；
+    读取过的文件头以{文件路径: (尺寸, 模式, 格式, 文件大小)}返回，估算其余文件的内存时不再打开。
+    传入control（BatchControl）时，暂停期间等待，取消后立即返回（未检查的文件归入其余文件）。
+    """
+    paths = list(paths)
+    candidates = {}
+    singles = []
+    headers = {}
+    for index, file_path in enumerate(paths):
+        if control is not None and not control.proceed():
+            singles.extend(paths[index:])
+            break
+        if os.path.splitext(file_path)[1].lower() in BATCH_EXCLUDED_EXTENSIONS:
+            singles.append(file_path)
+            continue
+        try:
+            file_size = os.path.getsize(file_path)
+        except OSError:
+            singles.append(file_path)  # 由逐张处理报告错误
+            continue
+        if file_size > BATCH_MAX_FILE_BYTES:
+            singles.append(file_path)
+            continue
+        header = read_header(file_path)
+        if header is None:
+            singles.append(file_path)
+            continue
+        size, image_mode, image_format = header
+        headers[file_path] = (size, image_mode, image_format, file_size)
+        if (image_mode not in BATCH_MODES or image_format in BATCH_EXCLUDED_FORMATS
+                or size[0] * size[1] > BATCH_MAX_PIXELS):
+            singles.append(file_path)
+            continue
+        action, new_size = resize_engine.plan_action(size[0], size[1], mode, scale, target_size)
+        if action != "resize":
+            singles.append(file_path)  # 不需要缩放，逐张处理也没有解码开销
+            continue
+        candidates.setdefault((size, image_mode, image_format), []).append(file_path)
+
+    groups = []
+    for (size, image_mode, image_format), members in candidates.items():
+        if len(members) < BATCH_MIN_GROUP:
+            singles.extend(members)
+            continue
+        new_size = resize_engine.compute_new_size(size[0], size[1], mode, scale, target_size)
+        # 每组的float32数组（原图和横向缩放的中间结果中较大的一个）不超过BATCH_MAX_BYTES
+        channels = len(image_mode)
+        image_bytes = max(size[0], new_size[0]) * max(size[1], new_size[1]) * channels * 4
+        chunks = -(-len(members) // max(BATCH_MIN_GROUP, BATCH_MAX_BYTES // image_bytes))
+        chunk = -(-len(members) // chunks)
+        for start in range(0, len(members), chunk):
+            groups.append({"paths": members[start:start + chunk], "size": size, "mode": image_mode,
+                           "format": image_format, "new_size": new_size})
+    return groups, singles, headers
+
+
+def group_peak_memory(group, mode, scale=1.0, target_size="", quality="exact", max_bytes=None):
+    """一组图片的预计内存峰值：逐张处理的峰值之和加上float32数组"""
+    width, height = group["size"]
+    per_image = resize_engine.estimate_peak_memory(width, height, group["mode"], group["format"],
+                                                   mode, scale, target_size, quality, None, max_bytes)
+    new_width, new_height = group["new_size"]
+    stack = max(width, new_width) * max(height, new_height) * len(group["mode"]) * 4 * 2
+    return (per_image + stack) * len(group["paths"])
+
+
+def process_group(group, mode, scale=1.0, target_size="", quality="exact", max_bytes=None, timing=False):
+    """在一个工作进程中处理一组尺寸和模式相同的图片，返回每张图片的结果字典列表
+
+    解码、编码和替换原文件仍然逐张进行，只有缩放整组一次完成。
+    文件在分组之后被修改（尺寸或模式不同）时，这张图片按普通流程处理。
+    """
+    pad_target = target_size if mode == "target_size" and target_size else ""
+    results = []
+    arrays = []  # (结果字典, 计时器, 像素数组)
+    for file_path in group["paths"]:
+        result = {"path": file_path, "ok": False, "skipped": None,
+                  "original_size": 0, "new_size": 0, "error": None}
+        timer = StageTimer(timing)
+        try:
+            result["original_size"] = os.path.getsize(file_path)
+            with timer.stage("open") as record:
+                img = resize_engine.open_image(file_path)
+                record["bytes"] = result["original_size"]
+            if img.size != tuple(group["size"]) or img.mode != group["mode"]:
+                img.close()
+                results.append(resize_engine.process_image(file_path, mode, scale, target_size,
+                                                           quality, max_bytes, timing))
+                continue
+            with img:
+                with timer.stage("decode"):
+                    pixels = np.asarray(img)
+            result["width"], result["height"] = img.size
+            result["action"] = "resize"
+            result["batched"] = True
+            arrays.append((result, timer, pixels))
+        except Exception as e:
+            import traceback
+            result["error"] = f"{e}"
+            result["traceback"] = traceback.format_exc()
+            results.append(result)
+    if not arrays:
+        return results
+
+    # 整组一次缩放，计时平均分给每张图片
+    timer = StageTimer(timing)
+    try:
+        with timer.stage("resize"):
+            resampled = resample_stack(np.stack([pixels for _, _, pixels in arrays]),
+                                       tuple(group["new_size"]), group["mode"])
+    except MemoryError:
+        # 内存不足时这一组改为逐张处理
+        for result, _, _ in arrays:
+            results.append(resize_engine.process_image(result["path"], mode, scale, target_size,
+                                                       quality, max_bytes, timing))
+        return results
+    for result, file_timer, _ in arrays:
+        for record in timer.stages:
+            file_timer.stages.append(dict(record, duration=record["duration"] / len(arrays)))
+
+    for (result, file_timer, _), pixels in zip(arrays, resampled):
+        file_path = result["path"]
+        try:
+            resized_img = Image.fromarray(pixels)
+            data = resize_engine.encode_output(resized_img, file_path, result, pad_target, quality,
+                                               max_bytes, file_timer)
+            resize_engine.write_output(file_path, data, result, file_timer)
+        except Exception as e:
+            import traceback
+            result["error"] = f"{e}"
+            result["traceback"] = traceback.format_exc()
+        if timing:
+            result["stages"] = file_timer.stages
+            result["pid"] = os.getpid()
+        results.append(result)
+    return results
@@ -0,0 +1,391 @@
+"""性能基准测试
+
+生成确定性的合成图片集（JPEG/PNG/BMP/GIF/WebP/TIFF，从图标到1亿像素，RGB、RGBA和P模式），
+分别计时文件夹扫描、缩略图、预览、完整的批量处理流程（每种缩放模式）和大量小文件的处理，
+结果写入JSON文件；指定基准文件时与之比较，超过阈值的项目视为性能退化。
+同时检查JPEG缩小解码与完整解码缩放结果的PSNR，确认缩小解码没有明显降低画质。
+
+用法示例：
+    python benchmark.py --output bench.json
+    python benchmark.py --profile full --baseline bench.json --threshold 0.15
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import platform
+import tempfile
+import statistics
+
+import PIL
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+
+import resize_engine
+from folder_scanner import scan_folder
+from thumbnail_cache import ThumbnailCache, create_thumbnail
+from preview_cache import PreviewCache, load_preview_image
+
+# 合成图片集：(名称, 扩展名, 宽, 高, 模式, 份数)
+CORPUS_SPECS = {
+    "quick": [
+        ("icon", ".png", 32, 32, "RGBA", 20),
+        ("icon", ".gif", 64, 64, "P", 20),
+        ("small", ".jpg", 640, 480, "RGB", 10),
+        ("small", ".bmp", 640, 480, "RGB", 5),
+        ("small", ".webp", 800, 600, "RGBA", 5),
+        ("medium", ".jpg", 1920, 1080, "RGB", 4),
+        ("medium", ".png", 1920, 1080, "RGBA", 2),
+        ("medium", ".tiff", 1600, 1200, "RGB", 2),
+        ("medium", ".gif", 1024, 768, "P", 2),
+        ("large", ".jpg", 4000, 3000, "RGB", 2),
+        ("large", ".png", 4000, 3000, "RGB", 1),
+        ("large", ".webp", 4000, 3000, "RGB", 1),
+    ],
+}
+CORPUS_SPECS["full"] = CORPUS_SPECS["quick"] + [
+    ("huge", ".jpg", 10000, 10000, "RGB", 1),
+    ("huge", ".png", 10000, 10000, "RGBA", 1),
+    ("huge", ".tiff", 12000, 8400, "RGB", 1),
+]
+
+# 扫描测试的空文件树：(文件夹数, 每个文件夹的文件数)
+SCAN_TREE = {"quick": (20, 250), "full": (100, 500)}
+
+# 小文件测试：同一张图标复制的份数。逐张处理（不分组整组缩放），
+# 比较进程池与单进程顺序处理，检查每个文件的进程间通信开销
+SMALL_FILE_COUNT = {"quick": 1000, "full": 2000}
+SMALL_FILE_SIZE = (64, 64)
+
+# 完整处理流程的测试模式：(名称, resize_batch的关键字参数)
+PIPELINE_MODES = [
+    ("scale_0.5_exact", {"mode": "scale", "scale": 0.5, "quality": "exact"}),
+    ("scale_0.5_fast", {"mode": "scale", "scale": 0.5, "quality": "fast"}),
+    ("scale_1.0_noop", {"mode": "scale", "scale": 1.0}),
+    ("target_512", {"mode": "target_size", "target_size": "512x512"}),
+    ("max_bytes_200k", {"mode": "scale", "scale": 0.5, "max_bytes": 200 * 1024}),
+]
+
+# 多尺寸导出测试的尺寸（较小的尺寸，耗时主要在解码，正是多尺寸导出要节省的部分）
+PYRAMID_SIZES = ["512x512", "256x256", "128x128", "64x64", "32x32"]
+
+# JPEG缩小解码与完整解码结果的最低PSNR（dB）
+DRAFT_MIN_PSNR = 40.0
+
+# 默认的退化阈值：比基准慢20%以上视为退化
+DEFAULT_THRESHOLD = 0.2
+
+# 基准耗时低于此值（秒）的项目受计时误差影响太大，只显示不判断退化
+MIN_COMPARE_SECONDS = 0.05
+
+NOISE_TILE = 256
+
+
+def synthetic_image(width, height, mode, seed):
+    """生成确定性的测试图片：渐变背景 + 随机图形 + 平铺的噪声纹理"""
+    rng = random.Random(seed)
+    gradient = Image.linear_gradient("L")
+    red = gradient.resize((width, height))
+    green = gradient.rotate(90).resize((width, height))
+    blue = Image.radial_gradient("L").resize((width, height))
+    img = Image.merge("RGB", (red, green, blue))
+
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x1, y1 = rng.randrange(width), rng.randrange(height)
+        x2, y2 = x1 + rng.randrange(1, width // 2 + 2), y1 + rng.randrange(1, height // 2 + 2)
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        if rng.random() < 0.5:
+            draw.ellipse((x1, y1, x2, y2), fill=color)
+        else:
+            draw.rectangle((x1, y1, x2, y2), fill=color)
+
+    # 噪声纹理让JPEG/PNG的压缩率接近照片
+    tile = Image.frombytes("RGB", (NOISE_TILE, NOISE_TILE), rng.randbytes(NOISE_TILE * NOISE_TILE * 3))
+    noise = Image.new("RGB", (width, height))
+    for y in range(0, height, NOISE_TILE):
+        for x in range(0, width, NOISE_TILE):
+            noise.paste(tile, (x, y))
+    img = Image.blend(img, noise, 0.12)
+
+    if mode == "RGBA":
+        img.putalpha(Image.radial_gradient("L").resize((width, height)))
+    elif mode == "P":
+        img = img.quantize(64)
+    return img
+
+
+def corpus_signature(specs):
+    return hashlib.sha1(json.dumps(specs).encode("utf-8")).hexdigest()
+
+
+def build_corpus(corpus_dir, profile):
+    """生成（或复用已生成的）测试图片集，返回图片路径列表"""
+    specs = CORPUS_SPECS[profile]
+    signature = corpus_signature([specs, SCAN_TREE[profile], PIL.__version__])
+    marker = os.path.join(corpus_dir, "corpus.json")
+    images_dir = os.path.join(corpus_dir, "images")
+
+    if os.path.exists(marker):
+        with open(marker, encoding="utf-8") as f:
+            info = json.load(f)
+        if info.get("signature") == signature:
+            return info["files"]
+        shutil.rmtree(corpus_dir)
+
+    os.makedirs(images_dir, exist_ok=True)
+    files = []
+    for index, (name, ext, width, height, mode, copies) in enumerate(specs):
+        print(f"生成测试图片: {name} {width}x{height} {mode}{ext} x{copies}")
+        img = synthetic_image(width, height, mode, seed=index)
+        first = os.path.join(images_dir, f"{name}_{index}_0{ext}")
+        save_img = img.convert("RGB") if ext in (".jpg", ".bmp") and img.mode != "RGB" else img
+        save_img.save(first)
+        files.append(first)
+        for copy in range(1, copies):
+            path = os.path.join(images_dir, f"{name}_{index}_{copy}{ext}")
+            shutil.copyfile(first, path)
+            files.append(path)
+
+    # 扫描测试用的空文件树
+    dirs, per_dir = SCAN_TREE[profile]
+    for d in range(dirs):
+        folder = os.path.join(corpus_dir, "scan_tree", f"d{d // 10}", f"d{d}")
+        os.makedirs(folder, exist_ok=True)
+        for i in range(per_dir):
+            open(os.path.join(folder, f"f{i}.jpg" if i % 4 else f"f{i}.txt"), "wb").close()
+
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump({"signature": signature, "files": files}, f, ensure_ascii=False)
+    return files
+
+
+def build_small_files(corpus_dir, profile):
+    """生成（或复用已生成的）小文件测试的图标，返回路径列表"""
+    folder = os.path.join(corpus_dir, "small_files")
+    files = [os.path.join(folder, f"icon_{i}.png") for i in range(SMALL_FILE_COUNT[profile])]
+    if all(os.path.exists(path) for path in files):
+        return files
+
+    os.makedirs(folder, exist_ok=True)
+    print(f"生成小文件测试图片: {SMALL_FILE_SIZE[0]}x{SMALL_FILE_SIZE[1]} RGBA.png x{len(files)}")
+    synthetic_image(*SMALL_FILE_SIZE, "RGBA", seed=0).save(files[0])
+    for path in files[1:]:
+        shutil.copyfile(files[0], path)
+    return files
+
+
+def time_runs(func, repeat, setup=None):
+    """重复执行func，返回每次的耗时（秒）；setup在每次执行前调用，不计时"""
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def record(results, name, runs, **extra):
+    results[name] = dict(seconds=statistics.median(runs), runs=[round(r, 4) for r in runs], **extra)
+    print(f"{name:<28} {results[name]['seconds']:.3f}s")
+
+
+def bench_scan(results, corpus_dir, repeat):
+    tree = os.path.join(corpus_dir, "scan_tree")
+    found = []
+    runs = time_runs(lambda: found.append(len(scan_folder(tree, resize_engine.SUPPORTED_EXTENSIONS))),
+                     repeat)
+    record(results, "scan", runs, files=found[-1])
+
+
+def bench_thumbnails(results, files, work_dir, repeat):
+    runs = time_runs(lambda: [create_thumbnail(path, (80, 80)) for path in files], repeat)
+    record(results, "thumbnail_create", runs, files=len(files))
+
+    cache = ThumbnailCache(os.path.join(work_dir, "thumbnails.db"))
+    try:
+        for path in files:
+            cache.put(path, (80, 80), create_thumbnail(path, (80, 80)))
+        runs = time_runs(lambda: [cache.get(path, (80, 80)) for path in files], repeat)
+        record(results, "thumbnail_cache_hit", runs, files=len(files))
+    finally:
+        cache.close()
+
+
+def bench_preview(results, files, repeat):
+    runs = time_runs(lambda: [load_preview_image(path) for path in files], repeat)
+    record(results, "preview_load", runs, files=len(files))
+
+    cache = PreviewCache()
+    for path in files:
+        cache.get_or_load(path)
+    runs = time_runs(lambda: [cache.get(path) for path in files], repeat)
+    record(results, "preview_cache_hit", runs, files=len(files))
+
+
+def bench_pipeline(results, files, work_dir, repeat, workers):
+    """完整的批量处理流程：每次计时前把图片复制到工作目录（复制不计时）"""
+    work_files = [os.path.join(work_dir, os.path.basename(path)) for path in files]
+    total_bytes = sum(os.path.getsize(path) for path in files)
+
+    def copy_corpus():
+        for src, dst in zip(files, work_files):
+            shutil.copyfile(src, dst)
+
+    for name, kwargs in PIPELINE_MODES:
+        failed = []
+
+        def run():
+            failed.clear()
+            for result in resize_engine.resize_batch(work_files, workers=workers, **kwargs):
+                if not result["ok"]:
+                    failed.append(result["path"])
+
+        runs = time_runs(run, repeat, setup=copy_corpus)
+        record(results, f"pipeline_{name}", runs, files=len(files), failed=len(failed),
+               mb_per_s=round(total_bytes / 1024 / 1024 / statistics.median(runs), 2))
+
+    def run_pyramid():
+        for result in resize_engine.pyramid_batch(work_files, PYRAMID_SIZES, "folder", workers):
+            if not result["ok"]:
+                print(f"多尺寸导出失败: {result['path']}, 错误: {result['error']}")
+
+    runs = time_runs(run_pyramid, repeat, setup=copy_corpus)
+    record(results, "pipeline_pyramid", runs, files=len(files))
+
+
+def bench_small_files(results, files, work_dir, repeat, workers):
+    """大量小文件逐张处理：单进程顺序处理和进程池各计时一次"""
+    small_dir = os.path.join(work_dir, "small_files")
+    os.makedirs(small_dir, exist_ok=True)
+    work_files = [os.path.join(small_dir, os.path.basename(path)) for path in files]
+
+    def copy_files():
+        for src, dst in zip(files, work_files):
+            shutil.copyfile(src, dst)
+
+    for name, count in (("pipeline_small_files_serial", 1), ("pipeline_small_files", workers)):
+        def run():
+            for result in resize_engine.resize_batch(work_files, "scale", 0.5, workers=count,
+                                                     vectorize=False):
+                if not result["ok"]:
+                    print(f"处理失败: {result['path']}, 错误: {result['error']}")
+
+        runs = time_runs(run, repeat, setup=copy_files)
+        record(results, name, runs, files=len(files))
+
+
+def psnr(a, b):
+    """两张同尺寸RGB图像的PSNR（dB）"""
+    diff = ImageChops.difference(a, b)
+    mse = sum(rms * rms for rms in ImageStat.Stat(diff).rms) / len(diff.getbands())
+    return float("inf") if mse == 0 else 20 * math.log10(255 / math.sqrt(mse))
+
+
+def check_jpeg_draft(results, files):
+    """比较JPEG缩小解码和完整解码后缩放的结果"""
+    values = []
+    for path in files:
+        if os.path.splitext(path)[1] != ".jpg" or not path.endswith("_0.jpg"):
+            continue
+        for scale in (0.5, 0.25, 0.1):
+            full = Image.open(path)
+            new_size = resize_engine.compute_new_size(full.width, full.height, "scale", scale)
+            expected = resize_engine.resize_image(full, new_size)
+
+            draft = Image.open(path)
+            resize_engine.apply_jpeg_draft(draft, new_size)
+            values.append(psnr(expected.convert("RGB"),
+                               resize_engine.resize_image(draft, new_size).convert("RGB")))
+
+    min_psnr = min(values) if values else float("inf")
+    results["jpeg_draft_quality"] = {"min_psnr": round(min_psnr, 2), "checked": len(values),
+                                     "ok": min_psnr >= DRAFT_MIN_PSNR}
+    print(f"{'jpeg_draft_quality':<28} 最低PSNR {min_psnr:.1f}dB")
+
+
+def compare(results, baseline, threshold):
+    """与基准结果比较，返回退化的项目列表"""
+    regressions = []
+    for name, entry in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old or "seconds" not in entry or "seconds" not in old or not old["seconds"]:
+            continue
+        ratio = entry["seconds"] / old["seconds"]
+        entry["baseline_seconds"] = old["seconds"]
+        entry["ratio"] = round(ratio, 3)
+        mark = "退化" if ratio > 1 + threshold and old["seconds"] >= MIN_COMPARE_SECONDS else ""
+        print(f"{name:<28} {old['seconds']:.3f}s -> {entry['seconds']:.3f}s ({ratio:.2f}x) {mark}")
+        if mark:
+            regressions.append(name)
+    return regressions
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="图片批量缩放工具的性能基准测试")
+    parser.add_argument("--profile", choices=sorted(CORPUS_SPECS), default="quick",
+                        help="quick不含1亿像素的图片；full包含，需要数GB内存")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "图片批量缩放工具_bench"),
+                        help="测试图片集的位置，参数不变时重复使用")
+    parser.add_argument("--output", default="benchmark.json", help="结果文件（JSON）")
+    parser.add_argument("--baseline", default="", help="与之比较的基准结果文件")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="比基准慢多少（比例）视为退化，默认0.2")
+    parser.add_argument("--repeat", type=int, default=3, help="每项测试重复次数，取中位数")
+    parser.add_argument("--workers", type=int, default=None, help="批量处理的并行进程数")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    corpus_dir = os.path.join(args.corpus_dir, args.profile)
+    files = build_corpus(corpus_dir, args.profile)
+
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        bench_scan(results, corpus_dir, args.repeat)
+        bench_thumbnails(results, files, work_dir, args.repeat)
+        bench_preview(results, files, args.repeat)
+        bench_pipeline(results, files, work_dir, args.repeat, args.workers)
+        bench_small_files(results, build_small_files(corpus_dir, args.profile), work_dir,
+                          args.repeat, args.workers)
+        check_jpeg_draft(results, files)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "profile": args.profile,
+            "repeat": args.repeat,
+            "workers": args.workers or resize_engine.default_worker_count(),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+
+    failed = not results["jpeg_draft_quality"]["ok"]
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        report["regressions"] = regressions
+        failed = failed or bool(regressions)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"结果已保存到: {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""有序文件登记表
+
+按添加顺序保存文件，同时以规范化路径为键建立哈希索引：判断是否存在是O(1)。
+删除只留下空位，另用树状数组（Fenwick树）记录每个槽位是否有文件，
+删除、按位置访问和查找位置都是O(log n)，删除后刷新界面也不需要整理整个列表；
+空位超过一半时才整理一次，均摊到每次删除是O(1)。
+每个文件条目带有元数据槽位，供界面和处理引擎共用。
+"""
+import os
+
+
+def normalize_key(file_path):
+    """规范化路径（绝对路径、统一大小写和分隔符），用于判断重复"""
+    return os.path.normcase(os.path.abspath(file_path))
+
+
+class FileEntry:
+    __slots__ = ("path", "key", "metadata")
+
+    def __init__(self, path, key):
+        self.path = path
+        self.key = key
+        self.metadata = None  # 文件头信息，见image_metadata
+
+
+class FileRegistry:
+    def __init__(self, paths=()):
+        self.entries = []  # 按添加顺序排列，删除后留下None
+        self.positions = {}  # 规范化路径 -> 在entries中的下标
+        self.removed = 0  # entries中None的数量
+        self.tree = [0]  # 树状数组（下标从1开始），tree[i]为entries[i-lowbit(i):i]中的文件数
+        self.extend(paths)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, file_path):
+        return normalize_key(file_path) in self.positions
+
+    def __iter__(self):
+        return (entry.path for entry in self.entries if entry is not None)
+
+    def __getitem__(self, index):
+        """按位置返回文件路径"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("文件位置超出范围")
+        return self.entries[self._slot(index)].path
+
+    def add(self, file_path):
+        """添加文件，已存在时返回False"""
+        key = normalize_key(file_path)
+        if key in self.positions:
+            return False
+        self.positions[key] = len(self.entries)
+        self.entries.append(FileEntry(file_path, key))
+        # 新节点覆盖的区间中，除自身以外的部分由若干已有节点拼成
+        node = len(self.entries)
+        count = 1
+        child = node - 1
+        while child > node - (node & -node):
+            count += self.tree[child]
+            child -= child & -child
+        self.tree.append(count)
+        return True
+
+    def extend(self, file_paths):
+        """批量添加，返回实际新增的文件路径"""
+        return [file_path for file_path in file_paths if self.add(file_path)]
+
+    def index(self, file_path):
+        """返回文件的位置，不存在时抛出ValueError"""
+        key = normalize_key(file_path)
+        if key not in self.positions:
+            raise ValueError(f"文件不在列表中: {file_path}")
+        # 位置为该槽位之前的文件数
+        position = 0
+        node = self.positions[key]
+        while node > 0:
+            position += self.tree[node]
+            node -= node & -node
+        return position
+
+    def entry(self, file_path):
+        """返回文件条目，不存在时返回None"""
+        position = self.positions.get(normalize_key(file_path))
+        return None if position is None else self.entries[position]
+
+    def remove(self, file_path):
+        """删除文件，不存在时抛出ValueError"""
+        key = normalize_key(file_path)
+        if key not in self.positions:
+            raise ValueError(f"文件不在列表中: {file_path}")
+        # positions中保存的是entries的下标，留下空位即可，不移动其他条目
+        slot = self.positions.pop(key)
+        self.entries[slot] = None
+        self.removed += 1
+        node = slot + 1
+        while node < len(self.tree):
+            self.tree[node] -= 1
+            node += node & -node
+        if self.removed * 2 > len(self.entries):
+            self._compact()
+
+    def clear(self):
+        self.entries = []
+        self.positions = {}
+        self.removed = 0
+        self.tree = [0]
+
+    def _slot(self, index):
+        """第index个文件（从0开始）在entries中的下标：在树状数组上从高位到低位查找"""
+        slot = 0
+        remaining = index + 1
+        step = 1 << (len(self.entries).bit_length() - 1) if self.entries else 0
+        while step:
+            node = slot + step
+            if node < len(self.tree) and self.tree[node] < remaining:
+                slot = node
+                remaining -= self.tree[node]
+            step >>= 1
+        return slot
+
+    def _compact(self):
+        """去掉删除留下的空位，重建位置索引和树状数组"""
+        entries = [entry for entry in self.entries if entry is not None]
+        self.clear()
+        for entry in entries:
+            self.positions[entry.key] = len(self.entries)
+            self.entries.append(entry)
+        # 全部都有文件时，tree[i]就是区间长度lowbit(i)
+        self.tree = [0] + [node & -node for node in range(1, len(entries) + 1)]
@@ -0,0 +1,112 @@
+"""并行流式文件夹扫描
+
+多个线程基于os.scandir并行遍历子目录，每扫描完一个目录就把找到的图片放入结果队列，
+调用方可以随时取回已找到的文件、显示实时计数，也可以中途取消并使用已找到的部分结果。
+"""
+import os
+import queue
+import threading
+
+
+def default_thread_count():
+    """扫描线程数：目录遍历主要是等待IO（尤其是网络共享），线程数可以多于CPU核心"""
+    return min(16, (os.cpu_count() or 1) * 4)
+
+
+class FolderScanner:
+    def __init__(self, root_path, extensions, threads=None):
+        self.root_path = root_path
+        self.extensions = tuple(extensions)
+        self.thread_count = threads or default_thread_count()
+
+        self.directories = queue.Queue()
+        self.results = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+
+        # 排队和正在扫描的目录数，降为0时扫描结束
+        self.pending = 0
+        self.lock = threading.Lock()
+
+        self.found_count = 0
+        self.scanned_dirs = 0
+
+    def start(self):
+        self._add_directory(self.root_path)
+        for _ in range(self.thread_count):
+            threading.Thread(target=self._worker, daemon=True).start()
+        return self
+
+    def cancel(self):
+        """停止扫描，已找到的结果仍然可以通过drain()取回"""
+        self.cancel_event.set()
+
+    @property
+    def done(self):
+        return self.done_event.is_set()
+
+    def drain(self):
+        """取回自上次调用以来新找到的文件"""
+        found = []
+        try:
+            while True:
+                found.extend(self.results.get_nowait())
+        except queue.Empty:
+            pass
+        return found
+
+    def wait(self):
+        """阻塞直到扫描结束，返回全部结果（按路径排序）"""
+        self.done_event.wait()
+        return sorted(self.drain())
+
+    def _add_directory(self, path):
+        with self.lock:
+            self.pending += 1
+        self.directories.put(path)
+
+    def _finish_directory(self):
+        with self.lock:
+            self.pending -= 1
+            self.scanned_dirs += 1
+            finished = self.pending == 0
+        if finished:
+            self.done_event.set()
+            # 唤醒其他空闲的工作线程退出
+            for _ in range(self.thread_count):
+                self.directories.put(None)
+
+    def _worker(self):
+        while True:
+            path = self.directories.get()
+            if path is None:
+                return
+
+            found = []
+            try:
+                if not self.cancel_event.is_set():
+                    with os.scandir(path) as entries:
+                        for entry in entries:
+                            if self.cancel_event.is_set():
+                                break
+                            try:
+                                # 与os.walk默认行为一致，不进入符号链接指向的目录
+                                if entry.is_dir(follow_symlinks=False):
+                                    self._add_directory(entry.path)
+                                elif os.path.splitext(entry.name)[1].lower() in self.extensions:
+                                    found.append(entry.path)
+                            except OSError:
+                                continue
+            except OSError as e:
+                print(f"无法读取文件夹: {path}, 错误: {e}")
+
+            if found:
+                with self.lock:
+                    self.found_count += len(found)
+                self.results.put(found)
+            self._finish_directory()
+
+
+def scan_folder(root_path, extensions, threads=None):
+    """同步扫描一个文件夹，返回按路径排序的全部图片文件"""
+    return FolderScanner(root_path, extensions, threads).start().wait()
@@ -0,0 +1,61 @@
+"""图片元数据缓存
+
+只读取文件头获取尺寸、模式、格式，以及文件大小和修改时间。
+每个文件只读取一次，结果保存在文件登记表条目的元数据槽位中，
+界面上的信息更新全部从这里读取，不再访问磁盘。
+"""
+import os
+import threading
+
+from PIL import Image
+
+
+def read_image_metadata(file_path):
+    """读取文件头，返回元数据字典（不解码像素）"""
+    stat = os.stat(file_path)
+    with Image.open(file_path) as img:
+        return {
+            "width": img.width,
+            "height": img.height,
+            "mode": img.mode,
+            "format": img.format,
+            "file_size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+
+class ImageMetadataStore:
+    def __init__(self, registry):
+        self.registry = registry
+
+    def get(self, file_path):
+        """读取元数据，没有记录时读取一次文件头"""
+        entry = self.registry.entry(file_path)
+        if entry is not None and entry.metadata is not None:
+            return entry.metadata
+
+        record = read_image_metadata(file_path)
+        if entry is not None:
+            entry.metadata = record
+        return record
+
+    def prefill(self, file_paths):
+        """在后台线程中读取新添加文件的文件头"""
+        entries = [self.registry.entry(file_path) for file_path in file_paths]
+
+        def prefill_thread():
+            for entry in entries:
+                if entry is None or entry.metadata is not None:
+                    continue
+                try:
+                    entry.metadata = read_image_metadata(entry.path)
+                except Exception as e:
+                    print(f"读取图片信息失败: {entry.path}, 错误: {e}")
+
+        threading.Thread(target=prefill_thread, daemon=True).start()
+
+    def invalidate(self, file_path):
+        """文件被修改后删除记录，下次使用时重新读取"""
+        entry = self.registry.entry(file_path)
+        if entry is not None:
+            entry.metadata = None
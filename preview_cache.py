@@ -0,0 +1,149 @@
+"""预览图缓存与相邻图片预加载
+
+缓存的是缩小到预览分辨率的图像，而不是原图，总内存受字节上限约束（LRU淘汰）。
+后台线程提前解码当前图片前后若干张，切换预览时直接从缓存读取。
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+# 缓存的预览图最大尺寸，超过此尺寸的原图在解码时就缩小
+PREVIEW_MAX_SIZE = (1600, 1600)
+
+# 预览缓存的内存上限
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# 预加载当前图片前后各多少张
+PREFETCH_DISTANCE = 2
+
+# PhotoImage可以直接显示的图像模式
+DISPLAY_MODES = ("1", "L", "P", "RGB", "RGBA")
+
+
+def file_signature(file_path):
+    """文件大小和修改时间，用于判断缓存是否过期"""
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_preview_image(file_path, max_size=PREVIEW_MAX_SIZE):
+    """解码预览分辨率的图像，返回(图像, 原始尺寸)
+
+    在解码前调用thumbnail，JPEG会自动使用缩小解码。
+    """
+    img = Image.open(file_path)
+    original_size = img.size
+    img.thumbnail(max_size)
+    if img.mode not in DISPLAY_MODES:
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    return img, original_size
+
+
+def image_nbytes(img):
+    """估算图像占用的内存（Pillow中多通道图像每像素占4字节）"""
+    return img.width * img.height * (1 if len(img.getbands()) == 1 else 4)
+
+
+class PreviewCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_size=PREVIEW_MAX_SIZE):
+        self.max_bytes = max_bytes
+        self.max_size = max_size
+        self.entries = OrderedDict()  # 文件路径 -> (文件签名, 预览图, 原始尺寸, 字节数)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.loading = {}  # 文件路径 -> 正在解码的Event
+
+        # 预加载线程只处理最新一次提交的列表
+        self.prefetch_paths = []
+        self.prefetch_event = threading.Event()
+        threading.Thread(target=self._prefetch_worker, daemon=True).start()
+
+    def get(self, file_path):
+        """从缓存读取(预览图, 原始尺寸)，不存在或文件已修改时返回None"""
+        try:
+            signature = file_signature(file_path)
+        except OSError:
+            return None
+
+        with self.lock:
+            entry = self.entries.get(file_path)
+            if entry is None:
+                return None
+            if entry[0] != signature:
+                self._remove(file_path)
+                return None
+            self.entries.move_to_end(file_path)
+            return entry[1], entry[2]
+
+    def get_or_load(self, file_path):
+        """读取预览图，未命中时解码；如果预加载线程正在解码同一文件，则等待其完成"""
+        while True:
+            cached = self.get(file_path)
+            if cached is not None:
+                return cached
+
+            with self.lock:
+                event = self.loading.get(file_path)
+                if event is None:
+                    event = self.loading[file_path] = threading.Event()
+                    break
+            event.wait()
+
+        try:
+            return self._load(file_path)
+        finally:
+            with self.lock:
+                self.loading.pop(file_path, None)
+            event.set()
+
+    def prefetch(self, file_paths):
+        """在后台预加载这些文件，替换之前尚未完成的预加载列表"""
+        with self.lock:
+            self.prefetch_paths = list(file_paths)
+        self.prefetch_event.set()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+            self.prefetch_paths = []
+
+    def _load(self, file_path):
+        signature = file_signature(file_path)
+        img, original_size = load_preview_image(file_path, self.max_size)
+        nbytes = image_nbytes(img)
+
+        with self.lock:
+            if file_path in self.entries:
+                self._remove(file_path)
+            self.entries[file_path] = (signature, img, original_size, nbytes)
+            self.total_bytes += nbytes
+
+            # 超出上限时淘汰最久未使用的预览图
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+
+        return img, original_size
+
+    def _remove(self, file_path):
+        """删除一条缓存（调用方需持有锁）"""
+        entry = self.entries.pop(file_path)
+        self.total_bytes -= entry[3]
+
+    def _prefetch_worker(self):
+        while True:
+            self.prefetch_event.wait()
+
+            with self.lock:
+                if not self.prefetch_paths:
+                    self.prefetch_event.clear()
+                    continue
+                file_path = self.prefetch_paths.pop(0)
+
+            try:
+                self.get_or_load(file_path)
+            except Exception as e:
+                print(f"预加载预览图时出错: {file_path}, 错误: {e}")
@@ -0,0 +1,174 @@
+"""已处理文件记录
+
+程序直接替换原文件，同一批图片用相同参数再处理一次会被缩小两次。
+每个文件夹中保存一个SQLite记录文件，记下每个已处理文件的内容哈希、输出尺寸和处理参数；
+再次处理时，文件未被修改且参数相同的图片直接跳过，不需要解码。
+记录的查询和写入都在主进程中进行，工作进程只负责计算输出内容的哈希。
+"""
+import os
+import sqlite3
+import hashlib
+import time
+from collections import OrderedDict
+from urllib.request import pathname2url
+
+# 每个文件夹中的记录文件名（以点开头，在Linux和macOS上默认隐藏）
+MANIFEST_NAME = ".图片批量缩放工具.db"
+
+# 计算哈希时每次读取的字节数
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# 同时保持打开的记录文件数：每个WAL模式的连接占用3个文件描述符，
+# 文件按路径顺序处理，只需保留最近使用的几个文件夹
+MAX_OPEN_CONNECTIONS = 8
+
+
+def file_hash(file_path):
+    """计算文件内容的哈希（只读取字节，不解码图片）"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def bytes_hash(data):
+    """计算内存中文件内容的哈希，与file_hash的结果一致"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def params_key(mode, scale=1.0, target_size="", quality="exact", max_bytes=None):
+    """把处理参数转换为字符串，参数相同的两次处理得到相同的字符串"""
+    if mode == "scale":
+        key = f"scale:{float(scale):g}:{quality}"
+    else:
+        key = f"target_size:{target_size}:{quality}"
+    if max_bytes:
+        key += f":max_bytes={max_bytes}"
+    return key
+
+
+class ProcessManifest:
+    def __init__(self, name=MANIFEST_NAME, max_open=MAX_OPEN_CONNECTIONS, read_only=False):
+        """read_only为True时只读取已有的记录（试运行），不创建记录文件也不修改记录"""
+        self.name = name
+        self.max_open = max_open
+        self.read_only = read_only
+        self.connections = OrderedDict()  # 文件夹 -> 数据库连接，按最近使用排序
+        self.unavailable = set()  # 无法创建记录的文件夹
+
+    def _connect(self, folder):
+        if folder in self.unavailable:
+            return None
+        if folder in self.connections:
+            self.connections.move_to_end(folder)
+            return self.connections[folder]
+
+        conn = None
+        path = os.path.join(folder, self.name)
+        if self.read_only:
+            # 没有记录文件时视为都未处理；以只读方式打开，不会创建文件
+            if not os.path.exists(path):
+                self.unavailable.add(folder)
+                return None
+            # 没有WAL文件时记录都已写入主文件，按不可变文件打开，SQLite不会创建-wal和-shm文件
+            options = "mode=ro" if os.path.exists(path + "-wal") else "mode=ro&immutable=1"
+            try:
+                conn = sqlite3.connect(f"file:{pathname2url(path)}?{options}", uri=True)
+            except sqlite3.Error as e:
+                print(f"无法打开处理记录: {folder}, 错误: {e}")
+                self.unavailable.add(folder)
+                return None
+            return self._keep(folder, conn)
+
+        try:
+            conn = sqlite3.connect(path)
+            # 每处理完一个文件就提交，WAL模式下提交很便宜，程序中途退出也不会丢失记录
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS processed ("
+                " name TEXT PRIMARY KEY,"
+                " file_size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " content_hash TEXT NOT NULL,"
+                " width INTEGER NOT NULL,"
+                " height INTEGER NOT NULL,"
+                " params TEXT NOT NULL,"
+                " processed_at REAL NOT NULL)")
+        except (sqlite3.Error, OSError) as e:
+            # 只读文件夹等情况下不使用记录，照常处理
+            print(f"无法打开处理记录: {folder}, 错误: {e}")
+            if conn is not None:
+                conn.close()
+            self.unavailable.add(folder)
+            return None
+        return self._keep(folder, conn)
+
+    def _keep(self, folder, conn):
+        self.connections[folder] = conn
+        # 关闭最久未使用的连接，文件夹很多时不会耗尽文件描述符
+        while len(self.connections) > self.max_open:
+            _, oldest = self.connections.popitem(last=False)
+            oldest.close()
+        return conn
+
+    def is_processed(self, file_path, params):
+        """文件已用相同参数处理过且之后未被修改时返回True"""
+        conn = self._connect(os.path.dirname(os.path.abspath(file_path)))
+        if conn is None:
+            return False
+
+        try:
+            row = conn.execute(
+                "SELECT file_size, mtime_ns, content_hash, params FROM processed WHERE name = ?",
+                (os.path.basename(file_path),)).fetchone()
+            if row is None or row[3] != params:
+                return False
+
+            stat = os.stat(file_path)
+            if stat.st_size != row[0]:
+                return False
+            if stat.st_mtime_ns == row[1]:
+                return True
+
+            # 修改时间变了（例如被复制或同步过），内容相同也视为已处理
+            if file_hash(file_path) != row[2]:
+                return False
+            if self.read_only:
+                return True
+            conn.execute("UPDATE processed SET mtime_ns = ? WHERE name = ?",
+                         (stat.st_mtime_ns, os.path.basename(file_path)))
+            conn.commit()
+            return True
+        except (sqlite3.Error, OSError) as e:
+            print(f"读取处理记录失败: {file_path}, 错误: {e}")
+            return False
+
+    def record(self, result, params):
+        """记录一个处理成功的结果（需要包含content_hash和输出尺寸）"""
+        if self.read_only:
+            return
+        file_path = result["path"]
+        conn = self._connect(os.path.dirname(os.path.abspath(file_path)))
+        if conn is None:
+            return
+
+        try:
+            stat = os.stat(file_path)
+            conn.execute(
+                "INSERT OR REPLACE INTO processed "
+                "(name, file_size, mtime_ns, content_hash, width, height, params, processed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (os.path.basename(file_path), stat.st_size, stat.st_mtime_ns,
+                 result["content_hash"], result["new_width"], result["new_height"],
+                 params, time.time()))
+            conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            print(f"写入处理记录失败: {file_path}, 错误: {e}")
+
+    def close(self):
+        for conn in self.connections.values():
+            conn.close()
+        self.connections.clear()
+        self.unavailable.clear()
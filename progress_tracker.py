@@ -0,0 +1,77 @@
+"""处理进度统计
+
+工作线程只把结果放入队列，主线程按固定间隔（PROGRESS_POLL_MS）一次取回全部结果，
+汇总后只刷新一次进度窗口，界面开销与文件数无关。
+速度按最近一段时间（RATE_WINDOW秒）内完成的图片数和读取的字节数计算，剩余时间按图片速度估算。
+"""
+import time
+from collections import deque
+
+# 主线程取回进度的间隔（毫秒）
+PROGRESS_POLL_MS = 100
+
+# 计算速度的时间窗口（秒）
+RATE_WINDOW = 5.0
+
+
+def format_duration(seconds):
+    """把秒数格式化为 1:02:03 或 2:03"""
+    seconds = int(round(seconds))
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class ProgressTracker:
+    """统计已完成的图片数、字节数、速度和剩余时间（只在主线程中使用）"""
+
+    def __init__(self, total, window=RATE_WINDOW):
+        self.total = total
+        self.window = window
+        self.done = 0
+        self.bytes_read = 0
+        self.start_time = time.perf_counter()
+        # (时间, 实际处理的图片数, 字节数)，此前已处理过而直接跳过的文件不计入速度
+        self.samples = deque([(self.start_time, 0, 0)])
+        self.worked = 0
+
+    def update(self, results):
+        """加入一批结果（每次取回队列时调用一次）"""
+        for result in results:
+            self.done += 1
+            if result["skipped"] == "processed":
+                continue
+            self.worked += 1
+            self.bytes_read += result["original_size"]
+        now = time.perf_counter()
+        self.samples.append((now, self.worked, self.bytes_read))
+        while len(self.samples) > 2 and now - self.samples[1][0] >= self.window:
+            self.samples.popleft()
+
+    def rates(self):
+        """返回(图片/秒, 字节/秒)"""
+        (start, worked, nbytes), (end, last_worked, last_bytes) = self.samples[0], self.samples[-1]
+        elapsed = end - start
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return (last_worked - worked) / elapsed, (last_bytes - nbytes) / elapsed
+
+    def eta(self):
+        """预计剩余秒数，无法估算时返回None"""
+        images_per_second, _ = self.rates()
+        if not images_per_second:
+            return None
+        return (self.total - self.done) / images_per_second
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def format_rates(self):
+        """进度窗口中显示的速度和剩余时间"""
+        images_per_second, bytes_per_second = self.rates()
+        eta = self.eta()
+        eta_text = format_duration(eta) if eta is not None else "--:--"
+        return (f"{images_per_second:.1f} 张/秒 | {bytes_per_second / 1024 / 1024:.1f} MB/秒 | "
+                f"剩余约 {eta_text}")
@@ -0,0 +1,1231 @@
+"""图片缩放处理引擎
+
+不依赖Tkinter，GUI、命令行和工作进程共用同一套处理流程：
+打开 → 计算尺寸 → 缩放 → 填充背景 → 保存。
+所有函数都定义在模块顶层，以便在进程池的工作进程中执行。
+
+命令行用法示例：
+    python resize_engine.py 图片目录 --mode scale --scale 0.5
+    python resize_engine.py a.jpg b.png --mode target_size --target-size 512x512
+    python resize_engine.py 图片目录 --scale 0.5 --dry-run --plan-output plan.csv
+    python resize_engine.py 图片目录 --pyramid 1024x1024,512x512,256x256 --layout folder
+    python resize_engine.py 图片目录 --scale 0.5 --journal batch.jsonl   # 中断后再次运行同一命令继续处理
+每处理完一个文件输出一行JSON结果；--dry-run只读取文件头，输出每个文件的处理计划和汇总。
+"""
+import io
+import os
+import sys
+import math
+import json
+import mmap
+import shutil
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from PIL import Image
+
+from file_registry import FileRegistry
+from folder_scanner import scan_folder
+from process_manifest import ProcessManifest, file_hash, bytes_hash, params_key
+from stage_timing import StageTimer, TraceRecorder, profile_run
+from batch_journal import BatchJournal, load_journal, batch_settings
+
+# 支持处理的图片扩展名
+SUPPORTED_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.tiff']
+
+# JPEG按1/2、1/4、1/8缩小解码时，解码结果至少保留目标尺寸的倍数，
+# 剩余部分交给LANCZOS完成，与完整解码的结果相比PSNR在50dB左右
+JPEG_DRAFT_MARGIN = 2.0
+
+# 缩放质量：exact在完整（或保留余量的缩小解码）像素网格上做LANCZOS；
+# fast先用整数倍盒式缩小（Image.reduce）到目标尺寸的3倍以内，再做最后一步LANCZOS
+RESAMPLE_QUALITIES = ("exact", "fast")
+FAST_REDUCING_GAP = 3.0
+FAST_JPEG_DRAFT_MARGIN = 1.0
+
+# 文件大小上限模式：有损格式在[最低, 最高]质量之间二分查找，
+# 最低质量仍然超出时按比例缩小尺寸后重新查找，两者的尝试次数都有上限
+LOSSY_EXTENSIONS = ['.jpg', '.jpeg', '.webp']
+BUDGET_MIN_QUALITY = 30
+BUDGET_MAX_QUALITY = 95
+BUDGET_QUALITY_STEPS = 8
+BUDGET_DIMENSION_STEPS = 5
+BUDGET_HINT_WINDOW = 4
+
+# 每个工作进程内记录最近找到的(缩小比例, 质量)，相似的图片从这里开始查找
+_budget_hints = {}
+
+# 多尺寸导出：每个尺寸从不小于其CASCADE_MIN_RATIO倍的已生成尺寸缩小得到，
+# 没有这样的尺寸时从解码的原图缩小，避免连续小倍数缩小累积模糊
+CASCADE_MIN_RATIO = 2.0
+
+# 多尺寸导出的文件位置：suffix为"原文件名_512x512.jpg"，folder为"512x512/原文件名.jpg"
+PYRAMID_LAYOUTS = ("suffix", "folder")
+
+# 进程池中每个工作进程最多排队的块数：逐步提交，暂停或取消时只需等待少量进行中的文件
+IN_FLIGHT_PER_WORKER = 2
+
+# 文件按块提交给工作进程，块中的文件在同一个进程中依次处理，小文件不再被每个任务的进程间通信拖慢。
+# 块中文件的预计内存之和（衡量工作量）达到CHUNK_WORK_BYTES或文件数达到CHUNK_MAX_FILES时结束一块；
+# 每个工作进程至少分到CHUNKS_PER_WORKER块，文件少时不会因为分块而减少并行
+CHUNK_WORK_BYTES = 16 * 1024 * 1024
+CHUNK_MAX_FILES = 32
+CHUNKS_PER_WORKER = 4
+
+# 解码后每像素占用的字节数：Pillow中RGB等多通道模式按每像素4字节存储
+MODE_PIXEL_BYTES = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16L": 2, "I;16B": 2}
+DEFAULT_PIXEL_BYTES = 4
+
+# 默认的内存上限占物理内存的比例（同时处理的图片的预计内存占用之和不超过上限）
+MEMORY_BUDGET_FRACTION = 0.5
+
+# 解码后超过此字节数的图片分带处理：像素保存在图片所在文件夹的临时文件中（内存映射），
+# 每次只缩放输出的一个水平条带，内存占用取决于条带大小而不是图片尺寸
+STREAM_MIN_BYTES = 1024 * 1024 * 1024
+# 每个条带（缩放的中间结果加输出）占用的内存
+STREAM_BAND_BYTES = 64 * 1024 * 1024
+# 支持分带处理的格式和图像模式：解码器直接写入预先分配的图像，编码器逐行读取
+STREAM_FORMATS = ("PNG", "TIFF", "BMP", "JPEG")
+STREAM_MODES = ("L", "LA", "RGB", "RGBA")
+# 带透明度的模式缩放前预乘透明度（与Image.resize相同）。Image.resize每次调用都会转换整张原图，
+# 分带处理时先逐段转换到磁盘上的图像，各条带直接缩放预乘后的图像
+PREMULTIPLIED_MODES = {"LA": "La", "RGBA": "RGBa"}
+# 处理进程中的像素数上限：分带处理的内存占用与尺寸无关，超过Pillow默认上限（约1.8亿像素）的
+# 扫描地图和全景图也可以处理；仍然保留上限，防止损坏的文件头声明离谱的尺寸。
+# 在进程池的工作进程和命令行中使用，界面中只在批处理进行期间使用（见process_pixel_limit），
+# 缩略图和预览平时仍然使用Pillow的默认上限
+PROCESS_MAX_IMAGE_PIXELS = 4 * 1024 * 1024 * 1024
+
+# process_pixel_limit的引用计数和放宽前的上限
+_pixel_limit_lock = threading.Lock()
+_pixel_limit_users = 0
+_saved_pixel_limit = None
+
+# disk_image_supported的检查结果，每个进程检查一次
+_disk_images = None
+
+
+def default_worker_count():
+    """默认的并行进程数：使用全部CPU核心"""
+    return os.cpu_count() or 1
+
+
+def physical_memory():
+    """物理内存的字节数，无法获取时返回None"""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+
+            class MemoryStatus(ctypes.Structure):
+                _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                            ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                            ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                            ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                            ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+            status = MemoryStatus()
+            status.dwLength = ctypes.sizeof(status)
+            if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return None
+            return status.ullTotalPhys
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_memory_budget():
+    """默认的内存上限：物理内存的MEMORY_BUDGET_FRACTION，无法获取物理内存时不限制"""
+    memory = physical_memory()
+    return int(memory * MEMORY_BUDGET_FRACTION) if memory else None
+
+
+def parse_target_size(target_size):
+    """解析"宽x高"格式的目标尺寸字符串"""
+    target_width, target_height = map(int, target_size.split('x'))
+    return target_width, target_height
+
+
+def compute_new_size(original_width, original_height, mode, scale=1.0, target_size=""):
+    """根据缩放模式计算缩放后的尺寸（不含目标尺寸模式下的背景填充）"""
+    if mode == "scale":
+        return round(original_width * scale), round(original_height * scale)
+
+    # target_size
+    if not target_size:
+        # 如果未选择目标尺寸，使用原始尺寸
+        return original_width, original_height
+
+    # 计算新的尺寸，保持纵横比
+    target_width, target_height = parse_target_size(target_size)
+    img_ratio = original_width / original_height
+
+    # 图像适应目标尺寸，保持纵横比
+    if img_ratio > 1:  # 宽大于高的图片
+        return target_width, int(target_width / img_ratio)
+    else:  # 高大于或等于宽的图片
+        return int(target_height * img_ratio), target_height
+
+
+def plan_action(original_width, original_height, mode, scale=1.0, target_size=""):
+    """只根据原始尺寸判断需要做什么，返回(操作, 缩放后尺寸)
+
+    resize：需要缩放（目标尺寸模式下之后还要填充背景）；
+    pad：尺寸已经符合，只需填充背景，不需要重新采样；
+    none：输出与输入相同，不需要解码和重新编码。
+    """
+    new_size = compute_new_size(original_width, original_height, mode, scale, target_size)
+    if new_size != (original_width, original_height):
+        return "resize", new_size
+    if mode == "target_size" and target_size and parse_target_size(target_size) != new_size:
+        return "pad", new_size
+    return "none", new_size
+
+
+def open_image(file_path):
+    """打开图片（此时只读取文件头，像素数据在需要时才解码）"""
+    return Image.open(file_path)
+
+
+def apply_jpeg_draft(img, new_size, margin=JPEG_DRAFT_MARGIN):
+    """对JPEG启用DCT域缩小解码，返回实际解码的尺寸
+
+    只有目标尺寸（乘以余量后）不超过原图的1/2时才会生效，必须在解码像素之前调用。
+    """
+    if img.format != "JPEG":
+        return img.size
+
+    requested = (max(1, int(new_size[0] * margin)), max(1, int(new_size[1] * margin)))
+    if requested[0] * 2 > img.width or requested[1] * 2 > img.height:
+        return img.size
+
+    # Pillow会选择不小于请求尺寸的最大缩小倍数
+    img.draft(img.mode, requested)
+    return img.size
+
+
+def resize_image(img, new_size, quality="exact", box=None):
+    """使用高质量滤波器缩放图片，fast模式下大倍数缩小时先做整数倍盒式缩小
+
+    box为只缩放原图中的一个区域（可以是小数坐标），滤波器仍会读取区域外相邻的像素。
+    """
+    if quality == "fast":
+        return img.resize(new_size, Image.LANCZOS, box=box, reducing_gap=FAST_REDUCING_GAP)
+    return img.resize(new_size, Image.LANCZOS, box=box)
+
+
+def pad_to_target(img, target_size):
+    """将图片居中放到透明背景上，补齐到目标尺寸"""
+    target_width, target_height = parse_target_size(target_size)
+
+    # 创建带背景的图像
+    background = Image.new('RGBA', (target_width, target_height), (0, 0, 0, 0))
+
+    # 计算位置让图像居中
+    offset = ((target_width - img.width) // 2, (target_height - img.height) // 2)
+    background.paste(img, offset)
+    return background
+
+
+def jpeg_draft_scale(width, height, new_size, margin=JPEG_DRAFT_MARGIN):
+    """apply_jpeg_draft会使用的缩小倍数（1、2、4或8），只根据尺寸计算，不需要打开文件"""
+    requested = (max(1, int(new_size[0] * margin)), max(1, int(new_size[1] * margin)))
+    if requested[0] * 2 > width or requested[1] * 2 > height:
+        return 1
+    # 与Pillow的draft相同：不小于请求尺寸的最大缩小倍数
+    ratio = min(width // requested[0], height // requested[1])
+    return next(scale for scale in (8, 4, 2, 1) if ratio >= scale)
+
+
+def estimate_peak_memory(width, height, image_mode, image_format, mode, scale=1.0, target_size="",
+                         quality="exact", stream_min_bytes=STREAM_MIN_BYTES, max_bytes=None, file_size=0):
+    """根据文件头估算处理一张图片时的内存峰值（字节）
+
+    解码后的原图在整个处理过程中都保留，峰值为原图加上缩放阶段
+    （先横向缩放的中间结果和输出）或编码阶段（输出、透明背景画布和编码结果）中较大的一个。
+    有文件大小上限（max_bytes）时还要加上查找过程中的候选图片和保留的编码结果；
+    尺寸不变但文件超出上限（file_size为原文件字节数）的图片同样需要解码和反复编码。
+    分带处理的图片（见stream_min_bytes）只计算条带占用的内存（不支持内存映射时还有原图和输出）。
+    """
+    action, new_size = plan_action(width, height, mode, scale, target_size)
+    if action == "none" and max_bytes and file_size > max_bytes:
+        action = "encode"  # 与process_image相同
+    if action == "none":
+        return 0  # 只读取文件头
+
+    pixel_bytes = MODE_PIXEL_BYTES.get(image_mode, DEFAULT_PIXEL_BYTES)
+    decoded_width, decoded_height = width, height
+    if action == "resize" and image_format == "JPEG":
+        draft_scale = jpeg_draft_scale(width, height, new_size,
+                                       FAST_JPEG_DRAFT_MARGIN if quality == "fast" else JPEG_DRAFT_MARGIN)
+        decoded_width = -(-width // draft_scale)
+        decoded_height = -(-height // draft_scale)
+    decoded = decoded_width * decoded_height * pixel_bytes
+    # 有文件大小上限时process_image整张处理，不分带
+    if (not max_bytes and stream_min_bytes and decoded >= stream_min_bytes
+            and image_format in STREAM_FORMATS and image_mode in STREAM_MODES):
+        # 条带和填充时转换模式的副本；预乘透明度也逐段进行，每段的原图和转换结果同样不超过这个大小
+        if disk_image_supported():
+            return 2 * STREAM_BAND_BYTES
+        # 不支持内存映射时原图、预乘透明度的副本和输出都在内存中
+        copies = 2 if action == "resize" and image_mode in PREMULTIPLIED_MODES else 1
+        output_width, output_height = (parse_target_size(target_size)
+                                       if mode == "target_size" and target_size else new_size)
+        return (decoded * copies + output_width * output_height * DEFAULT_PIXEL_BYTES
+                + 2 * STREAM_BAND_BYTES)
+
+    output = new_size[0] * new_size[1] * pixel_bytes
+    resampling = new_size[0] * decoded_height * pixel_bytes + output if action == "resize" else 0
+    # 缩放结果（只填充或重新编码时直接使用原图）
+    encoding = output if action == "resize" else 0
+    if mode == "target_size" and target_size:
+        target_width, target_height = parse_target_size(target_size)
+        encoding += target_width * target_height * DEFAULT_PIXEL_BYTES
+        output = target_width * target_height * DEFAULT_PIXEL_BYTES
+    encoding += output // 2  # 编码结果保存在内存中
+    if max_bytes:
+        # 查找时缩小的候选图片（及其填充画布）和保留的最小编码结果
+        encoding += output + output // 2
+    return decoded + max(resampling, encoding)
+
+
+def file_peak_memory(file_path, mode, scale=1.0, target_size="", quality="exact",
+                     stream_min_bytes=STREAM_MIN_BYTES, max_bytes=None):
+    """读取文件头估算内存峰值，无法读取时返回0（由处理过程报告错误）"""
+    try:
+        file_size = os.path.getsize(file_path)
+        with open_image(file_path) as img:
+            return estimate_peak_memory(img.width, img.height, img.mode, img.format,
+                                        mode, scale, target_size, quality, stream_min_bytes,
+                                        max_bytes, file_size)
+    except Exception:
+        return 0
+
+
+def file_pyramid_memory(file_path, target_sizes, quality="exact"):
+    """估算多尺寸导出一张图片时的内存峰值：最大尺寸的峰值加上保留的其他尺寸的缩放结果"""
+    try:
+        with open_image(file_path) as img:
+            pixel_bytes = MODE_PIXEL_BYTES.get(img.mode, DEFAULT_PIXEL_BYTES)
+            peaks = []
+            for target_size in target_sizes:
+                new_width, new_height = compute_new_size(img.width, img.height, "target_size",
+                                                         target_size=target_size)
+                peaks.append((new_width * new_height * pixel_bytes,
+                              estimate_peak_memory(img.width, img.height, img.mode, img.format,
+                                                   "target_size", target_size=target_size,
+                                                   quality=quality, stream_min_bytes=None)))
+    except Exception:
+        return 0
+    peaks.sort(reverse=True)
+    return peaks[0][1] + sum(content for content, _ in peaks[1:])
+
+
+def save_image(img, output_path, fp=None, encode_quality=None):
+    """按输出文件的扩展名选择合适的保存参数
+
+    传入fp（例如BytesIO）时写入该文件对象而不是output_path，用于在内存中编码。
+    encode_quality为JPEG/WebP的编码质量，默认JPEG使用95，WebP使用Pillow的默认值。
+    """
+    _, ext = os.path.splitext(output_path)
+    target = output_path if fp is None else fp
+    image_format = Image.registered_extensions().get(ext.lower())
+
+    if ext.lower() in ['.jpg', '.jpeg']:
+        # 如果是RGBA模式，转为RGB以便保存为JPG
+        if img.mode == 'RGBA':
+            img = img.convert('RGB')
+        img.save(target, format=image_format, quality=encode_quality or 95)
+    elif ext.lower() == '.webp' and encode_quality:
+        img.save(target, format=image_format, quality=encode_quality)
+    else:
+        img.save(target, format=image_format)
+
+
+def encode_image(img, output_path, encode_quality=None):
+    """在内存中编码，返回编码后的字节"""
+    buffer = io.BytesIO()
+    save_image(img, output_path, buffer, encode_quality)
+    return buffer.getvalue()
+
+
+def parse_byte_size(text):
+    """解析文件大小，支持K/M/G后缀（1K=1024字节），例如 500K、2M、300000"""
+    text = text.strip().upper().rstrip("B")
+    units = {"K": 1024, "M": 1024 * 1024, "G": 1024 * 1024 * 1024}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def search_quality(encode, max_bytes, low=BUDGET_MIN_QUALITY, high=BUDGET_MAX_QUALITY, hint=None,
+                   steps=BUDGET_QUALITY_STEPS):
+    """二分查找不超过max_bytes的最高编码质量
+
+    返回(质量, 编码数据)；最低质量也超出时返回(None, 尝试过的最小数据)。
+    没有提示时先尝试最高质量，大多数未超出上限的图片只需要编码一次；
+    有提示且满足上限时只在提示上方BUDGET_HINT_WINDOW以内继续查找。
+    """
+    floor = low
+    best = None
+    smallest = None
+    probe = hint if hint is not None and low <= hint <= high else high
+    for _ in range(steps):
+        if low > high:
+            break
+        data = encode(probe)
+        if len(data) <= max_bytes:
+            best = (probe, data)
+            low = probe + 1
+            if probe == hint:
+                high = min(high, hint + BUDGET_HINT_WINDOW)
+        else:
+            if smallest is None or len(data) < len(smallest):
+                smallest = data
+            high = probe - 1
+        probe = (low + high + 1) // 2
+
+    if best is None and high >= floor:
+        # 尝试次数用完时确认一下最低质量
+        data = encode(floor)
+        if len(data) <= max_bytes:
+            return floor, data
+        smallest = data if smallest is None or len(data) < len(smallest) else smallest
+    return best if best is not None else (None, smallest)
+
+
+def fit_to_budget(img, output_path, max_bytes, pad_target="", quality="exact", source_bpp=0.0):
+    """在内存中编码，找到不超过max_bytes的输出
+
+    有损格式先查找编码质量，仍然超出时（以及无损格式）按字节数比例缩小尺寸。
+    pad_target非空时每次缩小后都重新填充到目标尺寸，输出尺寸保持不变。
+    相似图片（同一格式、相近的原图压缩率和每像素字节预算）从上一张找到的尺寸和质量开始查找。
+    返回(编码数据, 输出尺寸, 编码质量, 是否满足上限)，无法满足时返回尝试过的最小结果。
+    """
+    ext = os.path.splitext(output_path)[1].lower()
+    lossy = ext in LOSSY_EXTENSIONS
+    floor_quality = BUDGET_MIN_QUALITY if lossy else None
+
+    def build(factor):
+        candidate = img
+        if factor < 1.0:
+            candidate = resize_image(img, (max(1, round(img.width * factor)),
+                                           max(1, round(img.height * factor))), quality)
+        if pad_target:
+            candidate = pad_to_target(candidate, pad_target)
+        return candidate
+
+    output_size = parse_target_size(pad_target) if pad_target else img.size
+    budget_bpp = max_bytes / (output_size[0] * output_size[1])
+    hint_key = (ext, int(math.log2(source_bpp + 1e-6) * 2), int(math.log2(budget_bpp + 1e-6) * 2))
+    hint_factor, hint_quality = _budget_hints.get(hint_key, (1.0, None))
+
+    factor = 1.0
+    smallest = None
+    if hint_factor < 1.0:
+        # 相似图片需要缩小：先确认原尺寸以最低质量是否也超出，超出时直接从该比例开始
+        candidate = build(1.0)
+        data = encode_image(candidate, output_path, floor_quality)
+        if len(data) > max_bytes:
+            factor = hint_factor
+            smallest = (data, candidate.size, floor_quality, False)
+
+    for _ in range(BUDGET_DIMENSION_STEPS + 1):
+        candidate = build(factor)
+        if lossy:
+            encode_quality, data = search_quality(
+                lambda q: encode_image(candidate, output_path, q), max_bytes,
+                hint=hint_quality if factor == hint_factor else None)
+            fits = encode_quality is not None
+        else:
+            encode_quality, data = None, encode_image(candidate, output_path)
+            fits = len(data) <= max_bytes
+
+        if fits:
+            _budget_hints[hint_key] = (factor, encode_quality)
+            return data, candidate.size, encode_quality, True
+
+        if smallest is None or len(data) < len(smallest[0]):
+            smallest = (data, candidate.size, floor_quality, False)
+        # 文件大小大致与像素数成正比，按比例缩小，每次至少缩小5%，最多缩小一半
+        factor *= max(0.5, min(0.95, math.sqrt(max_bytes / len(data)) * 0.95))
+
+    return smallest
+
+
+@contextmanager
+def replacing_file(file_path):
+    """返回同一文件夹中的临时文件供写入，with语句结束后替换原文件；写入中途出错时原文件保持不变"""
+    temp_path = f"{file_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            yield f
+        try:
+            shutil.copymode(file_path, temp_path)  # 保留原文件的权限
+        except OSError:
+            pass
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def replace_file(file_path, data):
+    """用内存中的编码结果替换原文件"""
+    with replacing_file(file_path) as f:
+        f.write(data)
+
+
+def _map_image(mode, size, buffer):
+    """用buffer中的内存作为像素数据创建图像（与Image.frombuffer的做法相同，但RGB等模式也不复制）"""
+    stride = size[0] * MODE_PIXEL_BYTES.get(mode, DEFAULT_PIXEL_BYTES)
+    return Image.new(mode, (0, 0))._new(Image.core.map_buffer(buffer, size, "raw", 0, (mode, stride, 1)))
+
+
+def disk_image_supported():
+    """当前的Pillow能否把图像的像素放在映射的内存中，并让解码器直接写入这样的图像
+
+    _map_image和stream_resize中预先设置img.im都依赖Pillow的内部接口，可能随版本变化。
+    每个进程第一次使用时用一张小图片检查一次，不可用时输出提示，分带处理改为使用普通内存。
+    """
+    global _disk_images
+    if _disk_images is None:
+        try:
+            data = io.BytesIO()
+            Image.new("RGBA", (3, 2), (10, 20, 30, 40)).save(data, "PNG")
+            buffer = mmap.mmap(-1, 3 * 2 * 4)
+            with Image.open(data) as img:
+                img.im = _map_image(img.mode, img.size, buffer).im
+                img.load()
+                # 像素必须确实写入了映射的内存，而不是解码器另外分配的图像
+                _disk_images = (buffer[:4] == bytes((10, 20, 30, 40))
+                                and img.getpixel((2, 1)) == (10, 20, 30, 40))
+        except Exception:
+            _disk_images = False
+        if not _disk_images:
+            print("当前版本的Pillow不支持内存映射的图像，超大图片分带处理时像素改为保存在内存中",
+                  file=sys.stderr)
+    return _disk_images
+
+
+def disk_image(mode, size, folder):
+    """创建像素数据保存在磁盘临时文件中的图像（内存映射，初始为全0）
+
+    临时文件创建在folder中（系统临时目录可能在内存里），关闭后自动删除。
+    不支持内存映射的图像时（见disk_image_supported）返回普通的图像。
+    """
+    if not disk_image_supported():
+        return Image.new(mode, size)
+    stride = size[0] * MODE_PIXEL_BYTES.get(mode, DEFAULT_PIXEL_BYTES)
+    try:
+        temp = tempfile.TemporaryFile(dir=folder)
+    except OSError:
+        temp = tempfile.TemporaryFile()
+    with temp:
+        temp.truncate(stride * size[1])
+        buffer = mmap.mmap(temp.fileno(), stride * size[1])
+    return _map_image(mode, size, buffer)
+
+
+def can_stream(img, stream_min_bytes):
+    """图片是否需要并且能够分带处理（在解码像素之前调用）"""
+    if not stream_min_bytes or img.format not in STREAM_FORMATS or img.mode not in STREAM_MODES:
+        return False
+    return img.width * img.height * MODE_PIXEL_BYTES.get(img.mode, DEFAULT_PIXEL_BYTES) >= stream_min_bytes
+
+
+def band_rows(source_height, output_width, output_height, pixel_bytes):
+    """每个输出条带的行数：条带的输出和先横向缩放的中间结果不超过STREAM_BAND_BYTES
+
+    可能时取使条带边界落在原图整行上的行数，这样每个条带的滤波系数与整张缩放时完全相同。
+    """
+    row_bytes = output_width * pixel_bytes * (1 + source_height / output_height)
+    rows = max(1, int(STREAM_BAND_BYTES // row_bytes))
+    period = output_height // math.gcd(source_height, output_height)
+    if period <= rows:
+        rows -= rows % period
+    return rows
+
+
+def stream_resize(img, file_path, action, new_size, pad_target, quality, timer):
+    """分带缩放，输出逐条写入磁盘上的图像后编码替换原文件，返回输出尺寸
+
+    原图由解码器直接写入磁盘上的临时文件（未压缩的文件由Pillow直接映射原文件），
+    每个输出条带用resize的box参数只缩放对应的原图区域，滤波器需要的相邻行直接从原图读取。
+    条带边界能对齐到原图整行时结果与整张缩放完全相同，否则个别像素可能有1级的舍入差别；
+    带透明度的图片这1级差别在预乘后的数值上，还原透明度后几乎透明的像素可能相差很多。
+    Pillow不支持内存映射的图像时（见disk_image_supported），原图和输出保存在普通内存中，仍然分带缩放。
+    """
+    folder = os.path.dirname(os.path.abspath(file_path))
+    with timer.stage("decode"):
+        if disk_image_supported():
+            img.im = disk_image(img.mode, img.size, folder).im
+        img.load()
+
+    source = img
+    if action == "resize" and img.mode in PREMULTIPLIED_MODES:
+        # 逐段预乘透明度，写入磁盘上的第二张图像，每段不超过STREAM_BAND_BYTES
+        with timer.stage("premultiply"):
+            source = disk_image(PREMULTIPLIED_MODES[img.mode], img.size, folder)
+            chunk = max(1, STREAM_BAND_BYTES // (2 * img.width * DEFAULT_PIXEL_BYTES))
+            for y in range(0, img.height, chunk):
+                part = img.crop((0, y, img.width, min(img.height, y + chunk)))
+                source.paste(part.convert(source.mode), (0, y))
+
+    # 目标尺寸模式下直接在输出图像上填充背景；JPEG不支持透明，与save_image一样使用黑色背景
+    output_width, output_height = new_size
+    offset = (0, 0)
+    output_mode = img.mode
+    if pad_target:
+        canvas_size = parse_target_size(pad_target)
+        offset = ((canvas_size[0] - output_width) // 2, (canvas_size[1] - output_height) // 2)
+        output_mode = "RGB" if img.format == "JPEG" else "RGBA"
+    else:
+        canvas_size = new_size
+    output = disk_image(output_mode, canvas_size, folder)
+
+    rows = band_rows(img.height, output_width, output_height,
+                     MODE_PIXEL_BYTES.get(output_mode, DEFAULT_PIXEL_BYTES))
+    y_scale = img.height / output_height
+    for y in range(0, output_height, rows):
+        band_height = min(rows, output_height - y)
+        with timer.stage("resize" if action == "resize" else "pad"):
+            if action == "resize":
+                band = resize_image(source, (output_width, band_height), quality,
+                                    box=(0, y * y_scale, img.width, (y + band_height) * y_scale))
+                if band.mode != img.mode:
+                    band = band.convert(img.mode)  # 还原预乘的透明度
+            else:
+                band = img.crop((0, y, img.width, y + band_height))
+            if band.mode != output_mode:
+                band = band.convert(output_mode)
+            output.paste(band, (offset[0], offset[1] + y))
+
+    with timer.stage("encode") as record:
+        with replacing_file(file_path) as f:
+            save_image(output, file_path, f)
+            record["bytes"] = f.tell()
+            # 替换前关闭原文件（未压缩的原文件可能被映射到内存中）
+            img.close()
+            source.close()
+    return output.size
+
+
+def encode_output(resized_img, file_path, result, pad_target="", quality="exact", max_bytes=None,
+                  timer=None):
+    """填充背景并在内存中编码（有文件大小上限时查找满足上限的编码），返回编码数据
+
+    输出尺寸写入result的new_width和new_height，按上限编码时还写入encode_quality和budget_met。
+    """
+    timer = timer or StageTimer(False)
+    if max_bytes:
+        # 在内存中查找满足上限的编码（包括必要的缩小和填充），查找过程中不写文件
+        source_bpp = result["original_size"] / (result["width"] * result["height"])
+        with timer.stage("encode") as record:
+            data, output_size, encode_quality, budget_met = fit_to_budget(
+                resized_img, file_path, max_bytes, pad_target, quality, source_bpp)
+            record["bytes"] = len(data)
+        result["encode_quality"] = encode_quality
+        result["budget_met"] = budget_met
+    else:
+        # 如果是目标尺寸模式且有选择尺寸，需要处理背景填充
+        if pad_target:
+            with timer.stage("pad"):
+                resized_img = pad_to_target(resized_img, pad_target)
+        with timer.stage("encode") as record:
+            data = encode_image(resized_img, file_path)
+            record["bytes"] = len(data)
+        output_size = resized_img.size
+    result["new_width"], result["new_height"] = output_size
+    return data
+
+
+def write_output(file_path, data, result, timer=None):
+    """用编码数据替换原文件，并在result中记录输出大小和内容哈希"""
+    timer = timer or StageTimer(False)
+    with timer.stage("write") as record:
+        replace_file(file_path, data)
+        record["bytes"] = len(data)
+    result["new_size"] = len(data)
+    result["content_hash"] = bytes_hash(data)
+    result["ok"] = True
+
+
+def process_image(file_path, mode, scale=1.0, target_size="", quality="exact", max_bytes=None,
+                  timing=False, stream_min_bytes=STREAM_MIN_BYTES):
+    """处理单张图片并直接替换原文件，返回处理结果字典（可跨进程传递、可序列化为JSON）
+
+    max_bytes不为空时，输出文件不超过该字节数（见fit_to_budget）。
+    解码后不小于stream_min_bytes的图片分带处理（见stream_resize），结果中streamed为True。
+    timing为True时在结果中加入各阶段的耗时（stages）和工作进程号（pid），见stage_timing。
+    """
+    result = {"path": file_path, "ok": False, "skipped": None,
+              "original_size": 0, "new_size": 0, "error": None}
+    timer = StageTimer(timing)
+    try:
+        # 获取原始文件大小
+        result["original_size"] = os.path.getsize(file_path)
+
+        with timer.stage("open") as record:
+            img = open_image(file_path)
+            record["bytes"] = result["original_size"]
+        original_width, original_height = img.size
+        result["width"], result["height"] = original_width, original_height
+
+        # 只读取了文件头，尺寸不变时直接跳过，不解码也不重新编码（避免JPEG再次压缩损失画质）
+        action, new_size = plan_action(original_width, original_height, mode, scale, target_size)
+        if action == "none" and max_bytes and result["original_size"] > max_bytes:
+            action = "encode"  # 尺寸不变，但需要重新编码以满足文件大小上限
+        result["action"] = action
+        if action == "none":
+            img.close()
+            result["new_width"], result["new_height"] = new_size
+            result["new_size"] = result["original_size"]
+            result["skipped"] = "unchanged"
+            result["ok"] = True
+            return result
+
+        if action == "resize":
+            apply_jpeg_draft(img, new_size,
+                             FAST_JPEG_DRAFT_MARGIN if quality == "fast" else JPEG_DRAFT_MARGIN)
+        pad_target = target_size if mode == "target_size" and target_size else ""
+
+        # 超大图片分带处理；文件大小上限需要在内存中反复编码，这时仍然整张处理
+        if not max_bytes and can_stream(img, stream_min_bytes):
+            output_size = stream_resize(img, file_path, action, new_size, pad_target, quality, timer)
+            result["streamed"] = True
+            result["new_width"], result["new_height"] = output_size
+            result["new_size"] = os.path.getsize(file_path)
+            result["content_hash"] = file_hash(file_path)
+            result["ok"] = True
+        else:
+            with timer.stage("decode"):
+                img.load()
+
+            if action == "resize":
+                with timer.stage("resize"):
+                    resized_img = resize_image(img, new_size, quality)
+            else:
+                # 只需填充背景或重新编码，不重新采样
+                resized_img = img
+
+            data = encode_output(resized_img, file_path, result, pad_target, quality, max_bytes, timer)
+            # 编码结果已在内存中，关闭原文件后再替换
+            img.close()
+            write_output(file_path, data, result, timer)
+    except Exception as e:
+        import traceback
+        result["error"] = f"{e}"
+        result["traceback"] = traceback.format_exc()
+    if timing:
+        result["stages"] = timer.stages
+        result["pid"] = os.getpid()
+    return result
+
+
+def pyramid_output_path(file_path, target_size, layout="suffix"):
+    """多尺寸导出时某个尺寸的输出路径"""
+    folder, name = os.path.split(file_path)
+    if layout == "folder":
+        return os.path.join(folder, target_size, name)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(folder, f"{stem}_{target_size}{ext}")
+
+
+def can_cascade(source_size, new_size):
+    """多尺寸导出时new_size能否从source_size的已生成图像缩小得到（见CASCADE_MIN_RATIO）"""
+    return (source_size[0] >= new_size[0] * CASCADE_MIN_RATIO
+            and source_size[1] >= new_size[1] * CASCADE_MIN_RATIO)
+
+
+def process_pyramid(file_path, target_sizes, layout="suffix", quality="exact"):
+    """只解码一次，依次生成多个目标尺寸，输出到新文件（不替换原文件）
+
+    尺寸从大到小生成，每个尺寸从满足CASCADE_MIN_RATIO的最小的已生成图像缩小。
+    返回的结果字典中outputs列出每个尺寸的输出文件，new_size为所有输出的总大小。
+    """
+    result = {"path": file_path, "ok": False, "skipped": None,
+              "original_size": 0, "new_size": 0, "error": None, "outputs": []}
+    try:
+        result["original_size"] = os.path.getsize(file_path)
+
+        with open_image(file_path) as img:
+            original_width, original_height = img.size
+            result["width"], result["height"] = original_width, original_height
+
+            # 按内容尺寸从大到小排列
+            plans = sorted(((compute_new_size(original_width, original_height, "target_size",
+                                              target_size=target_size), target_size)
+                            for target_size in target_sizes),
+                           key=lambda plan: plan[0][0] * plan[0][1], reverse=True)
+
+            # 只按最大的尺寸启用JPEG缩小解码，像素只解码这一次
+            apply_jpeg_draft(img, plans[0][0],
+                             FAST_JPEG_DRAFT_MARGIN if quality == "fast" else JPEG_DRAFT_MARGIN)
+
+            generated = []  # 已生成、还能作为后面尺寸来源的内容图像，从大到小
+            for step, (new_size, target_size) in enumerate(plans):
+                source = img
+                for candidate in reversed(generated):
+                    if can_cascade(candidate.size, new_size):
+                        source = candidate
+                        break
+
+                content = source if source.size == new_size else resize_image(source, new_size, quality)
+                generated.append(content)
+
+                output_path = pyramid_output_path(file_path, target_size, layout)
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                save_image(pad_to_target(content, target_size), output_path)
+
+                output_size = os.path.getsize(output_path)
+                result["outputs"].append({"target_size": target_size, "path": output_path,
+                                          "new_size": output_size})
+                result["new_size"] += output_size
+
+                # 不再保留后面的尺寸都不能从它缩小得到的图像
+                generated = [candidate for candidate in generated
+                             if any(can_cascade(candidate.size, size) for size, _ in plans[step + 1:])]
+
+        result["ok"] = True
+    except Exception as e:
+        import traceback
+        result["error"] = f"{e}"
+        result["traceback"] = traceback.format_exc()
+    return result
+
+
+def pyramid_batch(paths, target_sizes, layout="suffix", workers=None, quality="exact", control=None,
+                  memory_budget=None):
+    """批量多尺寸导出的生成器，按完成顺序逐个产出结果；control和memory_budget见resize_batch"""
+    if layout not in PYRAMID_LAYOUTS:
+        raise ValueError(f"未知的输出位置: {layout}")
+    if quality not in RESAMPLE_QUALITIES:
+        raise ValueError(f"未知的缩放质量: {quality}")
+    if not target_sizes:
+        raise ValueError("没有选择目标尺寸")
+    for target_size in target_sizes:
+        parse_target_size(target_size)
+
+    yield from _run_batch(process_pyramid, list(paths), workers or default_worker_count(),
+                          list(target_sizes), layout, quality, control=control,
+                          cost=lambda file_path: file_pyramid_memory(file_path, target_sizes, quality),
+                          budget=default_memory_budget() if memory_budget is None else memory_budget)
+
+
+def skipped_result(file_path, reason):
+    """未处理的文件的结果字典，skipped说明跳过的原因"""
+    size = os.path.getsize(file_path)
+    return {"path": file_path, "ok": True, "skipped": reason,
+            "original_size": size, "new_size": size, "error": None}
+
+
+def resize_batch(paths, mode, scale=1.0, target_size="", workers=None, quality="exact",
+                 manifest=None, max_bytes=None, timing=False, control=None, journal=None,
+                 memory_budget=None, vectorize=True, skip_processed=True):
+    """批量处理图片的生成器，按完成顺序逐个产出处理结果
+
+    workers为1时直接在当前进程中顺序处理，不创建进程池；
+    为None时使用全部CPU核心。quality取"exact"或"fast"。
+    传入manifest（ProcessManifest）时，跳过已用相同参数处理过的文件，并记录新处理的文件；
+    skip_processed为False时（强制重新处理）不跳过，但仍然记录，之后的批处理不会再次处理这些文件。
+    max_bytes为每个输出文件的字节数上限，各文件的查找在工作进程中并行进行。
+    timing为True时每个结果带有各阶段的耗时（见stage_timing）。
+    control（BatchControl）用于暂停和取消；journal（BatchJournal）记录每个完成的文件，中断后可以继续处理。
+    memory_budget为同时处理的图片的预计内存峰值之和的上限（字节，根据文件头估算），
+    为None时使用物理内存的MEMORY_BUDGET_FRACTION，为0时不限制。
+    vectorize为True且安装了numpy时，尺寸和模式相同的小图片分组后整组缩放（见batch_resample）。
+    """
+    if mode not in ("scale", "target_size"):
+        raise ValueError(f"未知的缩放模式: {mode}")
+    if quality not in RESAMPLE_QUALITIES:
+        raise ValueError(f"未知的缩放质量: {quality}")
+
+    workers = workers or default_worker_count()
+    paths = list(paths)
+
+    if manifest is not None:
+        params = params_key(mode, scale, target_size, quality, max_bytes)
+    if manifest is not None and skip_processed:
+        pending = []
+        for file_path in paths:
+            if control is not None and control.cancelled:
+                return
+            if manifest.is_processed(file_path, params):
+                result = skipped_result(file_path, "processed")
+                if journal is not None:
+                    journal.record(result)
+                yield result
+            else:
+                pending.append(file_path)
+        paths = pending
+
+    budget = default_memory_budget() if memory_budget is None else memory_budget
+    batches = []
+    headers = {}  # 分组时已读取的文件头，估算内存时不再打开文件
+    if vectorize:
+        # batch_resample依赖本模块，在这里导入以避免循环导入
+        import batch_resample
+        if batch_resample.NUMPY_AVAILABLE:
+            # 先处理分组的小图片（每组产出一个结果列表），再逐张处理其余文件
+            groups, paths, headers = batch_resample.group_images(paths, mode, scale, target_size, control)
+            batches.append(_run_batch(batch_resample.process_group, groups, workers,
+                                      mode, scale, target_size, quality, max_bytes, timing,
+                                      control=control,
+                                      cost=lambda group: batch_resample.group_peak_memory(
+                                          group, mode, scale, target_size, quality, max_bytes),
+                                      budget=budget))
+
+    def file_cost(file_path):
+        if file_path not in headers:
+            return file_peak_memory(file_path, mode, scale, target_size, quality,
+                                    STREAM_MIN_BYTES, max_bytes)
+        (width, height), image_mode, image_format, file_size = headers[file_path]
+        return estimate_peak_memory(width, height, image_mode, image_format, mode, scale, target_size,
+                                    quality, STREAM_MIN_BYTES, max_bytes, file_size)
+
+    batches.append(([result] for result in _run_batch(
+        process_image, paths, workers, mode, scale, target_size, quality, max_bytes, timing,
+        control=control, cost=file_cost, budget=budget)))
+
+    for result in (result for batch in batches for results in batch for result in results):
+        if manifest is not None and result["ok"] and not result["skipped"]:
+            manifest.record(result, params)
+        if journal is not None:
+            journal.record(result)
+        yield result
+
+
+class BatchControl:
+    """批处理的暂停和取消，可以在任意线程中调用
+
+    暂停或取消后不再提交新的文件，已提交给工作进程的块（见CHUNK_WORK_BYTES）会完成并产出结果
+    （替换原文件的过程不会被打断）。
+    """
+
+    def __init__(self):
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._cancelled = threading.Event()
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._resumed.set()
+
+    @property
+    def paused(self):
+        return not self._resumed.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def proceed(self, block=True):
+        """是否可以开始处理下一个文件；暂停中且block为True时等待继续或取消"""
+        if block:
+            self._resumed.wait()
+        return self._resumed.is_set() and not self.cancelled
+
+
+def _init_worker():
+    """进程池中每个工作进程启动时调用"""
+    Image.MAX_IMAGE_PIXELS = PROCESS_MAX_IMAGE_PIXELS
+
+
+@contextmanager
+def process_pixel_limit():
+    """with语句期间在当前进程中使用PROCESS_MAX_IMAGE_PIXELS，结束后恢复原来的上限
+
+    顺序处理（workers为1或只有一个文件）和估算内存时读取文件头都在当前进程中进行；
+    多个批处理同时进行时，最后一个结束后才恢复。原来的上限更宽（或不限制）时保持不变。
+    """
+    global _pixel_limit_users, _saved_pixel_limit
+    with _pixel_limit_lock:
+        if _pixel_limit_users == 0:
+            _saved_pixel_limit = Image.MAX_IMAGE_PIXELS
+            if _saved_pixel_limit is not None and _saved_pixel_limit < PROCESS_MAX_IMAGE_PIXELS:
+                Image.MAX_IMAGE_PIXELS = PROCESS_MAX_IMAGE_PIXELS
+        _pixel_limit_users += 1
+    try:
+        yield
+    finally:
+        with _pixel_limit_lock:
+            _pixel_limit_users -= 1
+            if _pixel_limit_users == 0:
+                Image.MAX_IMAGE_PIXELS = _saved_pixel_limit
+
+
+def _run_chunk(func, paths, *args):
+    """在工作进程中依次处理一块文件，返回结果列表"""
+    return [func(file_path, *args) for file_path in paths]
+
+
+def _run_batch(func, paths, workers, *args, control=None, cost=None, budget=None):
+    """对每个文件调用func(文件路径, *args)，workers大于1时在进程池中并行，按完成顺序产出结果
+
+    并行时文件按块提交（见CHUNK_WORK_BYTES），传入cost时按预计内存衡量每块的工作量。
+    传入control（BatchControl）时，暂停期间不开始新的块，取消后未提交的文件不再处理也不产出结果。
+    传入cost（文件路径 -> 预计内存峰值）和budget时，进行中的块的预计内存之和不超过budget
+    （块中的文件依次处理，每块按其中最大的一个计算）：放不下的块等待前面的块完成后再开始（保持原顺序），
+    单独就超过budget的文件放到最后逐个处理，处理时不同时处理其他文件。
+    """
+    with process_pixel_limit():
+        if workers <= 1 or len(paths) <= 1:
+            for file_path in paths:
+                if control is not None and not control.proceed():
+                    return
+                yield func(file_path, *args)
+            return
+
+        workers = min(workers, len(paths))
+        chunk_files = max(1, min(CHUNK_MAX_FILES, len(paths) // (workers * CHUNKS_PER_WORKER)))
+        remaining = iter(paths)
+        exhausted = False
+        chunk = []  # 下一个要提交的块
+        chunk_cost = 0  # 块中预计内存最大的一个
+        chunk_work = 0  # 块中预计内存之和
+        ready = False  # 块已经结束，等待提交
+        oversized = []  # 单独超过内存上限的文件
+        in_use = 0  # 进行中的块的预计内存之和
+        costs = {}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            pending = set()
+            while True:
+                # 逐步提交，进行中的块数不超过上限
+                while len(pending) < workers * IN_FLIGHT_PER_WORKER:
+                    # 没有进行中的块时才等待暂停结束，否则先取回进行中的结果
+                    if control is not None and not control.proceed(block=not pending):
+                        break
+                    if not ready:
+                        if not exhausted and len(chunk) < chunk_files and chunk_work < CHUNK_WORK_BYTES:
+                            file_path = next(remaining, None)
+                            if file_path is None:
+                                exhausted = True
+                                continue
+                            file_cost = cost(file_path) if cost is not None else 0
+                            if budget and file_cost > budget:
+                                oversized.append(file_path)
+                                continue
+                            chunk.append(file_path)
+                            chunk_cost = max(chunk_cost, file_cost)
+                            chunk_work += file_cost
+                            continue
+                        if chunk:
+                            ready = True
+                        elif oversized and not pending:
+                            # 其他文件都已完成，单独处理一个超大的文件
+                            chunk, chunk_cost, ready = [oversized.pop(0)], 0, True
+                        else:
+                            break
+                    # 没有进行中的块时总是提交，保证能继续
+                    if budget and pending and in_use + chunk_cost > budget:
+                        break
+                    future = executor.submit(_run_chunk, func, chunk, *args)
+                    pending.add(future)
+                    costs[future] = chunk_cost
+                    in_use += chunk_cost
+                    chunk, chunk_cost, chunk_work, ready = [], 0, 0, False
+                if not pending:
+                    if (exhausted and not chunk and not oversized) or (
+                            control is not None and control.cancelled):
+                        return
+                    continue
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_use -= costs.pop(future)
+                    yield from future.result()
+
+def collect_image_files(inputs):
+    """展开命令行参数中的文件和文件夹，返回按规范化路径去重的文件登记表"""
+    found_files = FileRegistry()
+
+    for item in inputs:
+        if os.path.isdir(item):
+            # 并行递归获取所有匹配的文件
+            found_files.extend(scan_folder(item, SUPPORTED_EXTENSIONS))
+        elif os.path.isfile(item):
+            if os.path.splitext(item)[1].lower() in SUPPORTED_EXTENSIONS:
+                found_files.add(item)
+        else:
+            print(f"文件不存在: {item}", file=sys.stderr)
+
+    return found_files
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="图片批量缩放（直接替换原文件），每处理完一个文件输出一行JSON结果")
+    parser.add_argument("paths", nargs="+", help="图片文件或文件夹（递归查找）")
+    parser.add_argument("--mode", choices=["scale", "target_size"], default="scale",
+                        help="缩放模式：按比例缩放或按目标尺寸")
+    parser.add_argument("--scale", type=float, default=1.0, help="缩放系数（scale模式）")
+    parser.add_argument("--target-size", default="",
+                        help="目标尺寸，例如 512x512（target_size模式）")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="并行进程数，默认使用全部CPU核心")
+    parser.add_argument("--quality", choices=RESAMPLE_QUALITIES, default="exact",
+                        help="缩放质量：exact为完整LANCZOS，fast为先整数倍缩小再LANCZOS")
+    parser.add_argument("--max-bytes", type=parse_byte_size, default=None,
+                        help="每个输出文件的大小上限，例如 500K、2M（自动降低编码质量，必要时缩小尺寸）")
+    parser.add_argument("--pyramid", default="",
+                        help="多尺寸导出，逗号分隔的目标尺寸，例如 1024x1024,512x512（不替换原文件）")
+    parser.add_argument("--layout", choices=PYRAMID_LAYOUTS, default="suffix",
+                        help="多尺寸导出的文件位置：suffix为文件名加尺寸后缀，folder为按尺寸分文件夹")
+    parser.add_argument("--force", action="store_true",
+                        help="重新处理已用相同参数处理过的文件（处理结果仍然记录）")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="只读取文件头，输出处理计划，不修改任何文件")
+    parser.add_argument("--plan-output", default="",
+                        help="试运行时把计划导出到文件（.csv或.json）")
+    parser.add_argument("--trace", default="",
+                        help="记录各阶段耗时，保存为Chrome跟踪文件（chrome://tracing或Perfetto打开）")
+    parser.add_argument("--timing-summary", action="store_true",
+                        help="记录各阶段耗时，结束后把汇总表输出到标准错误")
+    parser.add_argument("--cprofile", default="",
+                        help="用cProfile分析主进程，结果保存到该文件（需要分析处理过程时使用--workers 1）")
+    parser.add_argument("--tracemalloc", type=int, default=0,
+                        help="用tracemalloc跟踪主进程的内存分配，结束后输出分配最多的N行")
+    parser.add_argument("--journal", default="",
+                        help="检查点日志文件：记录已完成的文件，中断后用相同参数再次运行时只处理剩余的文件")
+    parser.add_argument("--memory-budget", type=parse_byte_size, default=None,
+                        help="同时处理的图片的预计内存之和的上限，例如 4G（默认为物理内存的一半，0为不限制）")
+    parser.add_argument("--no-vectorize", action="store_true",
+                        help="不对尺寸和模式相同的小图片分组整组缩放，全部逐张处理")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    _init_worker()  # 试运行和估算内存在当前进程中读取文件头
+
+    if args.target_size:
+        try:
+            parse_target_size(args.target_size)
+        except ValueError:
+            print(f"目标尺寸格式错误: {args.target_size}", file=sys.stderr)
+            return 2
+
+    pyramid_sizes = [size.strip() for size in args.pyramid.split(",") if size.strip()]
+    for target_size in pyramid_sizes:
+        try:
+            parse_target_size(target_size)
+        except ValueError:
+            print(f"目标尺寸格式错误: {target_size}", file=sys.stderr)
+            return 2
+    if pyramid_sizes and args.dry_run:
+        print("多尺寸导出不支持试运行", file=sys.stderr)
+        return 2
+
+    files = collect_image_files(args.paths)
+    if pyramid_sizes:
+        failed = 0
+        for result in pyramid_batch(files, pyramid_sizes, args.layout, args.workers, args.quality,
+                                    memory_budget=args.memory_budget):
+            if not result["ok"]:
+                failed += 1
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+        return 1 if failed else 0
+
+    if args.dry_run:
+        # 试运行只读取已有的处理记录，不创建记录文件；--force时所有文件都会处理，不需要读取
+        manifest = None if args.force else ProcessManifest(read_only=True)
+        try:
+            return dry_run(files, args, manifest)
+        finally:
+            if manifest is not None:
+                manifest.close()
+
+    # --force只是不跳过已处理的文件，处理结果仍然记录
+    manifest = ProcessManifest()
+
+    journal = None
+    if args.journal:
+        settings = batch_settings(args.mode, args.scale, args.target_size, args.quality, args.max_bytes)
+        journal = BatchJournal(args.journal)
+        state = load_journal(args.journal)
+        if state is None:
+            journal.start(files, settings)
+        elif state["settings"] != settings:
+            print(f"检查点日志中的处理参数与本次不同: {args.journal}", file=sys.stderr)
+            return 2
+        else:
+            print(f"继续上次的批处理：已完成 {state['done']} 张，剩余 {len(state['pending'])} 张",
+                  file=sys.stderr)
+            files = state["pending"]
+            journal.resume()
+
+    failed = 0
+    interrupted = False
+    timing = bool(args.trace or args.timing_summary)
+    recorder = TraceRecorder()
+    try:
+        with profile_run(args.cprofile, args.tracemalloc):
+            for result in resize_batch(files, args.mode, args.scale, args.target_size,
+                                       args.workers, args.quality, manifest, args.max_bytes, timing,
+                                       journal=journal, memory_budget=args.memory_budget,
+                                       vectorize=not args.no_vectorize, skip_processed=not args.force):
+                if not result["ok"]:
+                    failed += 1
+                recorder.add(result)
+                # 各阶段耗时只写入跟踪文件和汇总表
+                print(json.dumps({key: value for key, value in result.items() if key != "stages"},
+                                 ensure_ascii=False), flush=True)
+    except KeyboardInterrupt:
+        interrupted = True
+    finally:
+        manifest.close()
+        if journal is not None:
+            # 全部成功时删除日志，否则保留以便继续处理（失败的文件会重试）
+            if failed or interrupted:
+                journal.close()
+            else:
+                journal.finish()
+
+    if interrupted:
+        if journal is not None:
+            print("已中断，再次运行同一命令继续处理剩余的文件", file=sys.stderr)
+        return 130
+
+    if args.trace:
+        recorder.write_chrome_trace(args.trace)
+        print(f"跟踪文件已保存到: {args.trace}", file=sys.stderr)
+    if args.timing_summary:
+        print(recorder.format_summary(), file=sys.stderr)
+
+    return 1 if failed else 0
+
+
+def dry_run(files, args, manifest):
+    """输出每个文件的计划（每行一个JSON），最后一行为汇总"""
+    # batch_planner依赖本模块，在这里导入以避免循环导入
+    import batch_planner
+    import size_estimator
+
+    plans = batch_planner.plan_batch(files, args.mode, args.scale, args.target_size,
+                                     args.quality, manifest=manifest, max_bytes=args.max_bytes)
+    # 分层抽样编码一部分文件，替换按面积比例的估算
+    sampled = size_estimator.estimate_batch(plans, args.mode, args.scale, args.target_size,
+                                            args.quality, max_bytes=args.max_bytes,
+                                            memory_budget=args.memory_budget)
+    totals = batch_planner.summarize_plan(plans)
+    totals["sampled"] = sampled
+    for plan in plans:
+        print(json.dumps(plan, ensure_ascii=False))
+    print(json.dumps({"totals": totals}, ensure_ascii=False), flush=True)
+
+    if args.plan_output:
+        batch_planner.export_plan(plans, args.plan_output, totals)
+    return 1 if totals["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
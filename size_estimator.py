@@ -0,0 +1,206 @@
+"""输出文件大小估算
+
+按面积比例估算对PNG、quality=95的JPEG以及目标尺寸模式下填充后的输出都很不准，
+经常在文件实际会变大时预测为变小。这里用与实际处理相同的流程和保存参数在内存中编码，
+得到真实的输出字节数：单张图片在后台线程中编码并按(文件, 参数)缓存；
+整批图片按格式、操作和原图压缩率分层抽样编码，再按每层的每像素字节数外推。
+"""
+import io
+import os
+import math
+import queue
+import random
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import resize_engine
+
+# 输出超过此像素数时，先按比例缩小再编码，然后按像素数外推，避免估算时编码整张大图
+ESTIMATE_MAX_PIXELS = 1024 * 1024
+
+# 整批估算时抽样编码的文件数
+DEFAULT_SAMPLE_SIZE = 32
+
+
+def output_dimensions(new_size, mode, target_size):
+    """最终输出的尺寸（目标尺寸模式下为填充后的尺寸）"""
+    if mode == "target_size" and target_size:
+        return resize_engine.parse_target_size(target_size)
+    return new_size
+
+
+def encode_output_size(file_path, mode, scale=1.0, target_size="", quality="exact",
+                       max_pixels=ESTIMATE_MAX_PIXELS):
+    """在内存中按实际的处理流程和保存参数编码，返回输出文件的字节数"""
+    with resize_engine.open_image(file_path) as img:
+        action, new_size = resize_engine.plan_action(img.width, img.height, mode, scale, target_size)
+        if action == "none":
+            return os.path.getsize(file_path)
+
+        output_width, output_height = output_dimensions(new_size, mode, target_size)
+        factor = min(1.0, math.sqrt(max_pixels / (output_width * output_height)))
+        sample_size = (max(1, round(new_size[0] * factor)), max(1, round(new_size[1] * factor)))
+
+        if sample_size != img.size:
+            resize_engine.apply_jpeg_draft(img, sample_size,
+                                           resize_engine.FAST_JPEG_DRAFT_MARGIN if quality == "fast"
+                                           else resize_engine.JPEG_DRAFT_MARGIN)
+            out = resize_engine.resize_image(img, sample_size, quality)
+        else:
+            out = img
+
+        if mode == "target_size" and target_size:
+            pad_width = max(1, round(output_width * factor))
+            pad_height = max(1, round(output_height * factor))
+            out = resize_engine.pad_to_target(out, f"{pad_width}x{pad_height}")
+
+        buffer = io.BytesIO()
+        resize_engine.save_image(out, file_path, buffer)
+        # 按像素数外推到实际输出尺寸
+        return int(buffer.tell() * (output_width * output_height) / (out.width * out.height))
+
+
+class SizeEstimator:
+    """单张图片的后台估算，按(文件, 文件签名, 参数)缓存结果
+
+    文件签名为调用方已有的(文件大小, 修改时间)（见image_metadata），查询缓存不访问磁盘。
+    只处理最新提交的请求（拖动滑块时中间的参数不需要计算），
+    结果由主线程通过drain()取回。
+    """
+
+    def __init__(self):
+        self.cache = {}  # (文件路径, 文件签名, 参数) -> 字节数
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def get(self, file_path, signature, params):
+        """读取缓存的估算值，没有时返回None。params为(mode, scale, target_size, quality)"""
+        return self.cache.get((file_path, signature, params))
+
+    def submit(self, file_path, signature, params):
+        self.requests.put((file_path, signature, params))
+
+    def drain(self):
+        """取回已完成的估算，返回[(文件路径, 参数, 字节数或None, 错误)]"""
+        done = []
+        try:
+            while True:
+                done.append(self.results.get_nowait())
+        except queue.Empty:
+            pass
+        return done
+
+    def _worker(self):
+        while True:
+            request = self.requests.get()
+            # 只保留最新的请求
+            try:
+                while True:
+                    request = self.requests.get_nowait()
+            except queue.Empty:
+                pass
+
+            file_path, signature, params = request
+            try:
+                key = (file_path, signature, params)
+                if key not in self.cache:
+                    self.cache[key] = encode_output_size(file_path, *params)
+                self.results.put((file_path, params, self.cache[key], None))
+            except Exception as e:
+                self.results.put((file_path, params, None, e))
+
+
+def sample_peak_memory(plan, quality="exact"):
+    """抽样编码一个文件的预计内存峰值（根据计划中的尺寸，不打开文件）
+
+    解码的原图按每像素4字节计算（JPEG按缩小解码后的尺寸），加上缩放、填充和编码结果，
+    三者都不超过ESTIMATE_MAX_PIXELS。
+    """
+    width, height = plan["width"], plan["height"]
+    output_pixels = max(1, plan["new_width"] * plan["new_height"])
+    factor = min(1.0, math.sqrt(ESTIMATE_MAX_PIXELS / output_pixels))
+    if os.path.splitext(plan["path"])[1].lower() in (".jpg", ".jpeg"):
+        # 填充后的尺寸不小于缩放结果，按它计算的缩小倍数不会偏大
+        sample_size = (max(1, round(plan["new_width"] * factor)), max(1, round(plan["new_height"] * factor)))
+        draft_scale = resize_engine.jpeg_draft_scale(
+            width, height, sample_size,
+            resize_engine.FAST_JPEG_DRAFT_MARGIN if quality == "fast" else resize_engine.JPEG_DRAFT_MARGIN)
+        width, height = -(-width // draft_scale), -(-height // draft_scale)
+    decoded = width * height * resize_engine.DEFAULT_PIXEL_BYTES
+    return decoded + 3 * int(output_pixels * factor * factor) * resize_engine.DEFAULT_PIXEL_BYTES
+
+
+def stratum_key(plan):
+    """分层依据：格式、操作和原图每像素字节数的量级（反映图片内容的复杂程度）"""
+    ext = os.path.splitext(plan["path"])[1].lower()
+    source_bpp = plan["file_size"] / max(1, plan["width"] * plan["height"])
+    return ext, plan["action"], int(math.log2(source_bpp + 1e-6) * 2)
+
+
+def estimate_batch(plans, mode, scale=1.0, target_size="", quality="exact",
+                   sample_size=DEFAULT_SAMPLE_SIZE, threads=None, seed=0, max_bytes=None,
+                   memory_budget=None):
+    """分层抽样编码，更新计划中需要处理的文件的estimated_size，返回实际编码的文件数
+
+    每层按文件数比例分配样本（至少一个），用样本的每输出像素字节数乘以各文件的输出像素数。
+    有文件大小上限时，估算值不超过上限。
+    memory_budget与resize_engine.resize_batch相同：同时编码的样本的预计内存之和不超过上限，
+    单独超过上限的样本等其他样本完成后单独编码。
+    """
+    strata = defaultdict(list)
+    for plan in plans:
+        if plan["action"] in ("resize", "pad"):
+            strata[stratum_key(plan)].append(plan)
+    total = sum(len(members) for members in strata.values())
+    if not total:
+        return 0
+
+    rng = random.Random(seed)
+    samples = {}
+    for key, members in strata.items():
+        count = min(len(members), max(1, round(sample_size * len(members) / total)))
+        samples[key] = rng.sample(members, count)
+
+    budget = resize_engine.default_memory_budget() if memory_budget is None else memory_budget
+    gate = threading.Condition()
+    in_use = [0]  # 正在编码的样本的预计内存之和
+
+    def encode(plan):
+        cost = sample_peak_memory(plan, quality) if budget else 0
+        with gate:
+            gate.wait_for(lambda: not in_use[0] or in_use[0] + cost <= budget)
+            in_use[0] += cost
+        try:
+            return encode_output_size(plan["path"], mode, scale, target_size, quality)
+        except Exception as e:
+            print(f"估算输出大小失败: {plan['path']}, 错误: {e}")
+            return None
+        finally:
+            with gate:
+                in_use[0] -= cost
+                gate.notify_all()
+
+    sampled = [plan for members in samples.values() for plan in members]
+    with ThreadPoolExecutor(max_workers=threads or resize_engine.default_worker_count()) as executor:
+        encoded = dict(zip(map(id, sampled), executor.map(encode, sampled)))
+
+    encoded_count = 0
+    for key, members in strata.items():
+        measured = [(encoded[id(plan)], plan) for plan in samples[key] if encoded[id(plan)] is not None]
+        if not measured:
+            continue  # 这一层保留按面积比例的估算
+        pixels = sum(plan["new_width"] * plan["new_height"] for _, plan in measured)
+        bytes_per_pixel = sum(size for size, _ in measured) / max(1, pixels)
+
+        for plan in members:
+            plan["estimated_size"] = int(bytes_per_pixel * plan["new_width"] * plan["new_height"])
+        # 抽中的文件使用实际编码的结果
+        for size, plan in measured:
+            plan["estimated_size"] = size
+        if max_bytes:
+            for plan in members:
+                plan["estimated_size"] = min(plan["estimated_size"], max_bytes)
+        encoded_count += len(measured)
+    return encoded_count
@@ -0,0 +1,158 @@
+"""分阶段计时与跟踪导出
+
+处理单张图片时记录打开、解码、缩放、填充、编码、写入各阶段的耗时和字节数，
+汇总成表格，或导出为Chrome跟踪格式（chrome://tracing、Perfetto可以直接打开），
+每个工作进程显示为一行，慢的文件和阶段一目了然。
+还可以用cProfile和tracemalloc包裹整个运行过程（只能分析当前进程，需要完整分析时把并行进程数设为1）。
+"""
+import os
+import sys
+import json
+import time
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+
+# 处理流程的各个阶段，按执行顺序排列
+STAGES = ("open", "decode", "resize", "pad", "encode", "write")
+
+# 汇总表中列出的最慢文件数
+SLOWEST_FILES = 10
+
+
+class StageTimer:
+    """记录一张图片各阶段的耗时；disabled时不做任何事"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        """计时一个阶段，with语句返回的字典可以写入bytes字段"""
+        record = {"stage": name, "bytes": 0}
+        if not self.enabled:
+            yield record
+            return
+        record["start"] = time.time()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["duration"] = time.perf_counter() - start
+            self.stages.append(record)
+
+
+class TraceRecorder:
+    """收集带有stages的处理结果，生成汇总表和Chrome跟踪文件"""
+
+    def __init__(self):
+        self.results = []
+
+    def add(self, result):
+        if result.get("stages"):
+            self.results.append(result)
+
+    def chrome_trace(self):
+        """Chrome跟踪格式（Trace Event Format）的字典，时间单位为微秒"""
+        events = []
+        pids = set()
+        for result in self.results:
+            pid = result.get("pid", 0)
+            pids.add(pid)
+            for record in result["stages"]:
+                events.append({
+                    "name": record["stage"],
+                    "cat": "image",
+                    "ph": "X",
+                    "ts": record["start"] * 1e6,
+                    "dur": record["duration"] * 1e6,
+                    "pid": 1,
+                    "tid": pid,
+                    "args": {"path": result["path"], "bytes": record["bytes"]},
+                })
+        for pid in sorted(pids):
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": pid,
+                           "args": {"name": f"工作进程 {pid}"}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, output_path):
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+
+    def summary(self):
+        """每个阶段的次数、总耗时、平均、P95、最大耗时和字节数，以及最慢的文件"""
+        durations = {}
+        nbytes = {}
+        for result in self.results:
+            for record in result["stages"]:
+                durations.setdefault(record["stage"], []).append(record["duration"])
+                nbytes[record["stage"]] = nbytes.get(record["stage"], 0) + record["bytes"]
+
+        stages = {}
+        for name in sorted(durations, key=lambda n: STAGES.index(n) if n in STAGES else len(STAGES)):
+            values = sorted(durations[name])
+            stages[name] = {
+                "count": len(values),
+                "total": sum(values),
+                "mean": sum(values) / len(values),
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max": values[-1],
+                "bytes": nbytes[name],
+            }
+
+        file_totals = sorted(((sum(r["duration"] for r in result["stages"]), result["path"])
+                              for result in self.results), reverse=True)
+        return {"stages": stages, "slowest": file_totals[:SLOWEST_FILES]}
+
+    def format_summary(self):
+        """汇总表的文本形式"""
+        summary = self.summary()
+        total = sum(stage["total"] for stage in summary["stages"].values()) or 1
+        lines = [f"{'阶段':<8}{'次数':>8}{'总耗时(s)':>12}{'占比':>8}{'平均(ms)':>10}{'P95(ms)':>10}"
+                 f"{'最大(ms)':>10}{'字节数':>14}"]
+        for name, stage in summary["stages"].items():
+            lines.append(f"{name:<8}{stage['count']:>8}{stage['total']:>12.3f}"
+                         f"{stage['total'] / total:>8.1%}{stage['mean'] * 1000:>10.1f}"
+                         f"{stage['p95'] * 1000:>10.1f}{stage['max'] * 1000:>10.1f}{stage['bytes']:>14}")
+        if summary["slowest"]:
+            lines.append("")
+            lines.append("最慢的文件:")
+            for seconds, path in summary["slowest"]:
+                lines.append(f"  {seconds * 1000:>8.1f} ms  {path}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile_run(cprofile_path="", tracemalloc_top=0):
+    """用cProfile和/或tracemalloc包裹一段代码
+
+    cprofile_path非空时把统计结果保存到该文件（可用snakeviz等工具查看），
+    tracemalloc_top大于0时结束后打印分配内存最多的代码行（输出到标准错误，不影响JSON结果）。
+    """
+    profiler = None
+    if cprofile_path:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    if tracemalloc_top:
+        tracemalloc.start()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+            print(f"cProfile结果已保存到: {cprofile_path}", file=sys.stderr)
+        if tracemalloc_top:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"tracemalloc: 当前 {current / 1024 / 1024:.1f} MB，峰值 {peak / 1024 / 1024:.1f} MB",
+                  file=sys.stderr)
+            for stat in snapshot.statistics("lineno")[:tracemalloc_top]:
+                print(f"  {stat}", file=sys.stderr)
+
+
+def default_trace_path(folder):
+    """GUI中保存跟踪文件的默认位置"""
+    return os.path.join(folder, time.strftime("trace_%Y%m%d_%H%M%S.json"))
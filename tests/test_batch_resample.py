@@ -0,0 +1,84 @@
+"""整组缩放与Pillow的LANCZOS比较"""
+import pytest
+from PIL import Image
+
+np = pytest.importorskip("numpy")
+
+import batch_resample
+import resize_engine
+
+SIZES = [((64, 64), (32, 32)), ((64, 64), (48, 48)), ((60, 40), (37, 22)),
+         ((32, 32), (96, 96)), ((64, 64), (5, 5)), ((33, 17), (7, 40))]
+
+
+def random_images(mode, size, count=6, seed=0):
+    """平滑的随机图片（小块随机像素放大），带透明度的模式包含完全透明和半透明的像素"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    images = []
+    for _ in range(count):
+        small = rng.integers(0, 256, (height // 4 + 1, width // 4 + 1, 4), dtype=np.uint8)
+        images.append(Image.fromarray(small, "RGBA").resize(size, Image.BILINEAR).convert(mode))
+    return images
+
+
+@pytest.mark.parametrize("mode", ["L", "RGB"])
+@pytest.mark.parametrize("size, new_size", SIZES)
+def test_within_one_level_of_pillow(mode, size, new_size):
+    images = random_images(mode, size)
+    stack = np.stack([np.asarray(img) for img in images])
+    actual = batch_resample.resample_stack(stack, new_size, mode).astype(int)
+    expected = np.stack([np.asarray(img.resize(new_size, Image.LANCZOS)) for img in images])
+    assert actual.shape == expected.shape
+    assert np.abs(actual - expected).max() <= 1
+
+
+@pytest.mark.parametrize("size, new_size", SIZES)
+def test_premultiplied_within_one_level_of_pillow(size, new_size):
+    # 预乘后的数值与Pillow的RGBa缩放最多相差1级
+    images = [img.convert("RGBa") for img in random_images("RGBA", size)]
+    stack = np.stack([np.asarray(img) for img in images])
+    actual = batch_resample.resample_stack(stack, new_size, "RGBa").astype(int)
+    expected = np.stack([np.asarray(img.resize(new_size, Image.LANCZOS)) for img in images])
+    assert np.abs(actual - expected).max() <= 1
+
+
+@pytest.mark.parametrize("mode, premultiplied", [("RGBA", "RGBa"), ("LA", "La")])
+def test_premultiply_matches_pillow(mode, premultiplied):
+    images = random_images(mode, (40, 30))
+    stack = np.stack([np.asarray(img) for img in images])
+    planes = np.ascontiguousarray(stack.transpose(0, 3, 1, 2))
+    alpha_channel = batch_resample.PREMULTIPLIED_MODES[mode]
+
+    converted = batch_resample.premultiply(planes, alpha_channel)
+    expected = np.stack([np.asarray(img.convert(premultiplied)) for img in images])
+    assert np.array_equal(converted.astype(np.uint8).transpose(0, 2, 3, 1), expected)
+
+    restored = batch_resample.unpremultiply(expected.transpose(0, 3, 1, 2).astype(np.float32),
+                                            alpha_channel)
+    expected = np.stack([np.asarray(Image.fromarray(pixels, premultiplied).convert(mode))
+                         for pixels in expected])
+    assert np.array_equal(restored.astype(np.uint8).transpose(0, 2, 3, 1), expected)
+
+
+def test_group_images(tmp_path):
+    icons = []
+    for i in range(batch_resample.BATCH_MIN_GROUP):
+        path = str(tmp_path / f"icon{i}.png")
+        Image.new("RGBA", (32, 32), (i, 0, 0, 128)).save(path)
+        icons.append(path)
+    photo = str(tmp_path / "photo.jpg")
+    Image.new("RGB", (32, 32)).save(photo)
+    large = str(tmp_path / "large.png")
+    Image.new("RGB", (200, 200)).save(large)
+
+    groups, singles, headers = batch_resample.group_images(icons + [photo, large], "scale", 0.5)
+    assert [group["paths"] for group in groups] == [icons]
+    assert groups[0]["new_size"] == (16, 16)
+    assert sorted(singles) == sorted([photo, large])
+    assert photo not in headers  # 按扩展名排除，不打开文件
+
+    control = resize_engine.BatchControl()
+    control.cancel()
+    groups, singles, headers = batch_resample.group_images(icons, "scale", 0.5, control=control)
+    assert groups == [] and singles == icons and headers == {}
@@ -0,0 +1,34 @@
+"""文件登记表：删除后按位置访问和查找位置与普通列表一致"""
+import random
+
+from file_registry import FileRegistry
+
+
+def test_matches_list_after_random_edits():
+    rng = random.Random(0)
+    registry, expected = FileRegistry(), []
+    for _ in range(3000):
+        if expected and rng.random() < 0.45:
+            file_path = rng.choice(expected)
+            registry.remove(file_path)
+            expected.remove(file_path)
+        else:
+            file_path = f"/images/{rng.randrange(1000)}.jpg"
+            if registry.add(file_path):
+                expected.append(file_path)
+        if expected:
+            position = rng.randrange(len(expected))
+            assert registry[position] == expected[position]
+            assert registry[-1] == expected[-1]
+            assert registry.index(expected[position]) == position
+    assert list(registry) == expected
+    assert len(registry) == len(expected)
+
+
+def test_single_removal_does_not_compact():
+    registry = FileRegistry(f"/images/{i}.jpg" for i in range(100))
+    registry.remove("/images/10.jpg")
+    # 按位置访问和查找位置不整理列表，只有空位超过一半时才整理
+    assert registry[10] == "/images/11.jpg"
+    assert registry.index("/images/99.jpg") == 98
+    assert len(registry.entries) == 100
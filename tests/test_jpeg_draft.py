@@ -0,0 +1,39 @@
+"""JPEG缩小解码与完整解码后缩放的画质比较"""
+import pytest
+from PIL import Image
+
+import resize_engine
+from benchmark import synthetic_image, psnr
+
+# 缩小解码与完整解码缩放结果的最低PSNR（dB）
+MIN_PSNR = 40.0
+
+
+@pytest.fixture(scope="module")
+def jpeg_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("draft") / "photo.jpg"
+    synthetic_image(1600, 1200, "RGB", seed=3).save(path, quality=90)
+    return str(path)
+
+
+# 目标尺寸乘以余量（JPEG_DRAFT_MARGIN）后，缩小解码分别使用1/2、1/4、1/8
+@pytest.mark.parametrize("scale, draft_scale", [(0.25, 2), (0.125, 4), (0.0625, 8)])
+def test_draft_matches_full_decode(jpeg_path, scale, draft_scale):
+    with Image.open(jpeg_path) as full:
+        new_size = resize_engine.compute_new_size(full.width, full.height, "scale", scale)
+        expected = resize_engine.resize_image(full, new_size)
+
+    with Image.open(jpeg_path) as draft:
+        decoded = resize_engine.apply_jpeg_draft(draft, new_size)
+        assert decoded == (1600 // draft_scale, 1200 // draft_scale)
+        assert resize_engine.jpeg_draft_scale(1600, 1200, new_size) == draft_scale
+        actual = resize_engine.resize_image(draft, new_size)
+
+    assert actual.size == expected.size
+    assert psnr(expected.convert("RGB"), actual.convert("RGB")) >= MIN_PSNR
+
+
+def test_no_draft_for_small_downscale(jpeg_path):
+    with Image.open(jpeg_path) as img:
+        new_size = resize_engine.compute_new_size(img.width, img.height, "scale", 0.5)
+        assert resize_engine.apply_jpeg_draft(img, new_size) == (1600, 1200)
@@ -0,0 +1,26 @@
+"""处理记录：--force重新处理时仍然记录结果"""
+import json
+
+from PIL import Image
+
+import resize_engine
+
+
+def run(capsys, *argv):
+    assert resize_engine.main(list(argv)) == 0
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_force_still_records(tmp_path, capsys):
+    path = tmp_path / "a.png"
+    Image.new("RGB", (200, 100), (10, 20, 30)).save(path)
+    options = ("--scale", "0.5", "--workers", "1")
+
+    first = run(capsys, str(tmp_path), *options, "--force")
+    assert first[0]["ok"] and first[0]["skipped"] is None
+
+    # 下一次正常运行跳过，不会再缩小一次
+    second = run(capsys, str(tmp_path), *options)
+    assert second[0]["skipped"] == "processed"
+    with Image.open(path) as img:
+        assert img.size == (100, 50)
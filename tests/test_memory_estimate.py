@@ -0,0 +1,25 @@
+"""根据文件头估算内存峰值"""
+import resize_engine
+
+
+def test_unchanged_size_costs_nothing():
+    assert resize_engine.estimate_peak_memory(10000, 10000, "RGB", "TIFF", "scale", 1.0) == 0
+
+
+def test_encode_for_max_bytes_is_charged():
+    # 尺寸不变但文件超出上限时需要解码并反复编码
+    decoded = 10000 * 10000 * 4
+    peak = resize_engine.estimate_peak_memory(10000, 10000, "RGB", "TIFF", "scale", 1.0,
+                                              max_bytes=5000000, file_size=300000000)
+    assert peak > decoded
+    # 文件本身已不超过上限时不处理
+    assert resize_engine.estimate_peak_memory(10000, 10000, "RGB", "TIFF", "scale", 1.0,
+                                              max_bytes=5000000, file_size=4000000) == 0
+
+
+def test_max_bytes_disables_streaming_estimate():
+    streamed = resize_engine.estimate_peak_memory(40000, 40000, "RGB", "TIFF", "scale", 0.5)
+    assert streamed <= 2 * resize_engine.STREAM_BAND_BYTES
+    whole = resize_engine.estimate_peak_memory(40000, 40000, "RGB", "TIFF", "scale", 0.5,
+                                               max_bytes=5000000)
+    assert whole > 40000 * 40000 * 4
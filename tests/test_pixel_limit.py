@@ -0,0 +1,27 @@
+"""当前进程中顺序处理时同样使用处理进程的像素数上限"""
+from PIL import Image
+
+import resize_engine
+
+
+def test_serial_batch_opens_image_over_default_limit(tmp_path, monkeypatch):
+    # 把Pillow的默认上限调低，模拟界面中处理超过默认上限的扫描图
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    path = str(tmp_path / "scan.png")
+    Image.new("RGB", (100, 80), (200, 100, 50)).save(path)
+
+    results = list(resize_engine.resize_batch([path], "scale", 0.5, workers=1))
+
+    assert results[0]["error"] is None
+    assert (results[0]["new_width"], results[0]["new_height"]) == (50, 40)
+    # 批处理结束后恢复界面的上限
+    assert Image.MAX_IMAGE_PIXELS == 1000
+
+
+def test_pixel_limit_restored_after_nested_use(monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    with resize_engine.process_pixel_limit():
+        with resize_engine.process_pixel_limit():
+            assert Image.MAX_IMAGE_PIXELS == resize_engine.PROCESS_MAX_IMAGE_PIXELS
+        assert Image.MAX_IMAGE_PIXELS == resize_engine.PROCESS_MAX_IMAGE_PIXELS
+    assert Image.MAX_IMAGE_PIXELS == 1000
@@ -0,0 +1,33 @@
+"""多尺寸导出"""
+from PIL import Image
+
+import resize_engine
+
+
+def test_pyramid_closes_source(tmp_path, monkeypatch):
+    path = str(tmp_path / "photo.png")
+    Image.new("RGB", (1600, 1200), (90, 120, 150)).save(path)
+    opened = []
+
+    def open_image(file_path):
+        img = Image.open(file_path)
+        opened.append(img)
+        return img
+
+    monkeypatch.setattr(resize_engine, "open_image", open_image)
+    result = resize_engine.process_pyramid(path, ["800x800", "400x400", "100x100", "50x50"])
+    assert result["ok"], result["error"]
+    # 返回前已关闭原图，不依赖垃圾回收
+    assert opened and all(img.fp is None for img in opened)
+    with Image.open(resize_engine.pyramid_output_path(path, "50x50")) as img:
+        assert img.size == (50, 50)
+
+    # 解码前出错时同样关闭原图
+    opened.clear()
+    assert not resize_engine.process_pyramid(path, ["800x800", "错误"])["ok"]
+    assert opened and all(img.fp is None for img in opened)
+
+
+def test_can_cascade():
+    assert resize_engine.can_cascade((800, 600), (400, 300))
+    assert not resize_engine.can_cascade((800, 600), (400, 301))
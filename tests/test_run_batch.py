@@ -0,0 +1,26 @@
+"""进程池按块提交文件"""
+import resize_engine
+
+
+def square(value, offset):
+    return value * value + offset
+
+
+def test_chunks_yield_every_result_once(monkeypatch):
+    monkeypatch.setattr(resize_engine, "CHUNK_MAX_FILES", 4)
+    results = list(resize_engine._run_batch(square, list(range(50)), 2, 1))
+    assert sorted(results) == [value * value + 1 for value in range(50)]
+
+
+def test_chunks_respect_memory_budget(monkeypatch):
+    # 每块按其中最大的一个计算，超过上限的文件最后单独处理
+    results = list(resize_engine._run_batch(square, list(range(20)), 2, 0,
+                                            cost=lambda value: 100 if value == 3 else 1, budget=10))
+    assert sorted(results) == [value * value for value in range(20)]
+    assert results[-1] == 9
+
+
+def test_cancel_stops_submitting_chunks():
+    control = resize_engine.BatchControl()
+    control.cancel()
+    assert list(resize_engine._run_batch(square, list(range(50)), 2, 0, control=control)) == []
@@ -0,0 +1,43 @@
+"""试运行的抽样编码"""
+import threading
+import time
+
+import size_estimator
+
+
+def make_plans(count, width=4000, height=3000):
+    return [{"path": f"scan_{i}.png", "action": "resize", "width": width, "height": height,
+             "new_width": width // 2, "new_height": height // 2, "file_size": width * height,
+             "estimated_size": 0} for i in range(count)]
+
+
+def test_samples_respect_memory_budget(monkeypatch):
+    active = [0, 0]  # 正在编码的数量，最大值
+    lock = threading.Lock()
+
+    def fake_encode(file_path, *args):
+        with lock:
+            active[0] += 1
+            active[1] = max(active[1], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return 1000
+
+    monkeypatch.setattr(size_estimator, "encode_output_size", fake_encode)
+    plans = make_plans(8)
+    cost = size_estimator.sample_peak_memory(plans[0])
+    # 上限只够同时编码两张
+    sampled = size_estimator.estimate_batch(plans, "scale", 0.5, threads=8, memory_budget=cost * 2)
+    assert sampled == 8
+    assert active[1] <= 2
+    # 单独超过上限的样本仍然会编码
+    assert size_estimator.estimate_batch(make_plans(3), "scale", 0.5, threads=4, memory_budget=1) == 3
+
+
+def test_jpeg_samples_use_draft_size():
+    # 缩小到1/10时JPEG按1/4缩小解码
+    plan = dict(make_plans(1)[0], new_width=400, new_height=300)
+    png = size_estimator.sample_peak_memory(plan)
+    jpeg = size_estimator.sample_peak_memory(dict(plan, path="photo.jpg"))
+    assert jpeg < png / 8
@@ -0,0 +1,45 @@
+"""分带处理与整张处理的结果相同，Pillow不支持内存映射的图像时改用普通内存"""
+import pytest
+from PIL import Image, ImageChops
+
+import resize_engine
+
+
+def make_image(path, mode):
+    img = Image.linear_gradient("L").resize((240, 200))
+    bands = {"RGB": (img, img.rotate(90), img.transpose(Image.FLIP_LEFT_RIGHT)),
+             "RGBA": (img, img.rotate(90), img.transpose(Image.FLIP_LEFT_RIGHT), img.rotate(180))}
+    Image.merge(mode, bands[mode]).save(path)
+
+
+def process(path, stream):
+    result = resize_engine.process_image(str(path), "scale", 0.5,
+                                         stream_min_bytes=1 if stream else None)
+    assert result["error"] is None
+    assert bool(result.get("streamed")) == stream
+    with Image.open(path) as img:
+        img.load()
+        return img
+
+
+def test_disk_image_supported():
+    assert resize_engine.disk_image_supported()
+
+
+@pytest.mark.parametrize("disk_images", [True, False])
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+def test_streamed_output_matches_whole_image(tmp_path, monkeypatch, mode, disk_images):
+    monkeypatch.setattr(resize_engine, "_disk_images", disk_images)
+    # 条带很小，200行缩小一半时条带边界对齐原图整行
+    monkeypatch.setattr(resize_engine, "STREAM_BAND_BYTES", 240 * 4 * 30)
+    streamed, whole = tmp_path / "streamed.png", tmp_path / "whole.png"
+    make_image(streamed, mode)
+    make_image(whole, mode)
+    assert ImageChops.difference(process(streamed, True), process(whole, False)).getbbox() is None
+
+
+def test_estimate_without_disk_images_counts_decoded_image(monkeypatch):
+    monkeypatch.setattr(resize_engine, "_disk_images", False)
+    decoded = 40000 * 40000 * 4
+    peak = resize_engine.estimate_peak_memory(40000, 40000, "RGBA", "PNG", "scale", 0.5)
+    assert peak >= 2 * decoded
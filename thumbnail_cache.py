@@ -0,0 +1,164 @@
+"""缩略图持久化缓存
+
+缩略图以PNG格式保存在单个SQLite文件中，以"路径 + 文件大小 + 修改时间 + 缩略图尺寸"为键。
+命中缓存时完全不需要解码原图；总大小超过上限时按最近使用时间淘汰。
+"""
+import io
+import os
+import sqlite3
+import threading
+import time
+
+from PIL import Image
+
+# 缓存文件的默认大小上限
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# 淘汰时一次清理到上限的这个比例以下，避免每次写入都触发淘汰
+EVICT_TARGET_RATIO = 0.9
+
+# 命中时更新最近使用时间，累计这么多次再提交一次
+TOUCH_COMMIT_INTERVAL = 200
+
+# PNG可以直接保存的图像模式，其他模式先转换
+PNG_MODES = ("1", "L", "LA", "P", "RGB", "RGBA")
+
+
+def default_cache_dir():
+    """缓存目录：Windows下为%LOCALAPPDATA%，其他系统为~/.cache"""
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") \
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "图片批量缩放工具")
+
+
+def normalize_path(file_path):
+    """规范化路径，作为缓存键使用"""
+    return os.path.normcase(os.path.abspath(file_path))
+
+
+def create_thumbnail(file_path, thumb_size):
+    """从原图生成缩略图
+
+    在图像解码前调用thumbnail，JPEG会自动使用缩小解码，不需要解码完整尺寸的像素。
+    """
+    img = Image.open(file_path)
+    img.thumbnail(thumb_size)
+    if img.mode not in PNG_MODES:
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    return img
+
+
+class ThumbnailCache:
+    def __init__(self, db_path=None, max_bytes=DEFAULT_MAX_BYTES):
+        if db_path is None:
+            cache_dir = default_cache_dir()
+            os.makedirs(cache_dir, exist_ok=True)
+            db_path = os.path.join(cache_dir, "thumbnails.db")
+
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.pending_touches = 0
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS thumbnails (
+                path TEXT NOT NULL,
+                thumb_width INTEGER NOT NULL,
+                thumb_height INTEGER NOT NULL,
+                file_size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (path, thumb_width, thumb_height)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON thumbnails (last_used)")
+        self.conn.commit()
+
+        self.total_bytes = self.conn.execute(
+            "SELECT COALESCE(SUM(nbytes), 0) FROM thumbnails").fetchone()[0]
+
+    def get(self, file_path, thumb_size, stat=None):
+        """查找缓存的缩略图，文件已被修改或不存在缓存时返回None"""
+        stat = stat or os.stat(file_path)
+        key = (normalize_path(file_path), thumb_size[0], thumb_size[1])
+
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT file_size, mtime_ns, data FROM thumbnails "
+                "WHERE path=? AND thumb_width=? AND thumb_height=?", key).fetchone()
+            if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+                return None
+
+            self.conn.execute(
+                "UPDATE thumbnails SET last_used=? WHERE path=? AND thumb_width=? AND thumb_height=?",
+                (time.time(),) + key)
+            self.pending_touches += 1
+            if self.pending_touches >= TOUCH_COMMIT_INTERVAL:
+                self.conn.commit()
+                self.pending_touches = 0
+
+        img = Image.open(io.BytesIO(row[2]))
+        img.load()
+        return img
+
+    def put(self, file_path, thumb_size, img, stat=None):
+        """写入缩略图，同一文件的旧缓存会被替换"""
+        stat = stat or os.stat(file_path)
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+        data = buffer.getvalue()
+        key = (normalize_path(file_path), thumb_size[0], thumb_size[1])
+
+        with self.lock:
+            old = self.conn.execute(
+                "SELECT nbytes FROM thumbnails WHERE path=? AND thumb_width=? AND thumb_height=?",
+                key).fetchone()
+            if old is not None:
+                self.total_bytes -= old[0]
+
+            self.conn.execute(
+                "INSERT OR REPLACE INTO thumbnails "
+                "(path, thumb_width, thumb_height, file_size, mtime_ns, data, nbytes, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                key + (stat.st_size, stat.st_mtime_ns, data, len(data), time.time()))
+            self.total_bytes += len(data)
+
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+            self.conn.commit()
+            self.pending_touches = 0
+
+    def get_or_create(self, file_path, thumb_size):
+        """优先从缓存读取缩略图，未命中时生成并写入缓存"""
+        stat = os.stat(file_path)
+        img = self.get(file_path, thumb_size, stat)
+        if img is None:
+            img = create_thumbnail(file_path, thumb_size)
+            self.put(file_path, thumb_size, img, stat)
+        return img
+
+    def _evict(self):
+        """按最近使用时间淘汰最旧的缓存，直到总大小低于上限（调用方需持有锁）"""
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        rows = self.conn.execute(
+            "SELECT rowid, nbytes FROM thumbnails ORDER BY last_used").fetchall()
+
+        evicted = []
+        for rowid, nbytes in rows:
+            if self.total_bytes <= target:
+                break
+            evicted.append((rowid,))
+            self.total_bytes -= nbytes
+
+        self.conn.executemany("DELETE FROM thumbnails WHERE rowid=?", evicted)
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
@@ -0,0 +1,295 @@
+"""虚拟化缩略图网格
+
+整个网格只有一个Canvas，只为可见的行创建绘图元素，滚动时循环复用这些元素。
+每个可见单元格只持有一个PhotoImage，不可见的缩略图保存在容量有限的LRU中，
+因此十万张图片的列表也只占用与可见单元格数量成正比的界面资源。
+"""
+import tkinter as tk
+from collections import OrderedDict
+
+from PIL import ImageTk
+
+# 主线程取回后台缩略图的间隔（毫秒）和每次最多应用的数量
+THUMBNAIL_POLL_INTERVAL = 50
+THUMBNAIL_APPLY_BATCH = 64
+
+# 内存中保留的已解码缩略图数量（80x80约25KB一张）
+THUMBNAIL_LRU_SIZE = 1000
+
+# 可见区域上下额外预加载的行数
+PREFETCH_ROWS = 2
+
+
+class ThumbnailGrid(tk.Canvas):
+    def __init__(self, parent, loader, thumb_size=(80, 80), columns=4,
+                 on_select=None, on_remove=None, format_size=str, **kwargs):
+        kwargs.setdefault("bg", "#2D2D30")
+        kwargs.setdefault("bd", 0)
+        kwargs.setdefault("highlightthickness", 0)
+        super().__init__(parent, **kwargs)
+
+        self.loader = loader
+        self.thumb_size = thumb_size
+        self.columns = columns
+        self.on_select = on_select
+        self.on_remove = on_remove
+        self.format_size = format_size
+        self.yscrollcommand = None
+
+        # 单元格尺寸：缩略图 + 文件大小文字 + 边距
+        self.cell_height = thumb_size[1] + 34
+        self.cell_width = thumb_size[0] + 16
+
+        # 数据：文件序列由外部持有，网格只读取
+        self.files = []
+        self.thumbs = OrderedDict()  # 文件路径 -> 缩略图（LRU）
+        self.file_sizes = {}  # 文件路径 -> 文件大小
+        self.requested = set()  # 已提交但尚未返回的请求
+
+        # 视图：滚动偏移量（像素）和可复用的单元格
+        self.top = 0
+        self.cells = []
+        self.hover_index = -1
+
+        self.bind("<Configure>", lambda e: self.refresh())
+        self.bind("<Button-1>", self.on_click)
+        self.bind("<Button-3>", self.on_right_click)
+        self.bind("<Motion>", self.on_motion)
+        self.bind("<Leave>", lambda e: self.set_hover(-1))
+        # Windows和Linux系统的滚轮事件不同
+        self.bind("<MouseWheel>", self.on_mousewheel)
+        self.bind("<Button-4>", self.on_mousewheel)
+        self.bind("<Button-5>", self.on_mousewheel)
+
+        self.after(THUMBNAIL_POLL_INTERVAL, self.poll_thumbnail_results)
+
+    # ---- 数据 ----
+
+    def set_files(self, files):
+        """设置要显示的文件序列（只保存引用），并刷新"""
+        self.files = files
+        self.refresh()
+
+    def clear(self):
+        """清空所有缩略图，丢弃尚未完成的请求"""
+        self.loader.clear()
+        self.thumbs.clear()
+        self.file_sizes.clear()
+        self.requested.clear()
+        self.top = 0
+        self.refresh()
+
+    # ---- 布局 ----
+
+    def content_height(self):
+        rows = (len(self.files) + self.columns - 1) // self.columns
+        return rows * self.cell_height
+
+    def refresh(self):
+        """重新计算可见区域，把单元格分配给可见的文件"""
+        view_width = max(self.winfo_width(), 1)
+        view_height = max(self.winfo_height(), 1)
+        self.cell_width = view_width / self.columns
+
+        # 限制滚动范围
+        max_top = max(0, self.content_height() - view_height)
+        self.top = min(max(0, self.top), max_top)
+
+        first_row = int(self.top // self.cell_height)
+        last_row = int((self.top + view_height) // self.cell_height)
+        first_index = first_row * self.columns
+        last_index = min(len(self.files), (last_row + 1) * self.columns)
+
+        # 按需增加单元格，多余的隐藏
+        visible_count = max(0, last_index - first_index)
+        while len(self.cells) < visible_count:
+            self.cells.append(self.create_cell())
+
+        for slot, cell in enumerate(self.cells):
+            index = first_index + slot
+            if index < last_index:
+                self.assign_cell(cell, index)
+            elif cell["index"] is not None:
+                cell["index"] = None
+                cell["photo"] = None
+                self.itemconfigure(cell["tag"], state=tk.HIDDEN)
+
+        self.request_thumbnails(first_row - PREFETCH_ROWS, last_row + PREFETCH_ROWS)
+
+        if self.yscrollcommand:
+            total = self.content_height()
+            if total <= view_height:
+                self.yscrollcommand(0.0, 1.0)
+            else:
+                self.yscrollcommand(self.top / total, (self.top + view_height) / total)
+
+    def create_cell(self):
+        """创建一个可复用单元格的绘图元素"""
+        tag = f"cell{len(self.cells)}"
+        cell = {
+            "tag": tag,
+            "index": None,
+            "path": None,
+            "photo": None,
+            "border": self.create_rectangle(0, 0, 0, 0, outline="#444444", width=1, tags=tag),
+            "placeholder": self.create_rectangle(0, 0, 0, 0, fill="#3c3c3c", outline="", tags=tag),
+            "image": self.create_image(0, 0, anchor=tk.CENTER, tags=tag),
+            "text": self.create_text(0, 0, text="", fill="#cccccc",
+                                     font=("Microsoft YaHei", 8), tags=tag),
+        }
+        return cell
+
+    def cell_box(self, index):
+        row, col = divmod(index, self.columns)
+        x1 = col * self.cell_width + 3
+        y1 = row * self.cell_height - self.top + 3
+        return x1, y1, x1 + self.cell_width - 6, y1 + self.cell_height - 6
+
+    def assign_cell(self, cell, index):
+        """把单元格移动到指定位置，并显示对应文件的缩略图"""
+        path = self.files[index]
+        x1, y1, x2, y2 = self.cell_box(index)
+        center_x = (x1 + x2) / 2
+        image_y = y1 + 4 + self.thumb_size[1] / 2
+
+        self.coords(cell["border"], x1, y1, x2, y2)
+        self.itemconfigure(cell["border"],
+                           outline="#3498db" if index == self.hover_index else "#444444",
+                           width=2 if index == self.hover_index else 1)
+        self.coords(cell["image"], center_x, image_y)
+        self.coords(cell["text"], center_x, y2 - 10)
+
+        if cell["path"] != path or cell["index"] is None:
+            cell["path"] = path
+            self.show_thumbnail(cell)
+        cell["index"] = index
+
+        self.itemconfigure(cell["tag"], state=tk.NORMAL)
+
+    def show_thumbnail(self, cell):
+        """显示缩略图，尚未生成时显示占位方块"""
+        path = cell["path"]
+        thumb_img = self.thumbs.get(path)
+        x, y = self.coords(cell["image"])
+
+        if thumb_img is None:
+            cell["photo"] = None
+            self.itemconfigure(cell["image"], image="")
+            half_w, half_h = self.thumb_size[0] / 2, self.thumb_size[1] / 2
+            self.coords(cell["placeholder"], x - half_w, y - half_h, x + half_w, y + half_h)
+            self.itemconfigure(cell["placeholder"], state=tk.NORMAL)
+        else:
+            self.thumbs.move_to_end(path)
+            # 将PIL图像转换为Tkinter可用的格式，并保存引用防止垃圾回收
+            cell["photo"] = ImageTk.PhotoImage(thumb_img)
+            self.itemconfigure(cell["image"], image=cell["photo"])
+            self.coords(cell["placeholder"], 0, 0, 0, 0)
+
+        file_size = self.file_sizes.get(path)
+        self.itemconfigure(cell["text"], text=self.format_size(file_size) if file_size is not None else "")
+
+    def request_thumbnails(self, first_row, last_row):
+        """请求可见区域（及预加载区域）中尚未生成的缩略图，丢弃已滚出视野的请求"""
+        first_index = max(0, first_row) * self.columns
+        last_index = min(len(self.files), (last_row + 1) * self.columns)
+
+        # 撤回还在排队的旧请求，剩下的就是正在解码中的
+        self.requested.difference_update(self.loader.cancel_pending())
+
+        for i in range(first_index, last_index):
+            path = self.files[i]
+            if path not in self.thumbs and path not in self.requested:
+                self.requested.add(path)
+                self.loader.submit(path)
+
+    def poll_thumbnail_results(self):
+        """定期取回后台生成的缩略图，更新可见的单元格"""
+        try:
+            results = self.loader.drain(THUMBNAIL_APPLY_BATCH)
+            if results:
+                visible = {cell["path"]: cell for cell in self.cells if cell["index"] is not None}
+                for file_path, thumb_img, file_size, error in results:
+                    self.requested.discard(file_path)
+                    if thumb_img is None:
+                        print(f"创建缩略图出错: {file_path}, 错误: {error}")
+                        continue
+
+                    self.thumbs[file_path] = thumb_img
+                    self.thumbs.move_to_end(file_path)
+                    self.file_sizes[file_path] = file_size
+                    if len(self.thumbs) > THUMBNAIL_LRU_SIZE:
+                        self.thumbs.popitem(last=False)
+
+                    if file_path in visible:
+                        self.show_thumbnail(visible[file_path])
+        except Exception as e:
+            print(f"更新缩略图时出错: {e}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            self.after(THUMBNAIL_POLL_INTERVAL, self.poll_thumbnail_results)
+
+    # ---- 滚动 ----
+
+    def yview(self, *args):
+        """供滚动条调用，参数格式与Tk的yview相同"""
+        if not args:
+            total = max(self.content_height(), 1)
+            return self.top / total, (self.top + self.winfo_height()) / total
+
+        if args[0] == "moveto":
+            self.top = float(args[1]) * self.content_height()
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                self.top += amount * max(self.winfo_height() - self.cell_height, self.cell_height)
+            else:
+                self.top += amount * self.cell_height / 2
+        self.refresh()
+
+    def on_mousewheel(self, event):
+        if hasattr(event, 'num') and event.num == 4 or hasattr(event, 'delta') and event.delta > 0:  # 向上滚动
+            self.yview("scroll", -1, "units")
+        elif hasattr(event, 'num') and event.num == 5 or hasattr(event, 'delta') and event.delta < 0:  # 向下滚动
+            self.yview("scroll", 1, "units")
+
+    # ---- 鼠标交互 ----
+
+    def index_at(self, x, y):
+        """返回窗口坐标处的文件序号，没有时返回-1"""
+        col = int(x // self.cell_width)
+        row = int((y + self.top) // self.cell_height)
+        if col < 0 or col >= self.columns or row < 0:
+            return -1
+        index = row * self.columns + col
+        return index if index < len(self.files) else -1
+
+    def set_hover(self, index):
+        """更新悬停高亮"""
+        if index == self.hover_index:
+            return
+        self.hover_index = index
+        for cell in self.cells:
+            if cell["index"] is not None:
+                hovered = cell["index"] == index
+                self.itemconfigure(cell["border"], outline="#3498db" if hovered else "#444444",
+                                   width=2 if hovered else 1)
+
+    def on_motion(self, event):
+        self.set_hover(self.index_at(event.x, event.y))
+
+    def on_click(self, event):
+        index = self.index_at(event.x, event.y)
+        if index >= 0 and self.on_select:
+            self.on_select(self.files[index])
+
+    def on_right_click(self, event):
+        """右键菜单删除功能"""
+        index = self.index_at(event.x, event.y)
+        if index < 0 or not self.on_remove:
+            return
+        file_path = self.files[index]
+        context_menu = tk.Menu(self, tearoff=0, bg="#2D2D30", fg="white",
+                               activebackground="#3498db", activeforeground="white")
+        context_menu.add_command(label="删除", command=lambda: self.on_remove(file_path))
+        context_menu.tk_popup(event.x_root, event.y_root)
@@ -0,0 +1,81 @@
+"""后台缩略图解码流水线
+
+工作线程负责读取缓存或解码原图生成缩略图，结果放入队列；
+主线程定期调用drain()批量取回已经准备好的缩略图，只负责创建PhotoImage和更新界面。
+"""
+import os
+import queue
+import threading
+
+from thumbnail_cache import create_thumbnail
+
+
+def default_thread_count():
+    """解码线程数：Pillow解码时会释放GIL，线程数与CPU核心数相当即可"""
+    return max(2, min(8, os.cpu_count() or 1))
+
+
+class ThumbnailLoader:
+    def __init__(self, thumb_size, cache=None, threads=None):
+        self.thumb_size = thumb_size
+        self.cache = cache
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        # 清空列表时递增，丢弃旧批次的请求和结果
+        self.generation = 0
+
+        for _ in range(threads or default_thread_count()):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def submit(self, file_path):
+        """提交一个缩略图请求"""
+        self.requests.put((self.generation, file_path))
+
+    def cancel_pending(self):
+        """撤回所有还在排队的请求，返回被撤回的文件路径"""
+        cancelled = []
+        try:
+            while True:
+                generation, file_path = self.requests.get_nowait()
+                cancelled.append(file_path)
+        except queue.Empty:
+            pass
+        return cancelled
+
+    def clear(self):
+        """丢弃所有尚未完成的请求和结果"""
+        self.generation += 1
+        self.cancel_pending()
+
+    def drain(self, max_items):
+        """取回最多max_items个已完成的结果：(文件路径, 缩略图或None, 文件大小, 错误信息)"""
+        items = []
+        while len(items) < max_items:
+            try:
+                generation, item = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation == self.generation:
+                items.append(item)
+        return items
+
+    def _load(self, file_path):
+        if self.cache is not None:
+            try:
+                return self.cache.get_or_create(file_path, self.thumb_size)
+            except Exception as e:
+                print(f"读取缩略图缓存时出错: {e}")
+        return create_thumbnail(file_path, self.thumb_size)
+
+    def _worker(self):
+        while True:
+            generation, file_path = self.requests.get()
+            if generation != self.generation:
+                continue
+
+            try:
+                file_size = os.path.getsize(file_path)
+                thumb_img = self._load(file_path)
+                self.results.put((generation, (file_path, thumb_img, file_size, None)))
+            except Exception as e:
+                self.results.put((generation, (file_path, None, 0, f"{e}")))
@@ -1,13 +1,32 @@
+import io
 import os
 import sys
+import queue
 import threading
 import shutil
+import multiprocessing
 from math import cos, sin
 from tkinter import filedialog, messagebox
 import tkinter as tk
 import tkinter.font as tkfont
 from tkinter import ttk
-from PIL import Image, ImageTk
+from PIL import Image
+
+import resize_engine
+from thumbnail_cache import ThumbnailCache, default_cache_dir
+from stage_timing import TraceRecorder, default_trace_path
+from progress_tracker import ProgressTracker, PROGRESS_POLL_MS, format_duration
+from batch_journal import BatchJournal, load_journal, batch_settings, JOURNAL_NAME
+from thumbnail_loader import ThumbnailLoader
+from thumbnail_grid import ThumbnailGrid
+from preview_cache import PreviewCache, PREFETCH_DISTANCE
+from image_metadata import ImageMetadataStore
+from file_registry import FileRegistry
+from folder_scanner import FolderScanner
+from process_manifest import ProcessManifest
+import batch_planner
+from size_estimator import SizeEstimator
+import size_estimator
 
 # 检查TkinterDnD是否可用
 TKDND_AVAILABLE = True
@@ -39,12 +58,39 @@ class ImageResizerApp:
             traceback.print_exc()
         
         # 初始化状态变量
-        self.selected_files = []
+        self.selected_files = FileRegistry()  # 有序、按规范化路径索引的文件列表
         self.current_preview_index = -1
         self.current_preview_file = None
         self.processed_images = []
         self.output_dir = None
         
+        # 正在进行的批处理（BatchControl），以及记录已完成文件的检查点日志
+        self.batch_control = None
+        self.journal_path = os.path.join(default_cache_dir(), JOURNAL_NAME)
+        
+        # 缩略图持久化缓存，打开失败时退回到每次重新生成
+        try:
+            self.thumbnail_cache = ThumbnailCache()
+        except Exception as e:
+            print(f"打开缩略图缓存时出错: {e}")
+            self.thumbnail_cache = None
+        
+        # 后台缩略图解码，主线程定期批量取回结果
+        self.thumb_size = (80, 80)  # 稍微调大缩略图尺寸
+        self.thumbnail_loader = ThumbnailLoader(self.thumb_size, self.thumbnail_cache)
+        
+        # 预览分辨率图像的内存缓存，后台预加载相邻图片
+        self.preview_cache = PreviewCache()
+        self.preview_resize_job = None
+        self.last_window_size = None
+        
+        # 图片元数据（尺寸、格式、文件大小），添加文件时在后台读取文件头
+        self.image_metadata = ImageMetadataStore(self.selected_files)
+        
+        # 预计输出大小：后台线程按实际保存参数在内存中编码
+        self.size_estimator = SizeEstimator()
+        self.root.after(100, self.poll_size_estimates)
+        
         # 创建主界面
         try:
             print("创建主界面...")
@@ -68,6 +114,11 @@ class ImageResizerApp:
             
         # 窗口大小变化时更新预览图
         self.root.bind("<Configure>", self.on_window_resize)
+        # 关闭窗口时保存缓存
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # 上次的批处理被取消或中断时，提示继续处理
+        self.root.after(500, self.offer_resume)
         print("应用初始化完成")
         
     def create_custom_style(self):
@@ -411,6 +462,7 @@ class ImageResizerApp:
         
         # 添加一系列预设的目标尺寸按钮
         preset_sizes = ["4096x4096", "2048x2048", "1024x1024", "512x512", "256x256", "128x128", "64x64", "32x32"]
+        self.preset_sizes = preset_sizes
         self.target_size_var = tk.StringVar(value="")
         
         size_label = tk.Label(self.target_size_frame, text="目标尺寸:", 
@@ -442,6 +494,15 @@ class ImageResizerApp:
                                          bg="#2A2A2A", fg="#ffffff")
         self.selected_size_label.pack(side=tk.LEFT, padx=10)
         
+        # 多尺寸导出：一次解码生成多个尺寸
+        pyramid_btn = self.RoundedButton(self.target_size_frame, text="多尺寸导出",
+                                       command=self.show_pyramid_dialog,
+                                       bg="#9b59b6", fg="#ffffff",
+                                       activebackground="#8e44ad",
+                                       width=100, height=30,
+                                       radius=8, font=("Microsoft YaHei", 9))
+        pyramid_btn.pack(side=tk.LEFT, padx=5)
+        
         # 图片显示区域 - 左右分栏
         content_frame = tk.Frame(middle_frame, bg="#2A2A2A")
         content_frame.pack(fill=tk.BOTH, expand=True, pady=(5, 0))  # 顶部留少量间距，底部无间距
@@ -464,93 +525,23 @@ class ImageResizerApp:
         thumb_container = tk.Frame(left_frame, bg="#2D2D30", bd=0, padx=5, pady=5)  # 减小padding
         thumb_container.pack(fill=tk.BOTH, expand=True)
         
-        # 创建滚动条和Canvas
-        thumb_canvas = tk.Canvas(thumb_container, bg="#2D2D30", bd=0, 
-                               highlightthickness=0, height=370)  # 减小高度
+        # 虚拟化缩略图网格：只为可见的行创建绘图元素
+        self.thumbnail_grid = ThumbnailGrid(thumb_container, self.thumbnail_loader,
+                                            thumb_size=self.thumb_size, columns=4,
+                                            on_select=self.set_preview_file,
+                                            on_remove=self.remove_file,
+                                            format_size=self.format_size,
+                                            height=370)  # 减小高度
         
         # 自定义滚动条样式
         scrollbar = ttk.Scrollbar(thumb_container, orient=tk.VERTICAL, 
-                                command=thumb_canvas.yview)
+                                command=self.thumbnail_grid.yview)
         
-        # 配置Canvas
-        thumb_canvas.configure(yscrollcommand=scrollbar.set)
-        thumb_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        # 配置网格
+        self.thumbnail_grid.yscrollcommand = scrollbar.set
+        self.thumbnail_grid.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        # 创建缩略图容器框架 - 使用Frame
-        self.thumbnail_frame = tk.Frame(thumb_canvas, bg="#2D2D30")
-        # 网格布局的容器要设置好宽度
-        self.thumbnail_frame.columnconfigure(0, weight=1)
-        self.thumbnail_frame.columnconfigure(1, weight=1)
-        self.thumbnail_frame.columnconfigure(2, weight=1)
-        self.thumbnail_frame.columnconfigure(3, weight=1)
-        
-        thumb_canvas.create_window((0, 0), window=self.thumbnail_frame, 
-                                 anchor=tk.NW, tags="thumbnail_frame", width=thumb_canvas.winfo_reqwidth())
-        
-        # 保存Canvas引用和行信息
-        self.thumbnail_frame._parent_canvas = thumb_canvas
-        self.thumbnail_row = 0
-        self.thumbnail_col = 0
-        self.max_cols = 4  # 每行最多4个缩略图
-        
-        # 配置Canvas滚动区域
-        def configure_thumb_frame(event):
-            # 更新滚动区域
-            thumb_canvas.configure(scrollregion=thumb_canvas.bbox("all"))
-            # 设置画布宽度等于缩略图框架宽度，确保填满可用空间
-            canvas_width = event.width
-            thumb_canvas.itemconfig("thumbnail_frame", width=canvas_width)
-        
-        self.thumbnail_frame.bind("<Configure>", configure_thumb_frame)
-        thumb_canvas.bind("<Configure>", lambda e: configure_thumb_frame(e))
-        
-        # 添加鼠标滚轮事件处理
-        def on_mousewheel(event):
-            # Windows和Linux系统的滚轮事件不同
-            if hasattr(event, 'num') and event.num == 4 or hasattr(event, 'delta') and event.delta > 0:  # 向上滚动
-                thumb_canvas.yview_scroll(-1, "units")
-            elif hasattr(event, 'num') and event.num == 5 or hasattr(event, 'delta') and event.delta < 0:  # 向下滚动
-                thumb_canvas.yview_scroll(1, "units")
-        
-        # 触摸板滚动事件处理 (Windows)
-        def on_touchpad_scroll(event):
-            # event.delta用于Windows触摸板的垂直滚动手势
-            if hasattr(event, 'delta'):
-                # 计算滚动单位，delta可能是大量像素，需要缩放
-                units = abs(event.delta) // 20  # 每20个像素滚动一个单位
-                if units < 1:
-                    units = 1
-                if event.delta > 0:
-                    thumb_canvas.yview_scroll(-int(units), "units")
-                else:
-                    thumb_canvas.yview_scroll(int(units), "units")
-                
-        # 绑定滚轮事件到Canvas和缩略图框架
-        # Windows系统
-        thumb_canvas.bind("<MouseWheel>", on_mousewheel)
-        # 触摸板事件 (Windows)
-        thumb_canvas.bind("<Motion>", lambda e: None)  # 激活触摸板跟踪
-        thumb_canvas.bind("<B1-Motion>", on_touchpad_scroll)  # 触摸板单指滑动
-        thumb_canvas.bind("<B2-Motion>", on_touchpad_scroll)  # 触摸板双指滑动
-        # Linux系统
-        thumb_canvas.bind("<Button-4>", on_mousewheel)
-        thumb_canvas.bind("<Button-5>", on_mousewheel)
-        
-        # 确保缩略图内部的所有元素也能响应滚轮事件
-        def bind_mousewheel_to_children(widget):
-            widget.bind("<MouseWheel>", on_mousewheel)
-            widget.bind("<Button-4>", on_mousewheel)
-            widget.bind("<Button-5>", on_mousewheel)
-            # 添加触摸板事件支持
-            widget.bind("<Motion>", lambda e: None)  # 激活触摸板跟踪
-            widget.bind("<B1-Motion>", on_touchpad_scroll)
-            widget.bind("<B2-Motion>", on_touchpad_scroll)
-            for child in widget.winfo_children():
-                bind_mousewheel_to_children(child)
-                
-        # 初始调用以绑定现有元素
-        bind_mousewheel_to_children(self.thumbnail_frame)
+        self.thumbnail_grid.set_files(self.selected_files)
         
         # 添加清空按钮到左侧框架底部
         clear_frame = tk.Frame(left_frame, bg="#2A2A2A", pady=5)
@@ -589,8 +580,9 @@ class ImageResizerApp:
         self.preview_viewport.pack(fill=tk.BOTH, expand=True, pady=3)  # 减小padding
         self.preview_viewport.pack_propagate(False)  # 防止子组件改变高度
         
-        # 空白占位图像
-        self.preview_view = tk.Label(self.preview_viewport, bg="#1E1E1E")
+        # 预览图像，始终使用同一个PhotoImage，切换或缩放时原地更新像素
+        self.preview_photo = tk.PhotoImage(width=1, height=1)
+        self.preview_view = tk.Label(self.preview_viewport, bg="#1E1E1E", image=self.preview_photo)
         self.preview_view.pack(expand=True, fill=tk.BOTH)
         
         # 预览信息区域 - 增加高度以容纳更多信息
@@ -657,6 +649,67 @@ class ImageResizerApp:
                                      radius=20)  # 更大的圆角
         start_btn.pack(side=tk.TOP, padx=5, pady=0)  # 进一步减少外边距
         
+        # 并行进程数设置
+        workers_frame = tk.Frame(bottom_frame, bg="#2A2A2A")
+        workers_frame.pack(side=tk.TOP, pady=(5, 0))
+        
+        tk.Label(workers_frame, text="并行进程数:", 
+               font=("Microsoft YaHei", 10), 
+               bg="#2A2A2A", fg="#ffffff").pack(side=tk.LEFT, padx=5)
+        
+        self.workers_var = tk.IntVar(value=resize_engine.default_worker_count())
+        workers_spinbox = ttk.Spinbox(workers_frame, from_=1, to=max(64, resize_engine.default_worker_count()),
+                                    textvariable=self.workers_var, width=5)
+        workers_spinbox.pack(side=tk.LEFT)
+        
+        # 缩放质量：精确或快速（大倍数缩小时先做整数倍缩小）
+        tk.Label(workers_frame, text="缩放质量:", 
+               font=("Microsoft YaHei", 10), 
+               bg="#2A2A2A", fg="#ffffff").pack(side=tk.LEFT, padx=(15, 5))
+        
+        self.quality_var = tk.StringVar(value="exact")
+        for text, value in [("精确", "exact"), ("快速", "fast")]:
+            tk.Radiobutton(workers_frame, text=text, value=value, variable=self.quality_var,
+                         font=("Microsoft YaHei", 10),
+                         bg="#2A2A2A", fg="#ffffff", selectcolor="#3c3c3c",
+                         activebackground="#2A2A2A", activeforeground="#ffffff").pack(side=tk.LEFT)
+        
+        # 跳过已用相同参数处理过的图片，避免重复缩小
+        self.skip_processed_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(workers_frame, text="跳过已处理的图片", variable=self.skip_processed_var,
+                     font=("Microsoft YaHei", 10),
+                     bg="#2A2A2A", fg="#ffffff", selectcolor="#3c3c3c",
+                     activebackground="#2A2A2A", activeforeground="#ffffff").pack(side=tk.LEFT, padx=(15, 0))
+        
+        # 记录各阶段耗时，处理完成后保存跟踪文件，用于查找慢的文件和阶段
+        self.stage_timing_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(workers_frame, text="记录各阶段耗时", variable=self.stage_timing_var,
+                     font=("Microsoft YaHei", 10),
+                     bg="#2A2A2A", fg="#ffffff", selectcolor="#3c3c3c",
+                     activebackground="#2A2A2A", activeforeground="#ffffff").pack(side=tk.LEFT, padx=(15, 0))
+        
+        # 文件大小上限：超出时自动降低编码质量，必要时缩小尺寸
+        budget_frame = tk.Frame(bottom_frame, bg="#2A2A2A")
+        budget_frame.pack(side=tk.TOP, pady=(5, 0))
+        
+        tk.Label(budget_frame, text="单个文件上限(KB，0为不限):", 
+               font=("Microsoft YaHei", 10), 
+               bg="#2A2A2A", fg="#ffffff").pack(side=tk.LEFT, padx=5)
+        
+        self.max_kb_var = tk.IntVar(value=0)
+        max_kb_spinbox = ttk.Spinbox(budget_frame, from_=0, to=1024 * 1024, increment=50,
+                                   textvariable=self.max_kb_var, width=8)
+        max_kb_spinbox.pack(side=tk.LEFT)
+        
+        # 试运行：只读取文件头，查看处理计划
+        dry_run_btn = self.RoundedButton(budget_frame, text="试运行",
+                                       command=self.start_dry_run,
+                                       bg="#555555", fg="#ffffff",
+                                       activebackground="#444444",
+                                       width=70, height=26,
+                                       radius=8, font=("Microsoft YaHei", 9))
+        dry_run_btn.pack(side=tk.LEFT, padx=(15, 0))
+        
     def setup_drag_drop(self):
         if not TKDND_AVAILABLE:
             return
@@ -820,19 +873,12 @@ class ImageResizerApp:
                 
             valid_files.append(file)
         
-        # 添加到列表
+        # 添加到列表（同一批中重复的文件也只添加一次）
+        valid_files = self.selected_files.extend(valid_files)
         if valid_files:
-            self.selected_files.extend(valid_files)
-            # 更新界面
-            for file in valid_files:
-                try:
-                    # 添加缩略图到左侧区域
-                    self.add_thumbnail(file)
-                    print(f"添加缩略图: {file}")
-                except Exception as e:
-                    print(f"添加缩略图时出错: {file}, 错误: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
+            self.image_metadata.prefill(valid_files)
+            # 更新缩略图区域，缩略图由后台线程生成
+            self.thumbnail_grid.refresh()
             
             # 默认选中第一个文件进行预览
             if len(self.selected_files) == len(valid_files):  # 如果之前没有文件
@@ -846,151 +892,6 @@ class ImageResizerApp:
             
             # 无需更新转换按钮状态，因为还未定义
     
-    def add_thumbnail(self, file_path):
-        """添加文件缩略图到左侧缩略图区域 - 简化版只显示图片，使用网格布局"""
-        try:
-            # 创建缩略图容器 - 使用更简洁的设计
-            thumb_container = tk.Frame(self.thumbnail_frame, bg="#2D2D30", padx=2, pady=2)
-            
-            # 放置到当前行列位置
-            thumb_container.grid(row=self.thumbnail_row, column=self.thumbnail_col, 
-                               padx=3, pady=3, sticky="nsew")
-            
-            # 更新列计数，每行达到最大列数后换行
-            self.thumbnail_col += 1
-            if self.thumbnail_col >= self.max_cols:
-                self.thumbnail_col = 0
-                self.thumbnail_row += 1
-            
-            # 加载图像并创建缩略图
-            original_img = Image.open(file_path)
-            thumb_size = (80, 80)  # 稍微调大缩略图尺寸
-            thumb_img = original_img.copy()
-            thumb_img.thumbnail(thumb_size)
-            
-            # 将PIL图像转换为Tkinter可用的格式
-            tk_img = ImageTk.PhotoImage(thumb_img)
-            
-            # 保存图像引用，防止垃圾回收
-            thumb_container.tk_img = tk_img
-            
-            # 创建图像标签
-            img_label = tk.Label(thumb_container, image=tk_img, bg="#2D2D30", bd=0)
-            img_label.pack(padx=2, pady=(2, 1))
-            
-            # 获取并显示文件信息（文件大小）
-            try:
-                # 获取文件大小
-                file_size = os.path.getsize(file_path)
-                size_str = self.format_size(file_size)
-                
-                # 创建一个专门的框架用于显示文件大小，确保有足够的宽度
-                size_frame = tk.Frame(thumb_container, bg="#2D2D30")
-                size_frame.pack(fill=tk.X, expand=True, pady=(0, 2))
-                
-                # 使用带有固定宽度的标签显示文件大小
-                size_label = tk.Label(size_frame, text=size_str, bg="#2D2D30", fg="#cccccc", 
-                                     font=("Microsoft YaHei", 8), width=10)
-                size_label.pack(fill=tk.X)
-            except Exception as e:
-                print(f"获取文件大小失败: {e}")
-            
-            # 为缩略图添加边框和悬停效果
-            thumb_container.config(highlightbackground="#444444", highlightthickness=1)
-            
-            # 绑定点击事件 - 选择图像预览
-            img_label.bind("<Button-1>", lambda e, path=file_path: self.set_preview_file(path))
-            thumb_container.bind("<Button-1>", lambda e, path=file_path: self.set_preview_file(path))
-            
-            # 悬停效果
-            def on_enter(e):
-                thumb_container.config(highlightbackground="#3498db", highlightthickness=2)
-                
-            def on_leave(e):
-                thumb_container.config(highlightbackground="#444444", highlightthickness=1)
-                
-            thumb_container.bind("<Enter>", on_enter)
-            thumb_container.bind("<Leave>", on_leave)
-            img_label.bind("<Enter>", on_enter)
-            img_label.bind("<Leave>", on_leave)
-            
-            # 右键菜单删除功能
-            def show_context_menu(event):
-                context_menu = tk.Menu(self.root, tearoff=0, bg="#2D2D30", fg="white", 
-                                     activebackground="#3498db", activeforeground="white")
-                context_menu.add_command(label="删除", 
-                                       command=lambda: self.remove_file(file_path, thumb_container))
-                context_menu.tk_popup(event.x_root, event.y_root)
-                
-            thumb_container.bind("<Button-3>", show_context_menu)
-            img_label.bind("<Button-3>", show_context_menu)
-            
-            # 为新添加的缩略图绑定鼠标滚轮事件
-            def on_thumb_mousewheel(event):
-                # 将滚轮事件传递给画布
-                if hasattr(self.thumbnail_frame, '_parent_canvas'):
-                    canvas = self.thumbnail_frame._parent_canvas
-                    if hasattr(event, 'num') and event.num == 4 or hasattr(event, 'delta') and event.delta > 0:  # 向上滚动
-                        canvas.yview_scroll(-1, "units")
-                    elif hasattr(event, 'num') and event.num == 5 or hasattr(event, 'delta') and event.delta < 0:  # 向下滚动
-                        canvas.yview_scroll(1, "units")
-            
-            # 触摸板滚动事件处理 (Windows)
-            def on_thumb_touchpad_scroll(event):
-                if hasattr(self.thumbnail_frame, '_parent_canvas'):
-                    canvas = self.thumbnail_frame._parent_canvas
-                    # event.delta用于Windows触摸板的垂直滚动手势
-                    if hasattr(event, 'delta'):
-                        # 计算滚动单位，delta可能是大量像素，需要缩放
-                        units = abs(event.delta) // 20  # 每20个像素滚动一个单位
-                        if units < 1:
-                            units = 1
-                        if event.delta > 0:
-                            canvas.yview_scroll(-int(units), "units")
-                        else:
-                            canvas.yview_scroll(int(units), "units")
-            
-            # 绑定滚轮事件到缩略图容器及其子元素
-            thumb_container.bind("<MouseWheel>", on_thumb_mousewheel)
-            thumb_container.bind("<Button-4>", on_thumb_mousewheel)
-            thumb_container.bind("<Button-5>", on_thumb_mousewheel)
-            # 触摸板事件
-            thumb_container.bind("<Motion>", lambda e: None)  # 激活触摸板跟踪
-            thumb_container.bind("<B1-Motion>", on_thumb_touchpad_scroll)
-            thumb_container.bind("<B2-Motion>", on_thumb_touchpad_scroll)
-            
-            # 为标签和子元素也绑定相同的事件
-            img_label.bind("<MouseWheel>", on_thumb_mousewheel)
-            img_label.bind("<Button-4>", on_thumb_mousewheel)
-            img_label.bind("<Button-5>", on_thumb_mousewheel)
-            img_label.bind("<B1-Motion>", on_thumb_touchpad_scroll)
-            img_label.bind("<B2-Motion>", on_thumb_touchpad_scroll)
-            
-            if 'size_label' in locals():
-                size_label.bind("<MouseWheel>", on_thumb_mousewheel)
-                size_label.bind("<Button-4>", on_thumb_mousewheel)
-                size_label.bind("<Button-5>", on_thumb_mousewheel)
-                size_label.bind("<B1-Motion>", on_thumb_touchpad_scroll)
-                size_label.bind("<B2-Motion>", on_thumb_touchpad_scroll)
-            
-            # 更新缩略图区域滚动区域
-            self.update_thumbnail_scroll_region()
-            
-            return thumb_container
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            print(f"创建缩略图出错: {str(e)}")
-            if 'thumb_container' in locals() and thumb_container:
-                thumb_container.destroy()
-            return None
-            
-    def update_thumbnail_scroll_region(self):
-        """更新缩略图区域的滚动区域"""
-        self.thumbnail_frame.update_idletasks()
-        if hasattr(self.thumbnail_frame, '_parent_canvas'):
-            self.thumbnail_frame._parent_canvas.configure(scrollregion=self.thumbnail_frame._parent_canvas.bbox("all"))
-        
     def format_size(self, size_bytes):
         """格式化文件大小显示"""
         for unit in ['B', 'KB', 'MB', 'GB']:
@@ -999,12 +900,10 @@ class ImageResizerApp:
             size_bytes /= 1024.0
         return f"{size_bytes:.1f} TB"
     
-    def remove_file(self, file_path, container):
-        # 移除文件对应的容器
-        container.destroy()
-        
-        # 从文件列表中移除
+    def remove_file(self, file_path):
+        # 从文件列表中移除，后面的缩略图自动前移
         self.selected_files.remove(file_path)
+        self.thumbnail_grid.refresh()
         
         # 如果移除的是当前预览的文件
         if self.current_preview_file == file_path:
@@ -1013,11 +912,9 @@ class ImageResizerApp:
             else:
                 self.clear_preview()
         # 如果移除的文件在当前预览之前，需要更新预览索引
-        elif self.current_preview_index > self.selected_files.index(file_path):
-            self.current_preview_index -= 1
-            
-        # 考虑重新排列缩略图?
-        # 简单起见，目前只移除当前缩略图，不重新排列
+        elif self.current_preview_file is not None:
+            self.current_preview_index = self.selected_files.index(self.current_preview_file)
+            self.update_preview_controls()
         
     def clear_all_images(self):
         if not self.selected_files:
@@ -1026,18 +923,13 @@ class ImageResizerApp:
         result = messagebox.askyesno("确认", "确定要清除所有图片吗？")
         if result:
             # 清空存储的文件
-            self.selected_files = []
+            self.selected_files.clear()
             
             # 清空预览区域
             self.clear_preview()
             
-            # 清空缩略图区域
-            for widget in self.thumbnail_frame.winfo_children():
-                widget.destroy()
-                
-            # 重置行列计数
-            self.thumbnail_row = 0
-            self.thumbnail_col = 0
+            # 清空缩略图区域，丢弃尚未完成的缩略图请求
+            self.thumbnail_grid.clear()
     
     def set_preview_file(self, file_path):
         if file_path in self.selected_files:
@@ -1045,39 +937,11 @@ class ImageResizerApp:
             self.current_preview_file = file_path
             
             try:
-                # 加载和显示预览图片
-                img = Image.open(file_path)
-                
-                # 获取原始尺寸
-                original_width, original_height = img.size
-                
-                # 调整大小以适应预览区域，保持纵横比
-                preview_width = self.preview_viewport.winfo_width() - 20
-                preview_height = self.preview_viewport.winfo_height() - 20
-                
-                if preview_width <= 1:  # 初始化时可能无法获取正确的尺寸
-                    preview_width = 400
-                    preview_height = 300
+                # 从缓存读取预览分辨率的图像，未命中时才解码
+                img, (original_width, original_height) = self.preview_cache.get_or_load(file_path)
                 
-                # 计算适合预览区域的图像尺寸，保持纵横比
-                img_ratio = original_width / original_height
-                view_ratio = preview_width / preview_height
-                
-                if img_ratio > view_ratio:  # 图片更宽
-                    disp_width = preview_width
-                    disp_height = int(preview_width / img_ratio)
-                else:  # 图片更高
-                    disp_height = preview_height
-                    disp_width = int(preview_height * img_ratio)
-                
-                # 调整大小
-                img_resized = img.copy()
-                img_resized.thumbnail((disp_width, disp_height))
-                
-                # 创建PhotoImage对象并保存引用
-                photo = ImageTk.PhotoImage(img_resized)
-                self.preview_view.configure(image=photo)
-                self.preview_view.image = photo
+                # 缩放到预览区域并显示
+                self.show_preview_image(img)
                 
                 # 更新缩放信息，根据当前的缩放模式
                 if self.current_tab.get() == "scale":
@@ -1088,6 +952,9 @@ class ImageResizerApp:
                 # 更新导航按钮状态
                 self.update_preview_controls()
                 
+                # 后台预加载前后相邻的图片，先加载更近的
+                self.prefetch_neighbor_previews()
+                
                 # 确保界面更新
                 self.root.update_idletasks()
                 
@@ -1096,22 +963,74 @@ class ImageResizerApp:
                 import traceback
                 traceback.print_exc()
     
+    def show_preview_image(self, img):
+        """把预览分辨率的图像缩放到预览区域大小并显示"""
+        # 调整大小以适应预览区域，保持纵横比
+        preview_width = self.preview_viewport.winfo_width() - 20
+        preview_height = self.preview_viewport.winfo_height() - 20
+        
+        if preview_width <= 1:  # 初始化时可能无法获取正确的尺寸
+            preview_width = 400
+            preview_height = 300
+        
+        # 计算适合预览区域的图像尺寸，保持纵横比
+        img_ratio = img.width / img.height
+        view_ratio = preview_width / preview_height
+        
+        if img_ratio > view_ratio:  # 图片更宽
+            disp_width = preview_width
+            disp_height = int(preview_width / img_ratio)
+        else:  # 图片更高
+            disp_height = preview_height
+            disp_width = int(preview_height * img_ratio)
+        
+        # 调整大小
+        img_resized = img.copy()
+        img_resized.thumbnail((disp_width, disp_height))
+        
+        self.update_preview_photo(img_resized)
+        
+    def update_preview_photo(self, img):
+        """原地更新预览PhotoImage的尺寸和像素，不重新创建图像对象"""
+        # 透明部分与预览区域背景色合成
+        if "A" in img.getbands() or (img.mode == "P" and "transparency" in img.info):
+            img = img.convert("RGBA")
+            background = Image.new("RGBA", img.size, "#1E1E1E")
+            background.alpha_composite(img)
+            img = background
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        
+        # 以PPM格式（无压缩）传给Tk
+        buffer = io.BytesIO()
+        img.save(buffer, format="PPM")
+        self.preview_photo.blank()
+        self.preview_photo.configure(width=img.width, height=img.height,
+                                     data=buffer.getvalue(), format="PPM")
+    
+    def prefetch_neighbor_previews(self):
+        """预加载当前预览前后各PREFETCH_DISTANCE张图片"""
+        neighbors = []
+        for distance in range(1, PREFETCH_DISTANCE + 1):
+            for index in (self.current_preview_index + distance, self.current_preview_index - distance):
+                if 0 <= index < len(self.selected_files):
+                    neighbors.append(self.selected_files[index])
+        self.preview_cache.prefetch(neighbors)
+    
     def update_scaled_size_info(self, original_width, original_height):
         """更新缩放系数下的预览信息"""
         # 获取当前文件大小
         try:
-            file_size = os.path.getsize(self.current_preview_file)
+            file_size = self.image_metadata.get(self.current_preview_file)["file_size"]
             size_str = self.format_size(file_size)
             
             # 计算缩放后的文件大小估算值
             scale = self.scale_slider.get()
-            scaled_width = round(original_width * scale)
-            scaled_height = round(original_height * scale)
+            scaled_width, scaled_height = resize_engine.compute_new_size(
+                original_width, original_height, "scale", scale)
             
-            # 估算缩放后的文件大小 (按照面积比例计算)
-            area_ratio = (scaled_width * scaled_height) / (original_width * original_height)
-            estimated_size = file_size * area_ratio
-            estimated_size_str = self.format_size(estimated_size)
+            # 预计大小来自后台编码，尚未完成时显示"计算中"
+            estimated_size_str = self.estimated_size_text("scale", scale)
             
             # 更新信息文本，包含文件大小
             info_text = f"原始尺寸: {original_width} x {original_height} 像素\n原始大小: {size_str}\n缩放后: {scaled_width} x {scaled_height} 像素\n预计大小: {estimated_size_str}"
@@ -1120,15 +1039,49 @@ class ImageResizerApp:
             print(f"获取文件大小失败: {e}")
             # 退回到仅显示尺寸的模式
             scale = self.scale_slider.get()
-            scaled_width = round(original_width * scale)
-            scaled_height = round(original_height * scale)
+            scaled_width, scaled_height = resize_engine.compute_new_size(
+                original_width, original_height, "scale", scale)
             info_text = f"原始尺寸: {original_width} x {original_height} 像素\n缩放后: {scaled_width} x {scaled_height} 像素"
             self.preview_info.configure(text=info_text)
     
+    def estimated_size_text(self, mode, scale=1.0, target_size=""):
+        """当前预览图片的预计输出大小，没有缓存时提交后台估算"""
+        params = (mode, scale, target_size, self.quality_var.get())
+        # 缓存按已读取的文件大小和修改时间区分，拖动滑块时不访问磁盘
+        metadata = self.image_metadata.get(self.current_preview_file)
+        signature = (metadata["file_size"], metadata["mtime_ns"])
+        estimated_size = self.size_estimator.get(self.current_preview_file, signature, params)
+        if estimated_size is None:
+            self.size_estimator.submit(self.current_preview_file, signature, params)
+            return "计算中..."
+        max_bytes = self.get_max_bytes()
+        if max_bytes and estimated_size > max_bytes:
+            return f"{self.format_size(max_bytes)}（超出上限，将降低质量）"
+        return self.format_size(estimated_size)
+    
+    def poll_size_estimates(self):
+        """取回后台估算结果，属于当前预览图片时刷新预览信息"""
+        try:
+            for file_path, params, estimated_size, error in self.size_estimator.drain():
+                if error is not None:
+                    print(f"估算输出大小失败: {file_path}, 错误: {error}")
+                    continue
+                if file_path == self.current_preview_file and params[0] == self.current_tab.get():
+                    if params[0] == "scale":
+                        metadata = self.image_metadata.get(file_path)
+                        self.update_scaled_size_info(metadata["width"], metadata["height"])
+                    else:
+                        self.update_target_size_info()
+        except Exception as e:
+            print(f"更新预计大小时出错: {e}")
+        finally:
+            self.root.after(100, self.poll_size_estimates)
+    
     def clear_preview(self):
         self.current_preview_index = -1
         self.current_preview_file = None
-        self.preview_view.configure(image="")
+        self.preview_photo.blank()
+        self.preview_photo.configure(width=1, height=1)
         self.preview_info.configure(text="")
         self.update_preview_controls()  # 更新导航按钮状态
     
@@ -1162,12 +1115,11 @@ class ImageResizerApp:
         value = float(value)
         self.scale_value_label.configure(text=f"{value:.1f}")
         
-        # 更新当前预览图片的缩放信息
+        # 更新当前预览图片的缩放信息，尺寸从元数据缓存读取，不访问磁盘
         if self.current_preview_file:
             try:
-                img = Image.open(self.current_preview_file)
-                original_width, original_height = img.size
-                self.update_scaled_size_info(original_width, original_height)
+                metadata = self.image_metadata.get(self.current_preview_file)
+                self.update_scaled_size_info(metadata["width"], metadata["height"])
             except Exception as e:
                 print(f"Error updating scale: {e}")
     
@@ -1175,9 +1127,15 @@ class ImageResizerApp:
         # 我们不再需要单独更新计数，因为界面简化了
         pass
     
-    def start_processing_with_dialog(self):
-        """直接替换原始文件，不再弹出选择保存位置的对话框"""
-        if not self.selected_files:
+    def start_processing_with_dialog(self, resume_state=None):
+        """直接替换原始文件，不再弹出选择保存位置的对话框
+
+        resume_state为检查点日志的内容（见batch_journal.load_journal）时，按日志中的参数继续处理剩余的文件。
+        """
+        if self.batch_control is not None:
+            messagebox.showwarning("警告", "已有正在进行的处理")
+            return
+        if resume_state is None and not self.selected_files:
             messagebox.showwarning("警告", "请先选择图片")
             return
         
@@ -1186,16 +1144,31 @@ class ImageResizerApp:
         self.output_dir = os.path.join(script_dir, "temp_output")
         os.makedirs(self.output_dir, exist_ok=True)
         
-        # 根据当前缩放模式获取缩放参数
-        current_mode = self.current_tab.get()
+        # 在主线程中读取缩放参数，工作进程无法访问Tk控件
+        workers = self.get_worker_count()
+        skip_processed = self.skip_processed_var.get()
+        timing = self.stage_timing_var.get()
+        if resume_state is None:
+            settings = batch_settings(self.current_tab.get(), self.scale_slider.get(),
+                                      self.target_size_var.get(), self.quality_var.get(),
+                                      self.get_max_bytes())
+            files = list(self.selected_files)
+        else:
+            settings = resume_state["settings"]
+            files = resume_state["pending"]
+        current_mode = settings["mode"]
+        scale = settings["scale"]
+        target_size = settings["target_size"]
+        quality = settings["quality"]
+        max_bytes = settings["max_bytes"]
         
         # 使用线程处理图片并直接替换原文件
-        total_files = len(self.selected_files)
+        total_files = len(files)
         
         # 创建进度条窗口
         progress_window = tk.Toplevel(self.root)
         progress_window.title("处理中")
-        progress_window.geometry("400x150")
+        progress_window.geometry("400x215")
         progress_window.configure(bg="#2A2A2A")
         progress_window.resizable(False, False)
         
@@ -1210,123 +1183,195 @@ class ImageResizerApp:
         progress_label.pack(pady=10)
         
         progress_bar = ttk.Progressbar(progress_window, orient=tk.HORIZONTAL, 
-                                     length=350, mode='determinate')
+                                     length=350, mode='determinate', maximum=total_files)
         progress_bar.pack(pady=10, padx=20)
         
         status_label = tk.Label(progress_window, text="0/{} 已完成".format(total_files), 
                               bg="#2A2A2A", fg="#ffffff",
                               font=("Microsoft YaHei", 10))
-        status_label.pack(pady=10)
+        status_label.pack(pady=(10, 0))
+        
+        rate_label = tk.Label(progress_window, text="", 
+                            bg="#2A2A2A", fg="#aaaaaa",
+                            font=("Microsoft YaHei", 9))
+        rate_label.pack(pady=5)
+        
+        # 暂停后不再开始新的文件，取消后进行中的文件完成即停止，剩余的文件可以下次继续
+        control = resize_engine.BatchControl()
+        buttons_frame = tk.Frame(progress_window, bg="#2A2A2A")
+        buttons_frame.pack(pady=5)
+        
+        def toggle_pause():
+            if control.paused:
+                control.resume()
+                pause_button.configure(text="暂停")
+            else:
+                control.pause()
+                pause_button.configure(text="继续")
+        
+        def cancel():
+            control.cancel()
+            pause_button.configure(state=tk.DISABLED)
+            cancel_button.configure(state=tk.DISABLED)
+            progress_label.configure(text="正在取消，等待进行中的图片完成...")
+        
+        pause_button = tk.Button(buttons_frame, text="暂停", command=toggle_pause, width=8,
+                               font=("Microsoft YaHei", 9))
+        pause_button.pack(side=tk.LEFT, padx=5)
+        cancel_button = tk.Button(buttons_frame, text="取消", command=cancel, width=8,
+                                font=("Microsoft YaHei", 9))
+        cancel_button.pack(side=tk.LEFT, padx=5)
+        progress_window.protocol("WM_DELETE_WINDOW", cancel)
+        
+        results = queue.Queue()
+        outcome = {"finished": False}  # 处理线程中设置，全部文件都已完成时为True
         
         def process_thread():
-            processed_count = 0
-            copied_count = 0
-            total_original_size = 0
-            total_new_size = 0
+            """只负责处理和放入结果，不访问任何Tk控件"""
+            # 处理记录和检查点日志只在本线程中使用；不跳过已处理的图片时仍然记录处理结果
+            manifest = ProcessManifest()
+            journal = None
+            try:
+                os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+                journal = BatchJournal(self.journal_path)
+                if resume_state is None:
+                    journal.start(files, settings)
+                else:
+                    journal.resume()
+            except OSError as e:
+                print(f"无法写入检查点日志: {e}")
+                journal = None
+            failed = 0
+            try:
+                for result in resize_engine.resize_batch(files, current_mode, scale, target_size,
+                                                         workers, quality, manifest, max_bytes, timing,
+                                                         control=control, journal=journal,
+                                                         skip_processed=skip_processed):
+                    if not result["ok"]:
+                        failed += 1
+                    results.put(result)
+                outcome["finished"] = not control.cancelled
+            except Exception as e:
+                print(f"批量处理出错: {e}")
+                import traceback
+                traceback.print_exc()
+            finally:
+                manifest.close()
+                if journal is not None:
+                    # 全部成功时删除日志；取消、出错或有失败的文件时保留，下次启动时可以继续
+                    if outcome["finished"] and not failed:
+                        journal.finish()
+                    else:
+                        journal.close()
+                results.put(None)  # 结束标记
+        
+        tracker = ProgressTracker(total_files)
+        recorder = TraceRecorder()
+        counts = {
+            "copied": 0,
+            "skipped": 0,  # 此前已处理过
+            "unchanged": 0,  # 尺寸不变，无需处理
+            "pad_only": 0,  # 只填充背景，未重新采样
+            "over_budget": 0,  # 未能压缩到文件大小上限以内
+            "original_size": 0,
+            "new_size": 0,
+        }
+        
+        def poll_results():
+            """主线程定期取回全部结果，汇总后只刷新一次进度窗口"""
+            finished = False
+            batch = []
+            try:
+                while True:
+                    result = results.get_nowait()
+                    if result is None:
+                        finished = True
+                        break
+                    batch.append(result)
+            except queue.Empty:
+                pass
             
-            for file_info in self.selected_files:
-                try:
-                    # 获取原始文件大小
-                    original_size = os.path.getsize(file_info)
-                    total_original_size += original_size
-                    
-                    # 处理图片
-                    img = Image.open(file_info)
-                    original_width, original_height = img.size
-                    
-                    # 根据缩放模式计算新尺寸
-                    if current_mode == "scale":
-                        scale = self.scale_slider.get()
-                        new_width = round(original_width * scale)
-                        new_height = round(original_height * scale)
-                    else:  # target_size
-                        target_size = self.target_size_var.get()
-                        if not target_size:
-                            # 如果未选择目标尺寸，使用原始尺寸
-                            new_width, new_height = original_width, original_height
-                        else:
-                            # 使用指定的目标尺寸
-                            new_width, new_height = map(int, target_size.split('x'))
-                    
-                    # 调整大小并保持纵横比
-                    if current_mode == "target_size" and target_size:
-                        # 计算新的尺寸，保持纵横比
-                        target_width, target_height = map(int, target_size.split('x'))
-                        img_ratio = original_width / original_height
-                        
-                        # 图像适应目标尺寸，保持纵横比
-                        if img_ratio > 1:  # 宽大于高的图片
-                            new_width = target_width
-                            new_height = int(target_width / img_ratio)
-                        else:  # 高大于或等于宽的图片
-                            new_height = target_height
-                            new_width = int(target_height * img_ratio)
-                    
-                    # 调整大小并保存
-                    resized_img = img.resize((new_width, new_height), Image.LANCZOS)
-                    
-                    # 如果是目标尺寸模式且有选择尺寸，需要处理背景填充
-                    if current_mode == "target_size" and target_size:
-                        target_width, target_height = map(int, target_size.split('x'))
-                        
-                        # 创建带背景的图像
-                        background = Image.new('RGBA', (target_width, target_height), (0, 0, 0, 0))
-                        
-                        # 计算位置让图像居中
-                        offset = ((target_width - new_width) // 2, (target_height - new_height) // 2)
-                        background.paste(resized_img, offset)
-                        resized_img = background
-                    
-                    # 直接替换原始文件
-                    output_path = file_info
-                    _, ext = os.path.splitext(file_info)
-                    
-                    # 保存图像，使用合适的格式
-                    if ext.lower() in ['.jpg', '.jpeg']:
-                        # 如果是RGBA模式，转为RGB以便保存为JPG
-                        if resized_img.mode == 'RGBA':
-                            resized_img = resized_img.convert('RGB')
-                        resized_img.save(output_path, quality=95)
+            for result in batch:
+                recorder.add(result)
+                if result["skipped"]:
+                    if result["skipped"] == "unchanged":
+                        counts["unchanged"] += 1
                     else:
-                        resized_img.save(output_path)
-                    
-                    # 获取新文件大小
-                    new_size = os.path.getsize(output_path)
-                    total_new_size += new_size
-                    
-                    copied_count += 1
-                    
-                    # 更新进度信息
-                    orig_size_str = self.format_size(original_size)
-                    new_size_str = self.format_size(new_size)
-                    size_change_pct = ((new_size - original_size) / original_size) * 100
-                    size_change_text = f"{'增加' if size_change_pct > 0 else '减少'} {abs(size_change_pct):.1f}%"
-                    
-                    status_label.configure(text=f"{processed_count+1}/{total_files} 已完成 | {orig_size_str} → {new_size_str} ({size_change_text})")
-                    
-                except Exception as e:
-                    print(f"Error processing {file_info}: {e}")
-                    import traceback
-                    traceback.print_exc()
-                finally:
-                    processed_count += 1
-                    # 更新进度
-                    progress = (processed_count / total_files) * 100
-                    progress_bar['value'] = progress
-                    progress_window.update()
+                        counts["skipped"] += 1
+                    continue
+                
+                # 文件已被替换，元数据需要重新读取
+                self.image_metadata.invalidate(result["path"])
+                counts["original_size"] += result["original_size"]
+                
+                if not result["ok"]:
+                    print(f"Error processing {result['path']}: {result['error']}")
+                    print(result.get("traceback", ""))
+                    continue
+                
+                counts["new_size"] += result["new_size"]
+                counts["copied"] += 1
+                if result["action"] == "pad":
+                    counts["pad_only"] += 1
+                if result.get("budget_met") is False:
+                    counts["over_budget"] += 1
+            tracker.update(batch)
+            
+            progress_bar['value'] = tracker.done
+            status_text = f"{tracker.done}/{total_files} 已完成"
+            if counts["skipped"] + counts["unchanged"]:
+                status_text += f" | 已跳过 {counts['skipped'] + counts['unchanged']} 张"
+            if counts["original_size"]:
+                size_change_pct = (counts["new_size"] - counts["original_size"]) / counts["original_size"] * 100
+                status_text += f" | {'增加' if size_change_pct > 0 else '减少'} {abs(size_change_pct):.1f}%"
+            status_label.configure(text=status_text)
+            rate_label.configure(text=tracker.format_rates())
             
+            if not finished:
+                self.root.after(PROGRESS_POLL_MS, poll_results)
+                return
+            finish_processing()
+        
+        def finish_processing():
+            self.batch_control = None
             # 处理完成后显示总大小变化
+            total_original_size = counts["original_size"]
+            total_new_size = counts["new_size"]
             total_orig_size_str = self.format_size(total_original_size)
             total_new_size_str = self.format_size(total_new_size)
-            total_change_pct = ((total_new_size - total_original_size) / total_original_size) * 100
+            total_change_pct = ((total_new_size - total_original_size) / total_original_size) * 100 if total_original_size else 0
             total_change_text = f"{'增加' if total_change_pct > 0 else '减少'} {abs(total_change_pct):.1f}%"
+            skipped_text = ""
+            if counts["skipped"]:
+                skipped_text += f"已跳过 {counts['skipped']} 张此前已用相同参数处理过的图片\n"
+            if counts["unchanged"]:
+                skipped_text += f"已跳过 {counts['unchanged']} 张尺寸无需改变的图片\n"
+            if counts["pad_only"]:
+                skipped_text += f"其中 {counts['pad_only']} 张只填充了背景，未重新缩放\n"
+            if counts["over_budget"]:
+                skipped_text += f"有 {counts['over_budget']} 张未能压缩到文件大小上限以内（已保存能达到的最小结果）\n"
+            if recorder.results:
+                try:
+                    trace_dir = default_cache_dir()
+                    os.makedirs(trace_dir, exist_ok=True)
+                    trace_path = default_trace_path(trace_dir)
+                    recorder.write_chrome_trace(trace_path)
+                    print(recorder.format_summary())
+                    skipped_text += f"各阶段耗时已保存到: {trace_path}\n"
+                except OSError as e:
+                    print(f"保存跟踪文件失败: {e}")
+            
+            if not outcome["finished"]:
+                skipped_text += f"处理已取消，剩余 {total_files - tracker.done} 张未处理，下次启动时可以继续\n"
             
             # 处理完成后关闭进度窗口并显示完成消息
-            progress_window.after(500, progress_window.destroy)
-            messagebox.showinfo("处理完成", 
-                              f"已成功处理并替换 {copied_count} 张原始图片\n\n"
+            progress_window.destroy()
+            messagebox.showinfo("处理完成" if outcome["finished"] else "处理已取消", 
+                              f"已成功处理并替换 {counts['copied']} 张原始图片\n"
+                              f"{skipped_text}\n"
                               f"总文件大小: {total_orig_size_str} → {total_new_size_str}\n"
-                              f"({total_change_text})")
+                              f"({total_change_text})\n"
+                              f"用时 {format_duration(tracker.elapsed())}")
             
             # 清理临时目录
             try:
@@ -1334,23 +1379,196 @@ class ImageResizerApp:
             except:
                 pass
         
-        # 确认是否要替换原始文件
-        if messagebox.askyesno("确认", "确定要直接替换原始图片吗？此操作无法撤销。"):
-            # 启动处理线程
+        # 确认是否要替换原始文件（继续上次的处理时已经确认过）
+        if resume_state is not None or messagebox.askyesno("确认", "确定要直接替换原始图片吗？此操作无法撤销。"):
+            # 启动处理线程，进度由主线程定期取回
+            self.batch_control = control
             threading.Thread(target=process_thread, daemon=True).start()
+            self.root.after(PROGRESS_POLL_MS, poll_results)
         else:
             # 用户取消了替换操作
+            progress_window.destroy()
+    
+    def start_dry_run(self):
+        """只读取文件头，生成整批图片的处理计划，不修改任何文件"""
+        if not self.selected_files:
+            messagebox.showwarning("警告", "请先选择图片")
+            return
+        
+        # 在主线程中读取参数
+        current_mode = self.current_tab.get()
+        scale = self.scale_slider.get()
+        target_size = self.target_size_var.get()
+        quality = self.quality_var.get()
+        skip_processed = self.skip_processed_var.get()
+        max_bytes = self.get_max_bytes()
+        files = list(self.selected_files)
+        
+        loading_window = tk.Toplevel(self.root)
+        loading_window.title("试运行")
+        loading_window.geometry("300x100")
+        loading_window.configure(bg="#2A2A2A")
+        loading_window.resizable(False, False)
+        loading_window.transient(self.root)
+        loading_window.grab_set()
+        
+        tk.Label(loading_window, text=f"正在读取 {len(files)} 个文件的图片信息...",
+                bg="#2A2A2A", fg="#ffffff",
+                font=("Microsoft YaHei", 11)).pack(pady=10)
+        
+        progress_bar = ttk.Progressbar(loading_window, orient=tk.HORIZONTAL,
+                                     length=250, mode='indeterminate')
+        progress_bar.pack(pady=10, padx=20)
+        progress_bar.start(10)
+        
+        def show_error(message):
+            # 关闭加载窗口，释放grab_set，否则主窗口一直无法操作
+            loading_window.destroy()
+            messagebox.showerror("错误", f"试运行失败: {message}")
+        
+        def plan_thread():
+            try:
+                # 试运行只读取已有的处理记录，不创建记录文件
+                manifest = ProcessManifest(read_only=True) if skip_processed else None
+                try:
+                    plans = batch_planner.plan_batch(files, current_mode, scale, target_size, quality,
+                                                     manifest=manifest, max_bytes=max_bytes)
+                finally:
+                    if manifest is not None:
+                        manifest.close()
+                # 分层抽样编码一部分文件，替换按面积比例的估算
+                sampled = size_estimator.estimate_batch(plans, current_mode, scale, target_size, quality,
+                                                        max_bytes=max_bytes)
+                totals = batch_planner.summarize_plan(plans)
+                totals["sampled"] = sampled
+            except Exception as e:
+                print(f"试运行出错: {e}")
+                import traceback
+                traceback.print_exc()
+                message = f"{e}"
+                self.root.after(10, lambda: show_error(message))
+                return
+            # 更新UI必须在主线程中进行
+            self.root.after(10, lambda: self.show_dry_run_plan(plans, totals, loading_window))
+        
+        threading.Thread(target=plan_thread, daemon=True).start()
+    
+    def show_dry_run_plan(self, plans, totals, loading_window):
+        """显示试运行的汇总结果，并提供导出"""
+        loading_window.destroy()
+        
+        plan_window = tk.Toplevel(self.root)
+        plan_window.title("处理计划")
+        plan_window.configure(bg="#2A2A2A")
+        plan_window.resizable(False, False)
+        plan_window.transient(self.root)
+        
+        summary = (f"文件总数: {totals['files']}\n"
+                   f"需要缩放: {totals['resize']}\n"
+                   f"只需填充背景: {totals['pad']}\n"
+                   f"只需重新编码: {totals['encode']}\n"
+                   f"尺寸不变（跳过）: {totals['none']}\n"
+                   f"此前已处理（跳过）: {totals['processed']}\n"
+                   f"无法读取: {totals['error']}\n\n"
+                   f"总文件大小: {self.format_size(totals['file_size'])} → "
+                   f"约 {self.format_size(totals['estimated_size'])}\n"
+                   f"（按 {totals['sampled']} 张抽样编码的结果估算）")
+        tk.Label(plan_window, text=summary, justify=tk.LEFT,
+                bg="#2A2A2A", fg="#ffffff",
+                font=("Microsoft YaHei", 10)).pack(padx=20, pady=(15, 10), anchor=tk.W)
+        
+        def export(ext, file_type):
+            output_path = filedialog.asksaveasfilename(
+                title="导出处理计划",
+                defaultextension=ext,
+                filetypes=[(file_type, f"*{ext}")]
+            )
+            if not output_path:
+                return
+            try:
+                batch_planner.export_plan(plans, output_path, totals)
+                messagebox.showinfo("导出完成", f"处理计划已导出到:\n{output_path}", parent=plan_window)
+            except Exception as e:
+                messagebox.showerror("错误", f"导出失败: {e}", parent=plan_window)
+        
+        buttons_frame = tk.Frame(plan_window, bg="#2A2A2A")
+        buttons_frame.pack(pady=(0, 15))
+        
+        for text, ext, file_type in [("导出CSV", ".csv", "CSV文件"), ("导出JSON", ".json", "JSON文件")]:
+            self.RoundedButton(buttons_frame, text=text,
+                             command=lambda ext=ext, file_type=file_type: export(ext, file_type),
+                             bg="#3498db", fg="#ffffff",
+                             activebackground="#2980b9",
+                             width=100, height=28,
+                             radius=8, font=("Microsoft YaHei", 9)).pack(side=tk.LEFT, padx=5)
+    
+    def offer_resume(self):
+        """启动时发现未完成的批处理，询问是否按上次的参数继续处理剩余的文件"""
+        state = load_journal(self.journal_path)
+        if state is None:
             return
+        if not state["pending"]:
+            BatchJournal(self.journal_path).finish()
+            return
+        if messagebox.askyesno("继续处理",
+                               f"上次的批处理没有完成：已完成 {state['done']} 张，剩余 {len(state['pending'])} 张。\n"
+                               f"是否按上次的参数继续处理剩余的图片？"):
+            self.start_processing_with_dialog(resume_state=state)
+        else:
+            BatchJournal(self.journal_path).finish()
+    
+    def on_close(self):
+        """关闭窗口前保存缩略图缓存"""
+        if self.batch_control is not None:
+            if not messagebox.askyesno("确认", "正在处理图片，确定要退出吗？\n未处理的图片可以在下次启动时继续处理。"):
+                return
+            # 停止提交新的文件；已记录的进度保留在检查点日志中
+            self.batch_control.cancel()
+        if self.thumbnail_cache is not None:
+            try:
+                self.thumbnail_cache.close()
+            except Exception as e:
+                print(f"关闭缩略图缓存时出错: {e}")
+        self.root.destroy()
+    
+    def get_max_bytes(self):
+        """读取文件大小上限设置（字节），0或输入无效时不限制"""
+        try:
+            max_kb = int(self.max_kb_var.get())
+        except (tk.TclError, ValueError):
+            return None
+        return max_kb * 1024 if max_kb > 0 else None
+    
+    def get_worker_count(self):
+        """读取并行进程数设置，输入无效时使用默认值"""
+        try:
+            return max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            return resize_engine.default_worker_count()
     
     def on_window_resize(self, event):
         # 只有当窗口大小发生实质性变化并且有图片预览时才更新
-        if event.widget == self.root and self.current_preview_file:
-            # 防止频繁更新
-            self.root.after(100, self.refresh_preview)
+        if event.widget != self.root or not self.current_preview_file:
+            return
+        size = (event.width, event.height)
+        if size == self.last_window_size:  # 移动窗口也会触发<Configure>
+            return
+        self.last_window_size = size
+        
+        # 防止频繁更新：拖动过程中只保留最后一次刷新
+        if self.preview_resize_job is not None:
+            self.root.after_cancel(self.preview_resize_job)
+        self.preview_resize_job = self.root.after(150, self.refresh_preview)
     
     def refresh_preview(self):
+        """按当前预览区域大小，从缓存的预览图重新缩放显示"""
+        self.preview_resize_job = None
         if self.current_preview_index >= 0:
-            self.set_preview_file(self.selected_files[self.current_preview_index])
+            try:
+                img, _ = self.preview_cache.get_or_load(self.current_preview_file)
+                self.show_preview_image(img)
+            except Exception as e:
+                print(f"Error refreshing preview: {e}")
     
     def switch_tab(self, tab_name):
         """切换缩放模式选项卡"""
@@ -1371,8 +1589,8 @@ class ImageResizerApp:
             # 更新预览信息
             if self.current_preview_file:
                 try:
-                    img = Image.open(self.current_preview_file)
-                    self.update_scaled_size_info(img.width, img.height)
+                    metadata = self.image_metadata.get(self.current_preview_file)
+                    self.update_scaled_size_info(metadata["width"], metadata["height"])
                 except Exception as e:
                     print(f"Error updating preview: {e}")
         
@@ -1401,16 +1619,165 @@ class ImageResizerApp:
         if self.current_preview_file:
             self.update_target_size_info()
     
+    def show_pyramid_dialog(self):
+        """选择要导出的多个尺寸和输出位置"""
+        if not self.selected_files:
+            messagebox.showwarning("警告", "请先选择图片")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("多尺寸导出")
+        dialog.configure(bg="#2A2A2A")
+        dialog.resizable(False, False)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        tk.Label(dialog, text="每张图片只解码一次，依次生成所选的尺寸（不替换原文件）",
+                bg="#2A2A2A", fg="#ffffff",
+                font=("Microsoft YaHei", 10)).pack(padx=15, pady=(15, 5), anchor=tk.W)
+        
+        sizes_frame = tk.Frame(dialog, bg="#2A2A2A")
+        sizes_frame.pack(padx=15, pady=5, anchor=tk.W)
+        size_vars = []
+        for i, size in enumerate(self.preset_sizes):
+            var = tk.BooleanVar(value=False)
+            size_vars.append((size, var))
+            row, col = divmod(i, 4)  # 每行4个
+            tk.Checkbutton(sizes_frame, text=size, variable=var,
+                         font=("Microsoft YaHei", 10),
+                         bg="#2A2A2A", fg="#ffffff", selectcolor="#3c3c3c",
+                         activebackground="#2A2A2A", activeforeground="#ffffff").grid(row=row, column=col, sticky="w", padx=5)
+        
+        layout_frame = tk.Frame(dialog, bg="#2A2A2A")
+        layout_frame.pack(padx=15, pady=5, anchor=tk.W)
+        tk.Label(layout_frame, text="输出位置:",
+                font=("Microsoft YaHei", 10),
+                bg="#2A2A2A", fg="#ffffff").pack(side=tk.LEFT, padx=(0, 5))
+        layout_var = tk.StringVar(value="suffix")
+        for text, value in [("文件名加尺寸后缀", "suffix"), ("按尺寸分文件夹", "folder")]:
+            tk.Radiobutton(layout_frame, text=text, value=value, variable=layout_var,
+                         font=("Microsoft YaHei", 10),
+                         bg="#2A2A2A", fg="#ffffff", selectcolor="#3c3c3c",
+                         activebackground="#2A2A2A", activeforeground="#ffffff").pack(side=tk.LEFT)
+        
+        def start():
+            sizes = [size for size, var in size_vars if var.get()]
+            if not sizes:
+                messagebox.showwarning("警告", "请至少选择一个尺寸", parent=dialog)
+                return
+            dialog.destroy()
+            self.start_pyramid_export(sizes, layout_var.get())
+        
+        self.RoundedButton(dialog, text="开始导出", command=start,
+                         bg="#4CAF50", fg="#ffffff",
+                         activebackground="#388E3C",
+                         width=120, height=32,
+                         radius=8, font=("Microsoft YaHei", 10)).pack(pady=(5, 15))
+    
+    def start_pyramid_export(self, sizes, layout):
+        """在后台进程池中进行多尺寸导出，主线程定期取回结果更新进度"""
+        if self.batch_control is not None:
+            messagebox.showwarning("警告", "已有正在进行的处理")
+            return
+        workers = self.get_worker_count()
+        quality = self.quality_var.get()
+        files = list(self.selected_files)
+        total_files = len(files)
+        results = queue.Queue()
+        
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title("多尺寸导出")
+        progress_window.geometry("400x165")
+        progress_window.configure(bg="#2A2A2A")
+        progress_window.resizable(False, False)
+        progress_window.transient(self.root)
+        progress_window.grab_set()
+        
+        progress_label = tk.Label(progress_window, text=f"正在导出 {len(sizes)} 个尺寸...",
+                                 bg="#2A2A2A", fg="#ffffff",
+                                 font=("Microsoft YaHei", 12))
+        progress_label.pack(pady=10)
+        progress_bar = ttk.Progressbar(progress_window, orient=tk.HORIZONTAL,
+                                     length=350, mode='determinate', maximum=total_files)
+        progress_bar.pack(pady=5, padx=20)
+        status_label = tk.Label(progress_window, text=f"0/{total_files} 已完成",
+                              bg="#2A2A2A", fg="#ffffff",
+                              font=("Microsoft YaHei", 10))
+        status_label.pack(pady=5)
+        
+        # 取消后不再开始新的文件，进行中的文件完成即停止；关闭窗口等同于取消
+        control = resize_engine.BatchControl()
+        
+        def cancel():
+            control.cancel()
+            cancel_button.configure(state=tk.DISABLED)
+            progress_label.configure(text="正在取消，等待进行中的图片完成...")
+        
+        cancel_button = tk.Button(progress_window, text="取消", command=cancel, width=8,
+                                font=("Microsoft YaHei", 9))
+        cancel_button.pack(pady=5)
+        progress_window.protocol("WM_DELETE_WINDOW", cancel)
+        
+        def export_thread():
+            try:
+                for result in resize_engine.pyramid_batch(files, sizes, layout, workers, quality,
+                                                          control=control):
+                    results.put(result)
+            except Exception as e:
+                print(f"多尺寸导出出错: {e}")
+            finally:
+                results.put(None)  # 结束标记
+        
+        counts = {"done": 0, "failed": 0, "outputs": 0, "bytes": 0}
+        
+        def poll_results():
+            finished = False
+            try:
+                while True:
+                    result = results.get_nowait()
+                    if result is None:
+                        finished = True
+                        break
+                    counts["done"] += 1
+                    if result["ok"]:
+                        counts["outputs"] += len(result["outputs"])
+                        counts["bytes"] += result["new_size"]
+                    else:
+                        counts["failed"] += 1
+                        print(f"Error processing {result['path']}: {result['error']}")
+            except queue.Empty:
+                pass
+            
+            progress_bar['value'] = counts["done"]
+            status_label.configure(text=f"{counts['done']}/{total_files} 已完成")
+            if not finished:
+                self.root.after(100, poll_results)
+                return
+            
+            self.batch_control = None
+            progress_window.destroy()
+            failed_text = f"\n{counts['failed']} 张图片处理失败" if counts["failed"] else ""
+            if control.cancelled:
+                failed_text += f"\n导出已取消，剩余 {total_files - counts['done']} 张未导出"
+            messagebox.showinfo("导出已取消" if control.cancelled else "导出完成",
+                              f"已从 {counts['done'] - counts['failed']} 张图片生成 {counts['outputs']} 个文件\n"
+                              f"总大小: {self.format_size(counts['bytes'])}{failed_text}")
+        
+        # 退出程序时取消导出（见on_close）
+        self.batch_control = control
+        threading.Thread(target=export_thread, daemon=True).start()
+        self.root.after(100, poll_results)
+    
     def update_target_size_info(self):
         """更新目标尺寸调整下的预览信息"""
         try:
             # 获取原始图片尺寸
-            img = Image.open(self.current_preview_file)
-            original_width, original_height = img.width, img.height
+            metadata = self.image_metadata.get(self.current_preview_file)
+            original_width, original_height = metadata["width"], metadata["height"]
             
             # 获取文件大小
             try:
-                file_size = os.path.getsize(self.current_preview_file)
+                file_size = metadata["file_size"]
                 size_str = self.format_size(file_size)
                 
                 # 获取目标尺寸
@@ -1424,19 +1791,11 @@ class ImageResizerApp:
                 target_width, target_height = map(int, target_size.split('x'))
                 
                 # 计算实际的缩放尺寸(保持宽高比)
-                img_ratio = original_width / original_height
-                
-                if img_ratio > 1:  # 宽大于高的图片
-                    new_width = target_width
-                    new_height = int(target_width / img_ratio)
-                else:  # 高大于或等于宽的图片
-                    new_height = target_height
-                    new_width = int(target_height * img_ratio)
+                new_width, new_height = resize_engine.compute_new_size(
+                    original_width, original_height, "target_size", target_size=target_size)
                 
-                # 估算缩放后的文件大小 (按照面积比例计算)
-                area_ratio = (new_width * new_height) / (original_width * original_height)
-                estimated_size = file_size * area_ratio
-                estimated_size_str = self.format_size(estimated_size)
+                # 预计大小来自后台编码（包括填充的背景），尚未完成时显示"计算中"
+                estimated_size_str = self.estimated_size_text("target_size", target_size=target_size)
                 
                 # 更新预览信息
                 info_text = f"原始尺寸: {original_width} x {original_height} 像素\n原始大小: {size_str}\n目标尺寸: {target_width} x {target_height} 像素\n实际尺寸: {new_width} x {new_height} 像素\n预计大小: {estimated_size_str}"
@@ -1463,13 +1822,18 @@ class ImageResizerApp:
             title="选择图片文件夹"
         )
         
-        if not folder_path:
-            return
-            
-        # 显示加载中对话框
+        if folder_path:
+            self.scan_folder(folder_path)
+    
+    def scan_folder(self, folder_path):
+        """后台并行扫描文件夹，实时显示找到的数量，可以取消或只添加已找到的部分"""
+        scanner = FolderScanner(folder_path, resize_engine.SUPPORTED_EXTENSIONS).start()
+        found_files = []
+        
+        # 显示扫描进度对话框
         loading_window = tk.Toplevel(self.root)
         loading_window.title("加载中")
-        loading_window.geometry("300x100")
+        loading_window.geometry("320x170")
         loading_window.configure(bg="#2A2A2A")
         loading_window.resizable(False, False)
         
@@ -1481,36 +1845,64 @@ class ImageResizerApp:
         loading_label = tk.Label(loading_window, text="正在扫描文件夹中的图片...", 
                                 bg="#2A2A2A", fg="#ffffff",
                                 font=("Microsoft YaHei", 12))
-        loading_label.pack(pady=10)
+        loading_label.pack(pady=(10, 0))
+        
+        count_label = tk.Label(loading_window, text="已找到 0 个图片文件",
+                               bg="#2A2A2A", fg="#cccccc",
+                               font=("Microsoft YaHei", 9))
+        count_label.pack(pady=(2, 0))
         
         # 添加进度条
         progress_bar = ttk.Progressbar(loading_window, orient=tk.HORIZONTAL, 
                                      length=250, mode='indeterminate')
-        progress_bar.pack(pady=10, padx=20)
+        progress_bar.pack(pady=8, padx=20)
         progress_bar.start(10)  # 启动滚动效果
         
-        # 更新GUI
-        loading_window.update()
-        
-        # 使用线程执行耗时操作
-        def scan_folder_thread():
-            valid_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.tiff']
-            found_files = []
-            
-            # 递归获取所有匹配的文件
-            for root, dirs, files in os.walk(folder_path):
-                for file in files:
-                    file_ext = os.path.splitext(file)[1].lower()
-                    if file_ext in valid_extensions:
-                        full_path = os.path.join(root, file)
-                        if full_path not in self.selected_files:  # 避免重复添加
-                            found_files.append(full_path)
-            
-            # 更新UI必须在主线程中进行
-            self.root.after(10, lambda: self.finish_folder_scan(found_files, loading_window))
+        def finish(add_found):
+            scanner.cancel()
+            found_files.extend(file_path for file_path in scanner.drain()
+                               if file_path not in self.selected_files)
+            if add_found:
+                # 多个线程并行扫描，返回顺序不固定，按路径排序后再添加
+                found_files.sort()
+                self.finish_folder_scan(found_files, loading_window)
+            else:
+                loading_window.destroy()
+        
+        buttons_frame = tk.Frame(loading_window, bg="#2A2A2A")
+        buttons_frame.pack(pady=(0, 10))
+        
+        add_found_btn = self.RoundedButton(buttons_frame, text="添加已找到",
+                                           command=lambda: finish(True),
+                                           bg="#3498db", fg="#ffffff",
+                                           activebackground="#2980b9",
+                                           width=110, height=28,
+                                           radius=8, font=("Microsoft YaHei", 9))
+        add_found_btn.pack(side=tk.LEFT, padx=5)
+        
+        cancel_btn = self.RoundedButton(buttons_frame, text="取消",
+                                        command=lambda: finish(False),
+                                        bg="#555555", fg="#ffffff",
+                                        activebackground="#444444",
+                                        width=110, height=28,
+                                        radius=8, font=("Microsoft YaHei", 9))
+        cancel_btn.pack(side=tk.LEFT, padx=5)
+        
+        loading_window.protocol("WM_DELETE_WINDOW", lambda: finish(False))
+        
+        # 扫描线程把结果放入队列，主线程定期取回并更新计数
+        def poll_scan():
+            if not loading_window.winfo_exists():
+                return
+            found_files.extend(file_path for file_path in scanner.drain()
+                               if file_path not in self.selected_files)
+            count_label.configure(text=f"已找到 {len(found_files)} 个图片文件（已扫描 {scanner.scanned_dirs} 个文件夹）")
+            if scanner.done:
+                finish(True)
+            else:
+                self.root.after(100, poll_scan)
         
-        # 启动线程
-        threading.Thread(target=scan_folder_thread, daemon=True).start()
+        self.root.after(100, poll_scan)
     
     def finish_folder_scan(self, found_files, loading_window):
         """完成文件夹扫描，添加找到的图片"""
@@ -1526,65 +1918,14 @@ class ImageResizerApp:
         if not result:
             return
             
-        # 添加到选中文件列表
-        self.selected_files.extend(found_files)
-        
-        # 创建新窗口显示进度
-        progress_window = tk.Toplevel(self.root)
-        progress_window.title("正在添加图片")
-        progress_window.geometry("400x150")
-        progress_window.configure(bg="#2A2A2A")
-        progress_window.resizable(False, False)
-        
-        # 设置为模态窗口
-        progress_window.transient(self.root)
-        progress_window.grab_set()
-        
-        # 添加进度条
-        progress_label = tk.Label(progress_window, text="正在添加图片...", 
-                                 bg="#2A2A2A", fg="#ffffff",
-                                 font=("Microsoft YaHei", 12))
-        progress_label.pack(pady=10)
-        
-        progress_bar = ttk.Progressbar(progress_window, orient=tk.HORIZONTAL, 
-                                     length=350, mode='determinate')
-        progress_bar.pack(pady=10, padx=20)
-        
-        status_label = tk.Label(progress_window, text="0/{} 已添加".format(len(found_files)), 
-                              bg="#2A2A2A", fg="#ffffff",
-                              font=("Microsoft YaHei", 10))
-        status_label.pack(pady=10)
-        
-        # 更新UI以确保窗口显示
-        progress_window.update()
-        
-        # 使用线程添加图片缩略图
-        def add_thumbnails_thread():
-            added_count = 0
-            
-            for file_path in found_files:
-                try:
-                    # 在主线程中添加缩略图
-                    self.root.after(0, lambda p=file_path: self.add_thumbnail(p))
-                    added_count += 1
-                    
-                    # 更新进度
-                    progress = (added_count / len(found_files)) * 100
-                    self.root.after(0, lambda p=progress: progress_bar.configure(value=p))
-                    self.root.after(0, lambda c=added_count, t=len(found_files): 
-                                  status_label.configure(text=f"{c}/{t} 已添加"))
-                except Exception as e:
-                    print(f"添加缩略图时出错: {file_path}, 错误: {str(e)}")
-            
-            # 完成后关闭窗口
-            self.root.after(100, progress_window.destroy)
-            
-            # 默认选中第一个文件进行预览（如果之前没有文件）
-            if len(self.selected_files) == len(found_files):  # 如果之前没有文件
-                self.root.after(200, lambda: self.set_preview_file(self.selected_files[0]))
-        
-        # 启动线程
-        threading.Thread(target=add_thumbnails_thread, daemon=True).start()
+        # 添加到选中文件列表，缩略图网格只为可见的行生成缩略图
+        found_files = self.selected_files.extend(found_files)
+        self.image_metadata.prefill(found_files)
+        self.thumbnail_grid.refresh()
+        
+        # 默认选中第一个文件进行预览（如果之前没有文件）
+        if found_files and len(self.selected_files) == len(found_files):
+            self.set_preview_file(self.selected_files[0])
 
     def show_file_options(self):
         """显示添加文件或文件夹的选项对话框"""
@@ -1630,56 +1971,13 @@ class ImageResizerApp:
             title="选择图片文件夹"
         )
         
-        if not folder_path:
-            return
-            
-        # 显示加载中对话框
-        loading_window = tk.Toplevel(self.root)
-        loading_window.title("加载中")
-        loading_window.geometry("300x100")
-        loading_window.configure(bg="#2A2A2A")
-        loading_window.resizable(False, False)
-        
-        # 设置为模态窗口
-        loading_window.transient(self.root)
-        loading_window.grab_set()
-        
-        # 添加加载提示
-        loading_label = tk.Label(loading_window, text="正在扫描文件夹中的图片...", 
-                                bg="#2A2A2A", fg="#ffffff",
-                                font=("Microsoft YaHei", 12))
-        loading_label.pack(pady=10)
-        
-        # 添加进度条
-        progress_bar = ttk.Progressbar(loading_window, orient=tk.HORIZONTAL, 
-                                     length=250, mode='indeterminate')
-        progress_bar.pack(pady=10, padx=20)
-        progress_bar.start(10)  # 启动滚动效果
-        
-        # 更新GUI
-        loading_window.update()
-        
-        # 使用线程执行耗时操作
-        def scan_folder_thread():
-            valid_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.tiff']
-            found_files = []
-            
-            # 递归获取所有匹配的文件
-            for root, dirs, files in os.walk(folder_path):
-                for file in files:
-                    file_ext = os.path.splitext(file)[1].lower()
-                    if file_ext in valid_extensions:
-                        full_path = os.path.join(root, file)
-                        if full_path not in self.selected_files:  # 避免重复添加
-                            found_files.append(full_path)
-            
-            # 更新UI必须在主线程中进行
-            self.root.after(10, lambda: self.finish_folder_scan(found_files, loading_window))
-        
-        # 启动线程
-        threading.Thread(target=scan_folder_thread, daemon=True).start()
+        if folder_path:
+            self.scan_folder(folder_path)
 
 def main():
+    # 打包为exe后，进程池的子进程需要此调用才能正常启动
+    multiprocessing.freeze_support()
+    
     print("程序开始初始化...")
     
     # 创建圆角矩形方法